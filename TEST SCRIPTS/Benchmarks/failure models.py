@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the sampling throughput of the failure models of
+failure_models.py against the exponential loop of time_to_next_fail in
+"environment process.py", which draws one time between failures at a time.
+
+    python "failure models.py" [number of turbines]
+
+Every model samples the four failure types of the failure table for a farm
+over 25 years, 1000 turbines by default. The Weibull models have infant
+mortality (shape 0.7) or wear out (shape 2.5). With renewal their mean life
+is the MTBF of the table. With minimal repair the age is never reset, so
+they are scaled to have the same expected number of failures over the
+simulation as the table instead, as a wearing out unit repaired as bad as
+old otherwise fails without end. The bath-tub triples the hazard for the
+first 3 months and after 15 years.
+
+Reports the failures sampled per second, and the mean number of failures
+per turbine against the expected number: the cumulative hazard at the end
+of the simulation for minimal repair, the long run rate for renewal.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "Failure Generation"))
+import failure_models
+import failure_sampling
+
+YEARS = 25
+SIM_TIME = YEARS*52*7*24
+MTBF = failure_sampling.read_failures()["MTBF"].tolist()
+
+
+def time_to_next_fail(mtbf):
+    """
+    The exponential sampler of "environment process.py".
+    """
+    return np.log(np.random.rand())*(-1*mtbf)
+
+
+def exponential_loop(n_turbines):
+    """
+    Draws the failures of every turbine and failure type one at a time.
+    """
+    n_failures = 0
+    for _ in range(n_turbines):
+        for mtbf in MTBF:
+            time = time_to_next_fail(mtbf)
+            while time < SIM_TIME:
+                n_failures += 1
+                time += time_to_next_fail(mtbf)
+    return n_failures
+
+
+def throughput(function):
+    start = time.perf_counter()
+    n_failures = function()
+    seconds = time.perf_counter() - start
+    return n_failures, seconds
+
+
+def weibull_models(shape, repair):
+    if repair == "renewal":
+        return [failure_models.weibull.from_mtbf(mtbf, shape) for mtbf in MTBF]
+    # The cumulative hazard at SIM_TIME is SIM_TIME/mtbf
+    return [failure_models.weibull(SIM_TIME*(mtbf/SIM_TIME)**(1/shape), shape)
+            for mtbf in MTBF]
+
+
+MODELS = {"exponential": lambda repair: [failure_models.exponential(mtbf) for mtbf in MTBF],
+          "weibull 0.7": lambda repair: weibull_models(0.7, repair),
+          "weibull 2.5": lambda repair: weibull_models(2.5, repair),
+          "bath-tub": lambda repair: [failure_models.bathtub(mtbf, 3*730, 15*8736)
+                                      for mtbf in MTBF]}
+
+n_turbines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+print("%d turbines over %d years\n" % (n_turbines, YEARS))
+print("%-42s %12s %14s %10s %10s" % ("sampler", "failures", "failures/s",
+                                     "mean", "expected"))
+
+n_loop = max(1, n_turbines//10)
+n_failures, seconds = throughput(lambda: exponential_loop(n_loop))
+expected = sum(SIM_TIME/mtbf for mtbf in MTBF)
+print("%-42s %12d %14.3g %10.2f %10.2f" % ("time_to_next_fail loop (%d turbines)" % n_loop,
+                                           n_failures, n_failures/seconds,
+                                           n_failures/n_loop, expected))
+
+n_failures, seconds = throughput(lambda: sum(map(len, failure_sampling.sample_failures(
+    MTBF, SIM_TIME, n_turbines, seed=1))))
+print("%-42s %12d %14.3g %10.2f %10.2f" % ("failure_sampling.sample_failures",
+                                           n_failures, n_failures/seconds,
+                                           n_failures/n_turbines, expected))
+
+for name, make_models in MODELS.items():
+    for repair, method in (("renewal", "inverse"), ("minimal", "inverse"),
+                           ("minimal", "thinning")):
+        models = make_models(repair)
+        if method == "thinning" and not all(np.isfinite(model.hazard_bound(SIM_TIME))
+                                            for model in models):
+            continue
+        n_failures, seconds = throughput(lambda: sum(map(len, failure_models.sample_failures(
+            models, SIM_TIME, n_turbines, repair=repair, method=method, seed=1))))
+        if repair == "minimal":
+            expected = sum(float(model.cumulative_hazard(SIM_TIME)) for model in models)
+        else:
+            expected = sum(SIM_TIME/model.mean_life() for model in models)
+        print("%-42s %12d %14.3g %10.2f %10.2f" % ("%s, %s, %s" % (name, repair, method),
+                                                   n_failures, n_failures/seconds,
+                                                   n_failures/n_turbines, expected))
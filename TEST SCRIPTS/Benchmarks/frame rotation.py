@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the "matrix" and "euler" kernels of ANSYS_tools.ansys_accelerometer
+on the Semi-Sub H2-1 TZ4-89 record, repeated to make longer records. Reports
+the time and the peak memory (traced with tracemalloc) to calculate the local
+accelerations and rotations, and the largest difference between the kernels.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+V2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "V2")
+sys.path.insert(0, V2)
+import ANSYS_tools
+import motion_records
+
+RUN = os.path.join(V2, "Data", "platform_data", "Semi-Sub", "H2-1", "TZ4-89",
+                   "0", "H2-1_TZ4-89_0_")
+REPEATS = [1, 10, 30]
+
+
+def repeat_record(df, repeats):
+    """
+    Repeats a record end to end to make a longer record.
+    """
+    df = pd.concat([df]*repeats, ignore_index=True)
+    df["Time"] = np.arange(len(df))*(df["Time"][1]-df["Time"][0])
+    return df
+
+
+def run_kernel(df, kernel):
+    """
+    Returns the seconds, peak traced memory and local motion of a kernel.
+    """
+    accelerometer = ANSYS_tools.ansys_accelerometer(df, [0, 0, 30], 45,
+                                                    kernel=kernel)
+    tracemalloc.start()
+    start = time.perf_counter()
+    motion = np.vstack([accelerometer.rotated_acc_vectors.T,
+                        accelerometer.new_rotations])
+    seconds = time.perf_counter()-start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, motion
+
+
+record = motion_records.read_aqwa_run(RUN+"CG.csv", RUN+"ROT.csv")
+print("%10s %8s %12s %12s %12s %12s %10s" % ("frames", "kernel", "time (s)",
+                                             "peak (MB)", "B/frame",
+                                             "speed up", "max diff"))
+for repeats in REPEATS:
+    df = repeat_record(record, repeats)
+    euler = run_kernel(df, "euler")
+    matrix = run_kernel(df, "matrix")
+    difference = np.max(np.abs(matrix[2]-euler[2]))
+    for kernel, (seconds, peak, _) in [("euler", euler), ("matrix", matrix)]:
+        print("%10d %8s %12.4f %12.1f %12.0f %12.2f %10.2e"
+              % (len(df), kernel, seconds, peak/2**20, peak/len(df),
+                 euler[0]/seconds, difference))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Compares hull_map.adaptive_map against evaluating every panel of a hull,
+using the motions of the Semi-Sub H2-1 TZ4-89 record.
+
+    python "hull map.py" [STL file] [number of panels]
+
+Without an STL file (which needs numpy-stl) the panels are spread at random
+over the surface of a 100 m x 30 m x 15 m box, 100000 panels by default.
+Reports the number of panels evaluated, the time and speed up, and the
+estimated, checked and actual errors of each field as a fraction of its
+range.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+V2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "V2")
+sys.path.insert(0, V2)
+import ANSYS_tools
+import hull_map
+import motion_records
+
+RUN = os.path.join(V2, "Data", "platform_data", "Semi-Sub", "H2-1", "TZ4-89",
+                   "0", "H2-1_TZ4-89_0_")
+FIELDS = ["Ax_rms", "Ay_rms", "Az_rms", "A_rms", "MSI", "Sideways MII Rate",
+          "Foreward MII Rate"]
+REFINE_ON = ["Ax_rms", "Ay_rms", "Az_rms", "A_rms", "MSI"]
+
+
+def box_panels(n_panels, length=100, beam=30, depth=15, seed=0):
+    """
+    Panel centres spread at random over the sides, bottom, deck and ends of
+    a box, with the accelerometer at the centre of the deck.
+    """
+    rng = np.random.default_rng(seed)
+    u, v = rng.uniform(size=(2, n_panels))
+    face = rng.integers(0, 5, n_panels)
+    x = (u - 0.5)*length
+    y = np.where(face == 0, -beam/2, np.where(face == 1, beam/2, (v - 0.5)*beam))
+    z = np.where(face == 2, -depth, np.where(face == 3, 0, -depth*v))
+    x = np.where(face == 4, np.where(u < 0.5, -length/2, length/2), x)
+    return np.column_stack([x, y, z])
+
+
+args = sys.argv[1:]
+if args and not args[0].isdigit():
+    import STL_loader
+    hull = STL_loader.create_object(args.pop(0))
+    panels = hull.panel_centre - hull.panel_centre.mean(axis=0)
+else:
+    panels = box_panels(int(args[0]) if args else 100000)
+
+df = motion_records.read_aqwa_run(RUN+"CG.csv", RUN+"ROT.csv")
+accelerometer = ANSYS_tools.ansys_accelerometer(df, [0, 0, 0], 0)
+evaluate = hull_map.motion_evaluator(accelerometer, exposure_time=1,
+                                     Cts=[0.12, 0.12])
+
+start = time.perf_counter()
+surface = hull_map.adaptive_map(evaluate, panels, cell_size=10,
+                                tolerance=0.01, refine_on=REFINE_ON,
+                                n_check=500)
+mapped_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+full = evaluate(panels)
+full_seconds = time.perf_counter() - start
+
+print("%d panels, %d evaluated (%.1f%%)" % (len(panels),
+                                           len(surface.representatives),
+                                           100*len(surface.representatives)/len(panels)))
+print("Adaptive map %.2f s, every panel %.2f s, speed up %.1fx\n"
+      % (mapped_seconds, full_seconds, full_seconds/mapped_seconds))
+print("%-20s %10s %10s %10s %10s" % ("field", "estimated", "checked",
+                                     "max", "99%"))
+for name in FIELDS:
+    scale = np.ptp(full[name]) or 1
+    error = np.abs(surface.values[name] - full[name])/scale
+    print("%-20s %10.4f %10.4f %10.4f %10.4f"
+          % (name, surface.estimated_error[name]/scale,
+             surface.checked_error[name]/scale, error.max(),
+             np.quantile(error, 0.99)))
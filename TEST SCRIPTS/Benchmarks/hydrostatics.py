@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Checks STL_loader.create_object.hydrostatics against a box barge, whose
+hydrostatics are known exactly, and times a table of loading conditions
+against summing the panels whose centre is below each waterline, as
+calc_hull_parameters did before.
+
+    python hydrostatics.py [STL file] [panels along each edge]
+
+Without an STL file a 100 m x 30 m x 15 m box is written to a temporary
+folder, split into 2*n*n panels on each face (n = 100 by default).
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from stl import mesh as stl_mesh
+
+V2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "V2")
+sys.path.insert(0, V2)
+import STL_loader
+
+LENGTH, BEAM, DEPTH = 100.0, 30.0, 15.0
+
+
+def box_stl(file, n):
+    """
+    Writes a box with its keel at z = -DEPTH, split into 2*n*n triangles on
+    each face, with outward normals.
+    """
+    low = np.array([0, -BEAM/2, -DEPTH])
+    high = np.array([LENGTH, BEAM/2, 0])
+    g = np.linspace(0, 1, n + 1)
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    quads = np.stack([np.stack([g[i], g[j]], -1),
+                      np.stack([g[i + 1], g[j]], -1),
+                      np.stack([g[i + 1], g[j + 1]], -1),
+                      np.stack([g[i], g[j + 1]], -1)], axis=2).reshape(-1, 4, 2)
+    triangles = []
+    for axis in range(3):
+        u, v = [k for k in range(3) if k != axis]
+        for side, outward in ((low, -1), (high, 1)):
+            corners = np.empty(quads.shape[:2] + (3,))
+            corners[..., axis] = side[axis]
+            corners[..., u] = low[u] + (high[u] - low[u])*quads[..., 0]
+            corners[..., v] = low[v] + (high[v] - low[v])*quads[..., 1]
+            faces = np.concatenate([corners[:, [0, 1, 2]], corners[:, [0, 2, 3]]])
+            normal = np.cross(faces[:, 1] - faces[:, 0], faces[:, 2] - faces[:, 0])
+            flip = normal[:, axis]*outward < 0
+            faces[flip] = faces[flip][:, [0, 2, 1]]
+            triangles.append(faces)
+    data = np.zeros(sum(map(len, triangles)), dtype=stl_mesh.Mesh.dtype)
+    data["vectors"] = np.concatenate(triangles)
+    stl_mesh.Mesh(data).save(file)
+
+
+args = sys.argv[1:]
+drafts = np.linspace(1, 14, 40)
+heels = np.linspace(-15, 15, 31)
+if args and not args[0].isdigit():
+    hull = STL_loader.create_object(args.pop(0))
+    drafts = np.linspace(0.05, 0.95, 40)*hull.D
+else:
+    folder = tempfile.mkdtemp()
+    box_stl(os.path.join(folder, "box.stl"), int(args[0]) if args else 100)
+    hull = STL_loader.create_object(os.path.join(folder, "box.stl"), cache=False)
+
+    table = hull.hydrostatics(drafts[:, np.newaxis], heels)
+    upright = table["WSA"][:, heels == 0][:, 0]
+    exact_WSA = LENGTH*BEAM + 2*(LENGTH + BEAM)*drafts
+    tan = np.tan(heels*np.pi/180)
+    # The wedges moved across by a heel, while the deck edge stays dry and
+    # the bilge stays wet
+    wedge = np.abs(tan*BEAM/2) < np.minimum(drafts, DEPTH - drafts)[:, np.newaxis]
+    exact_y = -BEAM**2*tan/(12*drafts[:, np.newaxis])
+    exact_z = -DEPTH + drafts[:, np.newaxis]/2 + BEAM**2*tan**2/(24*drafts[:, np.newaxis])
+    print("%d panels, box barge" % len(hull.faces))
+    print("Largest error of the volume  %.2e"
+          % np.max(np.abs(table["Volume"]/(LENGTH*BEAM*drafts[:, np.newaxis]) - 1)[wedge]))
+    print("Largest error of the CB      %.2e m"
+          % max(np.max(np.abs(table["CB"][..., 1] - exact_y)[wedge]),
+                np.max(np.abs(table["CB"][..., 2] - exact_z)[wedge])))
+    print("Largest error of the WSA     %.2e\n"
+          % np.max(np.abs(upright/exact_WSA - 1)))
+
+start = time.perf_counter()
+table = hull.hydrostatics(drafts[:, np.newaxis], heels)
+table_seconds = time.perf_counter() - start
+print("%d x %d table of drafts and heels: %.2f s, %.1f ms per condition"
+      % (len(drafts), len(heels), table_seconds,
+         1e3*table_seconds/table["Volume"].size))
+
+start = time.perf_counter()
+keel = hull.bounding_box[0, 2]
+centre_WSA = [np.sum(hull.panel_area[hull.panel_centre[:, 2] < keel + draft])
+              for draft in drafts]
+centre_seconds = time.perf_counter() - start
+print("Summing the panels with their centre below each of %d drafts (upright "
+      "WSA only): %.1f ms per draft" % (len(drafts),
+                                       1e3*centre_seconds/len(drafts)))
+if "exact_WSA" in globals():
+    print("Largest error of that WSA    %.2e"
+          % np.max(np.abs(np.array(centre_WSA)/exact_WSA - 1)))
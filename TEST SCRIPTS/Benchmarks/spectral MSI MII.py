@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Checks the frequency domain MSI and MII rates of spectral_MII against the
+time domain calculation on the Semi-Sub H2-1 TZ4-89 record (Hs 2.1 m, Tz
+4.89 s), for the tasks of the Semi-Sub.
+
+The RAOs are pseudo RAOs made from the record itself, so the band RMS and
+MSI should agree closely with the time domain, which trims the record to a
+5-smooth length by default. The MSI with zero padding (length_plan="pad")
+is shown too; padding adds a jump at the end of the record which leaks into
+the upper bands. The MII rates from Rice's formula assume
+Gaussian motions, and the pseudo RAOs leave out the slow drift roll below
+the wave frequencies, which is not a response to the JONSWAP spectrum. This
+roll dominates the foreward MII rate of this record, so that rate is
+underestimated. A JONSWAP scatter diagram is then timed.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+V2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "V2")
+sys.path.insert(0, V2)
+import ANSYS_tools
+import MII
+import motion_records
+import spectral_MII
+
+RUN = os.path.join(V2, "Data", "platform_data", "Semi-Sub", "H2-1", "TZ4-89",
+                   "0", "H2-1_TZ4-89_0_")
+HS, TZ = 2.1, 4.89
+
+turbines = pd.read_excel(os.path.join(V2, "Turbines.xlsx"))
+turbine = turbines[turbines["Turbine type"].str.upper() == "SEMI-SUB"].iloc[0]
+tasks = pd.read_excel(os.path.join(V2, "tasks.xlsx"))
+tasks = tasks[tasks["Turbine type"].str.upper() == "SEMI-SUB"]
+acc_pos = np.array(turbine[["X", "Y", "Z"]], dtype=float)
+
+df = motion_records.read_aqwa_run(RUN+"CG.csv", RUN+"ROT.csv")
+accelerometer = ANSYS_tools.ansys_accelerometer(df, [0, 0, 0], 0,
+                                                position=acc_pos)
+XX, YY, ZZ = MII.points(acc_pos, tasks["X"].to_numpy(),
+                        tasks["Y"].to_numpy(), tasks["Z"].to_numpy())
+Cts = [tasks["Sideways tip coeff"].to_numpy(),
+       tasks["Foreward tip coeff"].to_numpy()]
+options = dict(exposure_time=tasks["Exposure time"].to_numpy(), Cts=Cts,
+               h=tasks["h"].to_numpy())
+
+start = time.perf_counter()
+Ax, Ay, Az, A = MII.translate_accelerations(XX, YY, ZZ, accelerometer)
+time_domain = MII.motion_statistics(Ax, Ay, Az, A,
+                                    accelerometer=accelerometer,
+                                    index=tasks.index, **options)
+time_domain_seconds = time.perf_counter()-start
+
+raos = spectral_MII.rao_table.from_motion_data(
+    accelerometer.motion_data,
+    lambda omega: spectral_MII.jonswap(omega, HS, TZ))
+spectrum = spectral_MII.jonswap(raos.omega, HS, TZ)
+frequency = raos.statistics(spectrum, XX, YY, ZZ, **options)
+
+bands = MII.octave_batch(Az, accelerometer.motion_data["Time"], 1)
+print("Az band RMS, frequency / time domain:")
+print(np.round(frequency["Az_band_rms"][0]/np.reshape(bands, (len(tasks), -1)), 3))
+padded = MII.calc_MSI(Az, XX, accelerometer, options["exposure_time"],
+                      length_plan="pad")
+
+comparison = pd.DataFrame({"Task": tasks["Task"].to_numpy()})
+for name in ["Ax_rms", "Ay_rms", "MSI", "Sideways MII Rate",
+             "Foreward MII Rate"]:
+    comparison[name+" (time)"] = time_domain[name].to_numpy()
+    if name == "MSI":
+        comparison["MSI (time, pad)"] = np.ravel(padded)
+    comparison[name+" (freq)"] = frequency[name][0]
+pd.set_option("display.width", 250)
+print(comparison.T.to_string(header=False))
+
+# A scatter diagram of sea states, from RAOs on a 200 frequency grid
+omega = np.linspace(0.2, 3, 200)
+motion = np.array([np.interp(omega, raos.omega, part) for part in
+                   np.concatenate([raos.motion.real, raos.motion.imag])])
+grid_raos = spectral_MII.rao_table(omega, motion[:6] + 1j*motion[6:])
+Hs, Tz = np.meshgrid(np.arange(0.5, 4.01, 0.25), np.arange(3, 12.01, 0.5))
+start = time.perf_counter()
+table = spectral_MII.scatter_statistics(grid_raos, Hs, Tz, XX, YY, ZZ,
+                                        index=tasks.index, **options)
+seconds = time.perf_counter()-start
+print("\nTime domain, one sea state: %.3f s" % time_domain_seconds)
+print("Frequency domain, %d sea states: %.3f s (%.2f ms per sea state)"
+      % (Hs.size, seconds, seconds/Hs.size*1e3))
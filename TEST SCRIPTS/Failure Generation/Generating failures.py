@@ -5,6 +5,8 @@ Created on Fri Jul  3 15:36:24 2020
 @author: Rastko
 """
 
+import os
+import sys
 import numpy as np
 from numpy.random import exponential
 import simpy
@@ -18,14 +20,13 @@ import plotly.io as pio
 pio.renderers.default='svg'
 #pio.renderers.default='browser'
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import failure_sampling
+
 YEARS = 1000
 WEEKS = 52
 SIM_TIME = YEARS*WEEKS*7*24
-FAILURES = pd.DataFrame([["Manual reset", 1272, 3],
-                         ["Minor repair", 2120, 7.5],
-                         ["Major repair", 21200, 22],
-                         ["Major replacement", 57818.2, 34]],
-                        columns=["Failure Type", "MTBF", "LenOfRepair"])
+FAILURES = failure_sampling.read_failures()
 
 failure_timeline = pd.DataFrame()
 
@@ -53,13 +54,12 @@ def generate_failures(mtbf, sim_length):
     Inputs:
         mtbf        -   The mean time between failures
         sim_length  -   When to generate failures until
+
+    Outputs:
+        The times between the failures before sim_length
     """
-    time = np.array([])
-    while sum(time) < sim_length:
-        time = np.append(time, time_to_next_fail(mtbf))
-    df = pd.DataFrame(time)
-    df.columns = ["Time"]
-    return df["Time"]
+    timeline = failure_sampling.sample_failures([mtbf], sim_length)[0]
+    return pd.Series(np.diff(timeline["Time"], prepend=0), name="Time")
 
 
 def generate_turbine_failures(failures):
@@ -70,19 +70,16 @@ def generate_turbine_failures(failures):
     Inputs:
         failures    -   A pandas dataframe of failures
     """
-    df = pd.DataFrame()
+    timeline = failure_sampling.sample_failures(failures["MTBF"], SIM_TIME)[0]
     for i, x in enumerate(failures['Failure Type']):
-        df[x] = generate_failures(failures.iloc[i, 1], SIM_TIME)
-        print(df[x].describe())
-        fig = px.histogram(df, x=x,  histnorm='probability density')
+        times = timeline["Time"][timeline["Type"] == i]
+        between = pd.DataFrame({x: np.diff(times, prepend=0)})
+        print(between[x].describe())
+        fig = px.histogram(between, x=x,  histnorm='probability density')
         fig.show()
-        df[x] = df[x].cumsum()
 
-    df = pd.melt(df)
-    df = df.dropna()
-    df.columns = ["Type", "Time"]
-    df = df.sort_values(by=['Time'])
-    return df
+    df = failure_sampling.to_dataframe(timeline, failures['Failure Type'])
+    return df[["Type", "Time"]]
 
 
 failure_timeline = generate_turbine_failures(FAILURES)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Failure models beyond a constant failure rate.
+
+The exponential MTBF of the failure table is the flat bottom of the bath-tub
+failure curve. Real components also fail early (infant mortality) and wear
+out, so the rate of failure, the hazard h(t), depends on the age t of the
+component. Each model here is defined by its cumulative hazard
+H(t) = integral of h from 0 to t and its inverse:
+
+    exponential     --  A constant hazard, 1/MTBF
+    weibull         --  h(t) = (shape/scale)*(t/scale)**(shape - 1), falling
+                        for shape < 1 (infant mortality), rising for
+                        shape > 1 (wear out)
+    piecewise_hazard -- A constant hazard over each of a set of ages, see
+                        bathtub
+
+What a repair does to the age decides how failures follow each other:
+
+    renewal         --  The repair is as good as new and the age goes back to
+                        zero, so the times between failures are independent
+                        with survival exp(-H(t)). They are drawn by inverting
+                        the cumulative hazard, t = H^-1(E) with E a standard
+                        exponential.
+    minimal         --  The repair is as bad as old and the age carries on,
+                        so failures are a non-homogeneous Poisson process
+                        (NHPP) with intensity h(t). A unit rate Poisson
+                        process is mapped through H^-1, or, with
+                        method="thinning", a Poisson process at a bound of
+                        the hazard is thinned by h(t)/bound.
+
+Every sampler draws all the random numbers for every unit in a few calls, as
+failure_sampling.sample_failures, and sample_failures returns the same
+sorted timelines of failure_sampling.FAILURE_DTYPE.
+"""
+
+import math
+import numpy as np
+from failure_sampling import FAILURE_DTYPE, over_provision
+
+
+class failure_model(object):
+    """
+    A failure model defined by its cumulative hazard. Subclasses define
+    cumulative_hazard, inverse_cumulative_hazard, hazard and mean_life.
+    """
+
+    def cumulative_hazard(self, t):
+        raise NotImplementedError
+
+    def inverse_cumulative_hazard(self, h):
+        raise NotImplementedError
+
+    def hazard(self, t):
+        raise NotImplementedError
+
+    def mean_life(self):
+        """
+        The mean time to the first failure.
+        """
+        raise NotImplementedError
+
+    def hazard_bound(self, sim_length):
+        """
+        An upper bound of the hazard up to sim_length, for thinning.
+        """
+        raise NotImplementedError
+
+    def time_to_failure(self, age=0, size=None, seed=None):
+        """
+        Samples the time to the next failure of a unit of a given age, which
+        has survived to age, by inverting the cumulative hazard.
+        """
+        rng = np.random.default_rng(seed)
+        age = np.asarray(age, dtype=float)
+        exponential = rng.standard_exponential(size if size is not None else age.shape)
+        return self.inverse_cumulative_hazard(self.cumulative_hazard(age)
+                                              + exponential) - age
+
+    def sample(self, n_units, sim_length, repair="renewal", method="inverse",
+               seed=None):
+        """
+        Samples the failures of a number of units.
+
+        Inputs:
+            n_units     -   The number of units
+            sim_length  -   When to generate failures until
+            repair      -   "renewal" or "minimal", see the module
+            method      -   "inverse" or, for minimal repair, "thinning"
+            seed        -   A seed, numpy.random.SeedSequence or
+                            numpy.random.Generator for the random numbers
+
+        Outputs:
+            units       -   The unit of each failure
+            times       -   The time of each failure, sorted by unit and then
+                            time
+        """
+        rng = np.random.default_rng(seed)
+        if repair == "renewal":
+            if method != "inverse":
+                raise ValueError("renewal is only sampled by inversion")
+            return self._sample_renewal(n_units, sim_length, rng)
+        if repair == "minimal":
+            if method == "inverse":
+                return self._sample_minimal(n_units, sim_length, rng)
+            if method == "thinning":
+                return thinning(self.hazard, self.hazard_bound(sim_length),
+                                n_units, sim_length, rng)
+            raise ValueError("method must be 'inverse' or 'thinning', not %r"
+                             % (method,))
+        raise ValueError("repair must be 'renewal' or 'minimal', not %r"
+                         % (repair,))
+
+    def _sample_renewal(self, n_units, sim_length, rng):
+        n_draws = int(over_provision(sim_length/self.mean_life()))
+        times = np.cumsum(self.inverse_cumulative_hazard(
+            rng.standard_exponential((n_units, n_draws))), axis=1)
+        return _truncate(times, sim_length, lambda last, size: last[:, np.newaxis]
+                         + np.cumsum(self.inverse_cumulative_hazard(
+                             rng.standard_exponential(size)), axis=1))
+
+    def _sample_minimal(self, n_units, sim_length, rng):
+        # A unit rate Poisson process in cumulative hazard, mapped to time
+        total = float(self.cumulative_hazard(sim_length))
+        n_draws = int(over_provision(total))
+        hazards = np.cumsum(rng.standard_exponential((n_units, n_draws)), axis=1)
+        units, hazards = _truncate(hazards, total, lambda last, size: last[:, np.newaxis]
+                                   + np.cumsum(rng.standard_exponential(size), axis=1))
+        return units, self.inverse_cumulative_hazard(hazards)
+
+
+def _truncate(times, sim_length, more):
+    """
+    The unit and time of each of the (n_units, n) cumulative times before
+    sim_length, drawing more times with more(last times, shape) for the units
+    whose times all fell short of it.
+    """
+    rows = [times]
+    short = np.flatnonzero(times[:, -1] < sim_length)
+    last = times[short, -1]
+    while len(short):
+        block = more(last, (len(short), times.shape[1]))
+        extended = np.full((len(times), block.shape[1]), np.inf)
+        extended[short] = block
+        rows.append(extended)
+        still = block[:, -1] < sim_length
+        short, last = short[still], block[still, -1]
+    times = np.concatenate(rows, axis=1) if len(rows) > 1 else times
+    units, columns = np.nonzero(times < sim_length)
+    return units, times[units, columns]
+
+
+def thinning(hazard, bound, n_units, sim_length, rng):
+    """
+    Samples a non-homogeneous Poisson process with intensity hazard(t) by
+    thinning. Each unit has a Poisson number of candidate failures spread
+    uniformly over the simulation at the rate bound, and each is kept with
+    the probability hazard(t)/bound.
+
+    Outputs:
+        units, times -  As failure_model.sample
+    """
+    if not np.isfinite(bound) or bound <= 0:
+        raise ValueError("thinning needs a finite, positive hazard bound")
+    counts = rng.poisson(bound*sim_length, n_units)
+    units = np.repeat(np.arange(n_units), counts)
+    times = rng.uniform(0, sim_length, len(units))
+    kept = rng.random(len(units))*bound < hazard(times)
+    units, times = units[kept], times[kept]
+    order = np.lexsort((times, units))
+    return units[order], times[order]
+
+
+class exponential(failure_model):
+    """
+    A constant hazard, 1/mtbf.
+    """
+
+    def __init__(self, mtbf):
+        self.mtbf = float(mtbf)
+
+    def cumulative_hazard(self, t):
+        return np.asarray(t, dtype=float)/self.mtbf
+
+    def inverse_cumulative_hazard(self, h):
+        return np.asarray(h, dtype=float)*self.mtbf
+
+    def hazard(self, t):
+        return np.full(np.shape(t), 1/self.mtbf)
+
+    def mean_life(self):
+        return self.mtbf
+
+    def hazard_bound(self, sim_length):
+        return 1/self.mtbf
+
+
+class weibull(failure_model):
+    """
+    A Weibull hazard, h(t) = (shape/scale)*(t/scale)**(shape - 1).
+    """
+
+    def __init__(self, scale, shape):
+        self.scale = float(scale)
+        self.shape = float(shape)
+
+    @classmethod
+    def from_mtbf(cls, mtbf, shape):
+        """
+        A Weibull model with the mean life mtbf, e.g. to give a column of
+        the failure table a shape.
+        """
+        return cls(mtbf/math.gamma(1 + 1/shape), shape)
+
+    def cumulative_hazard(self, t):
+        return (np.asarray(t, dtype=float)/self.scale)**self.shape
+
+    def inverse_cumulative_hazard(self, h):
+        return self.scale*np.asarray(h, dtype=float)**(1/self.shape)
+
+    def hazard(self, t):
+        t = np.asarray(t, dtype=float)
+        return self.shape/self.scale*(t/self.scale)**(self.shape - 1)
+
+    def mean_life(self):
+        return self.scale*math.gamma(1 + 1/self.shape)
+
+    def hazard_bound(self, sim_length):
+        if self.shape < 1:
+            # The hazard is infinite at age zero
+            return np.inf
+        return float(self.hazard(sim_length))
+
+
+class piecewise_hazard(failure_model):
+    """
+    A hazard which is constant over each of a set of ages.
+
+    Attributes:
+        breaks  -   The ages at which the hazard changes, starting at 0
+        rates   -   The hazard from each break to the next, the last holding
+                    for every later age
+    """
+
+    def __init__(self, breaks, rates):
+        self.breaks = np.asarray(breaks, dtype=float)
+        self.rates = np.asarray(rates, dtype=float)
+        if len(self.breaks) != len(self.rates) or self.breaks[0] != 0:
+            raise ValueError("there must be a rate for each break, the first "
+                             "at age 0")
+        if np.any(np.diff(self.breaks) <= 0) or np.any(self.rates <= 0):
+            raise ValueError("the breaks must increase and the rates be "
+                             "positive")
+        # The cumulative hazard at each break
+        self._at_breaks = np.concatenate([[0], np.cumsum(np.diff(self.breaks)
+                                                         *self.rates[:-1])])
+
+    def cumulative_hazard(self, t):
+        t = np.asarray(t, dtype=float)
+        i = np.searchsorted(self.breaks, t, side="right") - 1
+        return self._at_breaks[i] + self.rates[i]*(t - self.breaks[i])
+
+    def inverse_cumulative_hazard(self, h):
+        h = np.asarray(h, dtype=float)
+        i = np.searchsorted(self._at_breaks, h, side="right") - 1
+        return self.breaks[i] + (h - self._at_breaks[i])/self.rates[i]
+
+    def hazard(self, t):
+        return self.rates[np.searchsorted(self.breaks, t, side="right") - 1]
+
+    def mean_life(self):
+        # The integral of the survival, exp(-H), over each piece
+        lengths = np.append(np.diff(self.breaks), np.inf)
+        return float(np.sum(np.exp(-self._at_breaks)
+                            *-np.expm1(-self.rates*lengths)/self.rates))
+
+    def hazard_bound(self, sim_length):
+        return float(self.rates[self.breaks < sim_length].max())
+
+
+def bathtub(mtbf, burn_in, wear_out, burn_in_factor=3, wear_out_factor=3):
+    """
+    A bath-tub failure curve as a piecewise_hazard. The hazard is
+    burn_in_factor/mtbf up to the age burn_in, 1/mtbf during the useful life,
+    and wear_out_factor/mtbf after the age wear_out.
+    """
+    return piecewise_hazard([0, burn_in, wear_out],
+                            np.array([burn_in_factor, 1, wear_out_factor])/mtbf)
+
+
+def sample_failures(models, sim_length, n_turbines=1, repair="renewal",
+                    method="inverse", seed=None):
+    """
+    Samples the failures of a set of turbines with a failure model for each
+    failure type, as failure_sampling.sample_failures.
+
+    Inputs:
+        models      -   A failure_model for each failure type
+        sim_length  -   When to generate failures until
+        n_turbines  -   The number of turbines
+        repair      -   "renewal" or "minimal", see the module
+        method      -   "inverse" or, for minimal repair, "thinning"
+        seed        -   A seed, numpy.random.SeedSequence or
+                        numpy.random.Generator for the random numbers
+
+    Outputs:
+        timelines   -   A list of the failures of each turbine, structured
+                        arrays of FAILURE_DTYPE sorted by time
+    """
+    rng = np.random.default_rng(seed)
+    samples = [model.sample(n_turbines, sim_length, repair=repair,
+                            method=method, seed=rng) for model in models]
+    failures = np.empty(sum(len(units) for units, _ in samples),
+                        dtype=FAILURE_DTYPE)
+    failures["Turbine"] = np.concatenate([units for units, _ in samples])
+    failures["Time"] = np.concatenate([times for _, times in samples])
+    failures["Type"] = np.repeat(np.arange(len(models)),
+                                 [len(units) for units, _ in samples])
+    failures = failures[np.lexsort((failures["Time"], failures["Turbine"]))]
+    counts = np.bincount(failures["Turbine"], minlength=n_turbines)
+    return np.split(failures, np.cumsum(counts)[:-1])
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Samples the failure timelines of a wind farm.
+
+Each failure type of each turbine fails with exponential times between
+failures, with the MTBF of the type. Rather than drawing one time at a time
+until the simulation length is reached, every time between failures of every
+turbine and failure type is drawn in one call. The number drawn is the
+expected number of failures plus a margin of several standard deviations
+(the count over the simulation is Poisson), so a timeline is almost never
+short. The times are summed with np.cumsum, truncated at the simulation
+length, and the few timelines which did not reach it are topped up.
+
+A timeline is a structured array of FAILURE_DTYPE sorted by time, so the
+timelines of many turbines can be merged in time order, either all at once
+with merge_failures or lazily with iter_failures, a k-way merge on a heap.
+
+When the failures are wanted one at a time, as in a simulation, a
+failure_stream samples them as they are needed without any timeline. The
+failure types are independent Poisson processes, so together they are one
+Poisson process with the sum of their rates, and each failure is of a type
+chosen with the probability of its share of the total rate. iter_streams
+merges the streams of a farm on a heap holding one failure per turbine.
+"""
+
+import heapq
+import os
+import numpy as np
+
+# The table of failure types of a turbine at the root of the repository
+FAILURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "..", "FAILURES.csv")
+
+# The columns of FAILURES_FILE, as they are named by the simulation scripts
+FAILURES_COLUMNS = {"Type": "Failure Type",
+                    "MTBF [hours]": "MTBF",
+                    "Active Maintainence Time": "LenOfRepair"}
+
+# A failure, its time, turbine and the index of its failure type. Time comes
+# first so failures compare by time as tuples.
+FAILURE_DTYPE = np.dtype([("Time", np.float64),
+                          ("Turbine", np.int32),
+                          ("Type", np.int16)])
+
+# The number of standard deviations of the number of failures drawn beyond
+# the expected number
+PROVISION_SIGMAS = 6
+
+
+def read_failures(file=FAILURES_FILE):
+    """
+    Reads the table of failure types, by default FAILURES.csv, with the
+    columns renamed to "Failure Type", "MTBF" (hours) and "LenOfRepair" (the
+    length of the repair in hours). Empty rows are dropped.
+    """
+    import pandas as pd
+    failures = pd.read_csv(file).rename(columns=FAILURES_COLUMNS)
+    return failures.dropna(how="all").reset_index(drop=True)
+
+
+def over_provision(expected):
+    """
+    The number of times between failures to draw when expected failures are
+    expected over the simulation. The number of failures is Poisson, so this
+    is short with a probability of about 1e-9.
+    """
+    expected = np.asarray(expected, dtype=float)
+    return np.ceil(expected + PROVISION_SIGMAS*np.sqrt(expected)
+                   + PROVISION_SIGMAS**2).astype(int)
+
+
+def sample_failures(mtbf, sim_length, n_turbines=1, seed=None):
+    """
+    Samples the failures of a set of turbines.
+
+    Inputs:
+        mtbf        -   The mean time between failures of each failure type
+        sim_length  -   When to generate failures until
+        n_turbines  -   The number of turbines
+        seed        -   A seed, numpy.random.SeedSequence or
+                        numpy.random.Generator for the random numbers
+
+    Outputs:
+        timelines   -   A list of the failures of each turbine, structured
+                        arrays of FAILURE_DTYPE sorted by time
+    """
+    rng = np.random.default_rng(seed)
+    mtbf = np.ravel(np.asarray(mtbf, dtype=float))
+    n_draws = over_provision(sim_length/mtbf)
+    edges = np.concatenate([[0], np.cumsum(n_draws)])
+
+    # Every time between failures in one call, the columns of each failure
+    # type scaled by its MTBF and summed into failure times
+    times = rng.standard_exponential((n_turbines, edges[-1]))
+    for i, scale in enumerate(mtbf):
+        block = times[:, edges[i]:edges[i+1]]
+        block *= scale
+        np.cumsum(block, axis=1, out=block)
+    types = np.repeat(np.arange(len(mtbf), dtype=FAILURE_DTYPE["Type"]),
+                      n_draws)
+
+    # Top up the rare timelines which did not reach the simulation length
+    topped_up = {}
+    for i, scale in enumerate(mtbf):
+        last = times[:, edges[i+1]-1]
+        for turbine in np.flatnonzero(last < sim_length):
+            time = last[turbine] + scale*rng.standard_exponential()
+            while time < sim_length:
+                topped_up.setdefault(turbine, []).append((time, turbine, i))
+                time += scale*rng.standard_exponential()
+
+    # Sort each turbine's failures by time, leaving those after the
+    # simulation length at the end of each row
+    times[times >= sim_length] = np.inf
+    order = np.argsort(times, axis=1, kind="stable")
+    times = np.take_along_axis(times, order, axis=1)
+    counts = np.sum(np.isfinite(times), axis=1)
+
+    failures = np.empty(counts.sum(), dtype=FAILURE_DTYPE)
+    kept = np.arange(times.shape[1]) < counts[:, np.newaxis]
+    failures["Time"] = times[kept]
+    failures["Type"] = types[order[kept]]
+    failures["Turbine"] = np.repeat(np.arange(n_turbines), counts)
+    timelines = np.split(failures, np.cumsum(counts)[:-1])
+
+    for turbine, more in topped_up.items():
+        timeline = np.concatenate([timelines[turbine],
+                                   np.array(more, dtype=FAILURE_DTYPE)])
+        timelines[turbine] = timeline[np.argsort(timeline["Time"],
+                                                 kind="stable")]
+    return timelines
+
+
+def merge_failures(timelines):
+    """
+    Merges the timelines of several turbines into one array of failures
+    sorted by time.
+    """
+    failures = np.concatenate(timelines)
+    return failures[np.argsort(failures["Time"], kind="stable")]
+
+
+def iter_failures(timelines):
+    """
+    Yields the failures of several turbines in order of time as (time,
+    turbine, type) tuples, merging the timelines lazily on a heap.
+    """
+    return heapq.merge(*[timeline.tolist() for timeline in timelines])
+
+
+def to_dataframe(failures, names=None):
+    """
+    A dataframe of failures, with the name of each failure type if the names
+    are given.
+    """
+    import pandas as pd
+    df = pd.DataFrame(failures)
+    if names is not None:
+        df["Type"] = np.asarray(names, dtype=object)[df["Type"]]
+    return df
+
+
+class failure_stream(object):
+    """
+    The failures of one turbine, sampled as they are needed.
+
+    The time to the next failure is exponential with the sum of the rates of
+    every failure type, and its type is chosen with the probability of the
+    share of its rate. Only the time of the last failure and a small block of
+    random numbers are kept, however long the simulation.
+
+    Iterating over a stream yields the failures as (time, turbine, type)
+    tuples, as iter_failures.
+
+    Attributes:
+        rate        -   The total failure rate
+        turbine     -   The turbine of the failures
+        time        -   The time of the last failure
+    """
+
+    def __init__(self, mtbf, seed=None, turbine=0, block=64):
+        """
+        Inputs:
+            mtbf        -   The mean time between failures of each failure
+                            type
+            seed        -   A seed, numpy.random.SeedSequence or
+                            numpy.random.Generator for the random numbers
+            turbine     -   The turbine of the failures
+            block       -   The number of failures sampled at a time
+        """
+        rates = 1/np.ravel(np.asarray(mtbf, dtype=float))
+        self.rate = rates.sum()
+        self._thresholds = np.cumsum(rates)/self.rate
+        self.turbine = turbine
+        self.time = 0.0
+        self._rng = np.random.default_rng(seed)
+        self._block = block
+        self._next = block
+
+    def _sample_block(self):
+        self._gaps = (self._rng.standard_exponential(self._block)/self.rate).tolist()
+        types = np.searchsorted(self._thresholds, self._rng.random(self._block),
+                                side="right")
+        self._types = np.minimum(types, len(self._thresholds) - 1).tolist()
+        self._next = 0
+
+    def next_failure(self):
+        """
+        Returns the time from the last failure to the next, and the type of
+        the next failure.
+        """
+        if self._next == self._block:
+            self._sample_block()
+        i = self._next
+        self._next += 1
+        self.time += self._gaps[i]
+        return self._gaps[i], self._types[i]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        _, failure_type = self.next_failure()
+        return self.time, self.turbine, failure_type
+
+
+def failure_streams(mtbf, n_turbines, seed=None):
+    """
+    A failure_stream for each of n_turbines turbines, with independent
+    random numbers spawned from seed.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [failure_stream(mtbf, seed=child, turbine=i)
+            for i, child in enumerate(seed.spawn(n_turbines))]
+
+
+def iter_streams(streams, until=np.inf):
+    """
+    Yields the failures of several failure_streams before until in order of
+    time, as (time, turbine, type) tuples. A heap holds the next failure of
+    each stream.
+    """
+    heap = []
+    for i, stream in enumerate(streams):
+        time, turbine, failure_type = next(stream)
+        if time < until:
+            heap.append((time, turbine, failure_type, i))
+    heapq.heapify(heap)
+    while heap:
+        time, turbine, failure_type, i = heap[0]
+        yield time, turbine, failure_type
+        failure = next(streams[i])
+        if failure[0] < until:
+            heapq.heapreplace(heap, failure + (i,))
+        else:
+            heapq.heappop(heap)
@@ -64,25 +64,26 @@ class schedule_manager(object):
             CTVs        -   A list of the CTVs
             SOVs        -   A list of the SOVs
             Helis       -   A list of the helicopters
+            vessels     -   A list of every vessel
             vessels_df  -   A dataframe of the fleet
+            fleet_index -   An interval_index of the events of every vessel
             failures    -   A dataframe of the current and previous failures
         """
 
-        # Create a dataframe which holds the locations of all of the vessels
-        self.vessels_df = pd.DataFrame([], columns=["Vessel", "Type", "ID", "Position", "Onboard Crew"])
-        
-        # Add the data about the vessles to the dataframe which holds all the
-        # vessels
-        for i in range(len(vessels)): # For each vessel type
-            for j in range(len(vessels[i])): # For each vessel of that type
-                # Add the vessels details
-                new_row = {'Vessel': vessels[i][j],
-                           'Type': vessels[i][j].type,
-                           'ID': vessels[i][j].ID,
-                           'Position': 'Harbour',
-                           'Onboard Crew': vessels[i][j].max_crew}
-
-                self.vessels_df = self.vessels_df.append(new_row, ignore_index=True)
+        # Create a dataframe which holds the locations of all of the vessels,
+        # from a list of the vessels of every type
+        self.vessels = [vessel for vessel_type in vessels for vessel in vessel_type]
+        self.vessels_df = pd.DataFrame({'Vessel': self.vessels,
+                                        'Type': [x.type for x in self.vessels],
+                                        'ID': [x.ID for x in self.vessels],
+                                        'Position': 'Harbour',
+                                        'Onboard Crew': [x.max_crew for x in self.vessels]},
+                                       columns=["Vessel", "Type", "ID", "Position", "Onboard Crew"])
+        # A merged interval_index of the events of every vessel, see
+        # fleet_index
+        self._fleet_index = None
+        self._fleet_edits = None
+        self._fleet_indexed = []
 
 # =============================================================================
 #       FOR TESTING ONLY, INPUT SOME EXMAPLE FAILURES AND SCHEDULE MAINTENANCE
@@ -146,10 +147,80 @@ class schedule_manager(object):
         Returns a dataframe of  vessels which are currently not in the harbour
         """
         current_time = 8 # Replace with env.now()
-        fleet_task = self.fleet_task_at_time(current_time)
-        vessels_at_sea = fleet_task["Position"] != "Harbour"
+        fleet_status = self.fleet_status_at_time(current_time)
+        vessels_at_sea = fleet_status["Position"] != "Harbour"
         return self.vessels_df[vessels_at_sea]
 
+    def fleet_status_at_time(self, time):
+        """
+        The task of every vessel at a given time, as a dictionary of arrays
+        with one entry per vessel in the order of vessels_df. Each vessel's
+        task is found by a binary search of its schedule.
+
+        Inputs:
+            time    -   Time to find the given tasks
+
+        Outputs:
+            status  -   A dictionary of the columns of fleet_task_at_time
+        """
+        status = {"Vessel": np.array(self.vessels, dtype=object),
+                  "ID": np.array([vessel.ID for vessel in self.vessels])}
+        events = [vessel.schedule.get_schedule_at_time(time) for vessel in self.vessels]
+        for name, dtype in SCHEDULE_COLUMNS.items():
+            status[name] = np.array([event[name] for event in events], dtype=dtype)
+        return status
+
+    @property
+    def fleet_index(self):
+        """
+        An interval_index of the events of every vessel, with the crew on
+        board and whether the vessel is free in each, brought up to date with
+        the events added since it was last used. It is made again if an event
+        has been edited.
+        """
+        edits = [vessel.schedule.edits for vessel in self.vessels]
+        if self._fleet_index is None or edits != self._fleet_edits:
+            self._fleet_index = interval_index(columns={"crew": np.int64,
+                                                        "free": bool})
+            self._fleet_edits = edits
+            self._fleet_indexed = [0]*len(self.vessels)
+        new = []
+        for i, vessel in enumerate(self.vessels):
+            first, size = self._fleet_indexed[i], len(vessel.schedule)
+            if first < size:
+                new.append((vessel.schedule.column("Start")[first:],
+                            vessel.schedule.column("Finish")[first:],
+                            np.full(size - first, i),
+                            np.arange(first, size),
+                            vessel.schedule.column("Crew on board")[first:],
+                            vessel.schedule.free(slice(first, size))))
+                self._fleet_indexed[i] = size
+        if new:
+            # Added together, so the new events of every vessel are sorted
+            # at once and appended if they start after the indexed events
+            start, finish, vessel, event, crew, free = [np.concatenate(column)
+                                                        for column in zip(*new)]
+            self._fleet_index.extend(start, finish, vessel, event,
+                                     crew=crew, free=free)
+        return self._fleet_index
+
+    def vessels_with_crew(self, t1, t2, required_crew):
+        """
+        The positions in vessels_df of the vessels which are free with at
+        least required_crew on board throughout the window [t1, t2), those
+        whose events in the window are all free with enough crew, see
+        schedule.free_with_crew. Vessels without events in the window are
+        left out. Use vessels_df.iloc on them for a dataframe of the vessels.
+        """
+        index = self.fleet_index
+        found = index.overlapping(t1, t2)
+        vessel = index.vessel[found]
+        unfit = (index.crew[found] < required_crew) | ~index.free[found]
+        n_vessels = len(self.vessels)
+        in_window = np.bincount(vessel, minlength=n_vessels) > 0
+        any_unfit = np.bincount(vessel[unfit], minlength=n_vessels) > 0
+        return np.flatnonzero(in_window & ~any_unfit)
+
     def fleet_task_at_time(self, time):
         """
         Creates a dataframe of the fleets tasks in the schedule at a given time
@@ -160,7 +231,8 @@ class schedule_manager(object):
         Outputs:
             df      -   A dataframe of vessels and the task information
         """
-        df = pd.DataFrame(columns = ["Vessel",
+        return pd.DataFrame(self.fleet_status_at_time(time),
+                            columns=["Vessel",
                                      "ID",
                                      "Task",
                                      "Start",
@@ -168,24 +240,7 @@ class schedule_manager(object):
                                      "Crew on board",
                                      "Resource",
                                      "Position"])
-        # For each vessel
-        for i, vessel in enumerate(self.vessels_df["Vessel"]):
-            # Get the task at the time
-            vessel_schedule = vessel.schedule.get_schedule_at_time(time)
-            new_row = {'Vessel': vessel,
-                       'ID': vessel.ID,
-                       'Task': vessel_schedule["Task"],
-                       'Start': vessel_schedule["Start"],
-                       'Finish': vessel_schedule["Finish"],
-                       'Crew on board': vessel_schedule["Crew on board"],
-                       'Resource': vessel_schedule["Resource"],
-                       'Position': vessel_schedule["Position"]}
-            # Add it to the dataframe
-            df = df.append(new_row, ignore_index=True)
-            
-        return df
-            
-    
+
     def say_hello(self):
         """
         Print hello.
@@ -199,51 +254,298 @@ class schedule_manager(object):
         return 2
 
 
+# The columns of a schedule, and the type of each in the columnar store
+SCHEDULE_COLUMNS = {"Task": object,
+                    "Start": float,
+                    "Finish": float,
+                    "Crew on board": np.int64,
+                    "Resource": object,
+                    "Position": object}
+
+# The resources of the events in which a vessel is free to be given a task
+FREE_RESOURCES = ["Waiting"]
+
+
+def _grown(array, size):
+    """
+    A copy of the first size entries of array, with twice the capacity.
+    """
+    grown = np.empty(2*len(array), dtype=array.dtype)
+    grown[:size] = array[:size]
+    return grown
+
+
+class interval_index(object):
+    """
+    A sorted index of the events of one or more schedules, for finding the
+    events which overlap a window of time.
+
+    The events are kept in order of their start time, with the vessel and
+    position of each in its schedule and any further columns the index was
+    made with, along with the running maximum of the
+    finish times in that order. Every event before the first whose running
+    maximum is after t1 finishes by t1, and every event from the first
+    starting at or after t2 starts too late, so the events overlapping
+    [t1, t2) lie between two binary searches. For a timeline of consecutive
+    events every event between them overlaps the window.
+
+    Events added in order of their start time are appended, others are
+    merged in by sorting the index again.
+
+    Attributes:
+        start           -   The start time of each event
+        finish          -   The finish time of each event
+        latest_finish   -   The running maximum of finish
+        vessel          -   The vessel of each event
+        event           -   The position of each event in its schedule
+
+    and each further column by its name.
+    """
+
+    def __init__(self, capacity=16, columns=None):
+        """
+        Inputs:
+            capacity    -   The number of events allocated at first
+            columns     -   A dictionary of the type of each further column
+                            kept for the events, given to extend by name
+        """
+        self._arrays = {"start": np.empty(capacity),
+                        "finish": np.empty(capacity),
+                        "latest_finish": np.empty(capacity),
+                        "vessel": np.empty(capacity, dtype=np.int64),
+                        "event": np.empty(capacity, dtype=np.int64)}
+        for name, dtype in (columns or {}).items():
+            self._arrays[name] = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_arrays"][name][:self._size]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def extend(self, start, finish, vessel, event, **columns):
+        """
+        Adds events to the index, with the value of each further column of
+        the index as a keyword.
+        """
+        start = np.asarray(start, dtype=float)
+        order = np.argsort(start, kind="stable")
+        new = {"start": start[order],
+               "finish": np.asarray(finish, dtype=float)[order],
+               "vessel": np.broadcast_to(vessel, start.shape)[order],
+               "event": np.asarray(event)[order]}
+        for name, value in columns.items():
+            new[name] = np.broadcast_to(value, start.shape)[order]
+        if not len(start):
+            return
+        first = self._size
+        if first and new["start"][0] < self._arrays["start"][first-1]:
+            # Out of order, sort the whole index again
+            old = {name: getattr(self, name) for name in new}
+            new = {name: np.concatenate([old[name], new[name]]) for name in new}
+            order = np.argsort(new["start"], kind="stable")
+            new = {name: value[order] for name, value in new.items()}
+            first = self._size = 0
+        while first + len(new["start"]) > len(self._arrays["start"]):
+            self._arrays = {name: _grown(array, first)
+                            for name, array in self._arrays.items()}
+        stop = first + len(new["start"])
+        for name, value in new.items():
+            self._arrays[name][first:stop] = value
+        latest = self._arrays["latest_finish"]
+        np.maximum.accumulate(new["finish"], out=latest[first:stop])
+        if first:
+            np.maximum(latest[first:stop], latest[first-1], out=latest[first:stop])
+        self._size = stop
+
+    def overlapping(self, t1, t2):
+        """
+        The positions in the index of the events which overlap the window
+        [t1, t2), which start before t2 and finish after t1.
+        """
+        first = np.searchsorted(self.latest_finish, t1, side="right")
+        last = np.searchsorted(self.start, t2, side="left")
+        if first >= last:
+            return np.arange(0)
+        candidates = np.arange(first, last)
+        return candidates[self._arrays["finish"][first:last] > t1]
+
+
 class schedule(object):
     """
+    The schedule of a vessel, a list of events.
+
+    The events are kept as columns, one NumPy array per column, which are
+    allocated with spare capacity and doubled in size when they are full, so
+    adding an event takes constant time rather than copying the schedule as
+    DataFrame.append did. A running maximum of the finish times is kept
+    alongside, which never decreases, so the first event finishing at or
+    after a time is found by a binary search. The schedule is only made into
+    a DataFrame when it is asked for.
+
+    Range queries use an interval_index of the events, which is updated
+    with the events added since it was last used.
+
+    Attributes:
+        ID                  -   The ID of the vessel
+        schedule            -   A dataframe of the events
+        index               -   An interval_index of the events
+        current_position    -   The current position of the vessel
     """
 
-    def __init__(self, ID):
+    def __init__(self, ID, capacity=16):
         """
+        Inputs:
+            ID          -   The ID of the vessel
+            capacity    -   The number of events allocated at first
         """
         self.ID = ID
 #        self.schedule_manager = schedule_manager
-        self.schedule = pd.DataFrame(columns=["Task",
-                                              "Start",
-                                              "Finish",
-                                              "Crew on board",
-                                              "Resource",
-                                              "Position"])
+        self._columns = {name: np.empty(capacity, dtype=dtype)
+                         for name, dtype in SCHEDULE_COLUMNS.items()}
+        self._latest_finish = np.empty(capacity)
+        self._size = 0
+        # The number of times an event has been edited, after which the
+        # interval indexes of the events have to be made again
+        self.edits = 0
+        self._index = None
         self.current_position = "Harbour"
 
+    def __len__(self):
+        return self._size
+
+    @property
+    def schedule(self):
+        """
+        A dataframe of the events.
+        """
+        return self.to_dataframe()
+
+    def column(self, name):
+        """
+        A read only view of a column of the events.
+        """
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def to_dataframe(self, events=slice(None)):
+        """
+        A dataframe of the events, or of a slice, index array or boolean mask
+        of them, indexed by their position in the schedule.
+        """
+        index = np.arange(self._size)[events]
+        return pd.DataFrame({name: column[:self._size][events]
+                             for name, column in self._columns.items()},
+                            index=index)
+
+    def _grow(self):
+        self._columns = {name: _grown(column, self._size)
+                         for name, column in self._columns.items()}
+        self._latest_finish = _grown(self._latest_finish, self._size)
+
+    @property
+    def index(self):
+        """
+        An interval_index of the events, brought up to date with the events
+        added since it was last used.
+        """
+        if self._index is None:
+            self._index = interval_index()
+        first = len(self._index)
+        if first < self._size:
+            self._index.extend(self._columns["Start"][first:self._size],
+                               self._columns["Finish"][first:self._size],
+                               0, np.arange(first, self._size))
+        return self._index
+
+    def events_between(self, t1, t2):
+        """
+        The positions in the schedule of the events which overlap the window
+        [t1, t2), in order of their start time.
+        """
+        index = self.index
+        return index.event[index.overlapping(t1, t2)]
+
     def add_event(self, task, start, finish, crew_on_board, resource, position):
         """
+        Adds an event to the end of the schedule.
         """
-        new_row = {"Task": task,
-                   "Start": start,
-                   "Finish": finish,
-                   "Crew on board": crew_on_board,
-                   "Resource": resource,
-                   "Position": position}
-        self.schedule = self.schedule.append(new_row, ignore_index=True)
-    
+        if self._size == len(self._latest_finish):
+            self._grow()
+        i = self._size
+        for name, value in zip(SCHEDULE_COLUMNS, (task, start, finish,
+                                                  crew_on_board, resource,
+                                                  position)):
+            self._columns[name][i] = value
+        self._latest_finish[i] = finish if i == 0 else max(finish, self._latest_finish[i-1])
+        self._size += 1
+
     def edit_event(self, ID, task, start, finish, crew_on_board, resource, position):
         """
+        Replaces the event at position ID in the schedule.
         """
-        new_row = {"Task": task,
-                   "Start": start,
-                   "Finish": finish,
-                   "Crew on board": crew_on_board,
-                   "Resource": resource,
-                   "Position": position}
-        self.schedule.iloc[ID] = new_row
-    
-    def get_times_with_required_crew(self, required_crew):
+        if not -self._size <= ID < self._size:
+            raise IndexError("event %d is not in a schedule of %d events"
+                             % (ID, self._size))
+        ID %= self._size
+        for name, value in zip(SCHEDULE_COLUMNS, (task, start, finish,
+                                                  crew_on_board, resource,
+                                                  position)):
+            self._columns[name][ID] = value
+        # The running maximum only changes from the edited event on
+        finish_times = self._columns["Finish"][:self._size]
+        latest = self._latest_finish[:self._size]
+        np.maximum.accumulate(finish_times[ID:], out=latest[ID:])
+        if ID:
+            np.maximum(latest[ID:], latest[ID-1], out=latest[ID:])
+        self.edits += 1
+        self._index = None
+
+    def free(self, events=slice(None)):
         """
+        If the vessel is free in each of the events, a slice, index array or
+        boolean mask of them, those whose resource is in FREE_RESOURCES.
         """
-        df = self.schedule[self.schedule["Crew on board"] >= required_crew]
-        return df
-    
+        return np.isin(self._columns["Resource"][:self._size][events],
+                       FREE_RESOURCES)
+
+    def get_times_with_required_crew(self, required_crew, t1=-np.inf, t2=np.inf):
+        """
+        The positions in the schedule of the events in which the vessel is
+        free with at least required_crew on board, of those which overlap the
+        window [t1, t2), in order of their start time. Pass them to
+        to_dataframe for a dataframe of the events.
+        """
+        events = self.events_between(t1, t2)
+        found = ((self._columns["Crew on board"][events] >= required_crew)
+                 & self.free(events))
+        return events[found]
+
+    def free_with_crew(self, t1, t2, required_crew):
+        """
+        If the vessel is free with at least required_crew on board throughout
+        the window [t1, t2), in every event which overlaps it. False if no
+        event overlaps the window.
+        """
+        events = self.events_between(t1, t2)
+        return bool(len(events)) and len(self.get_times_with_required_crew(
+            required_crew, t1, t2)) == len(events)
+
+    def min_crew_between(self, t1, t2):
+        """
+        The fewest crew on board over the events which overlap the window
+        [t1, t2), or None if there are no such events.
+        """
+        events = self.events_between(t1, t2)
+        if not len(events):
+            return None
+        return self._columns["Crew on board"][events].min()
+
     def plot_gantt_chart(self):
         """
         Plot a gantt chart of the vessels schedule
@@ -262,12 +564,26 @@ class schedule(object):
                               title = "Vessel " + str(self.ID))
         fig.show()
         return df
-    
+
+    def event_index_at_time(self, time):
+        """
+        The position of the first event which finishes at or after time, or
+        -1 if every event has finished.
+        """
+        i = int(np.searchsorted(self._latest_finish[:self._size], time,
+                                side="left"))
+        return i if i < self._size else -1
+
     def get_schedule_at_time(self, time):
         """
+        Returns the first event which finishes at or after time, as a
+        dictionary of its columns.
         """
-        event = self.schedule[self.schedule["Finish"]>=time].iloc[0]
-        return event
+        i = self.event_index_at_time(time)
+        if i < 0:
+            raise IndexError("vessel %s has no event finishing after %s"
+                             % (self.ID, time))
+        return {name: column[i] for name, column in self._columns.items()}
 
 class CTV(object):
     """
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Runs Monte Carlo replications of the wind farm O&M simulation.
+
+The turbines and resource manager of the simulation are in wind_farm.py,
+which keeps nothing in module globals. A scenario is a plain picklable
+object describing the farm, and every replication builds its own simpy
+environment and wind_farm.farm from it. The replications run in a process
+pool, each with an independent stream of random numbers spawned from one
+numpy.random.SeedSequence, so the results only depend on the seed and not
+on the number of processes.
+
+The KPIs of each replication stream back as they finish into a
+kpi_aggregate, which keeps their running mean and variance with Welford's
+algorithm and gives Student t confidence intervals of the means, without
+storing every replication. Replications which finish early are held until
+those before them have finished, so the aggregate adds them in the order of
+their index and is the same to the last bit for any number of processes.
+
+    python replications.py [number of replications] [number of processes]
+"""
+
+import multiprocessing
+import os
+import sys
+import numpy as np
+import pandas as pd
+import simpy
+from scipy import stats
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "Failure Generation"))
+import failure_sampling
+import wind_farm
+
+YEARS = 25
+WEEKS = 52
+SIM_TIME = YEARS*WEEKS*7*24
+
+
+class scenario(object):
+    """
+    A wind farm to simulate, holding only plain values so it can be sent to
+    other processes.
+
+    Attributes:
+        n_turbines      -   The number of turbines
+        n_vessels       -   The number of vessels, which repair one turbine
+                            at a time
+        sim_time        -   The length of the simulation in hours
+        failures        -   The failure types, with the columns
+                            "Failure Type", "MTBF" and "LenOfRepair"
+    """
+
+    def __init__(self, n_turbines=50, n_vessels=1, sim_time=SIM_TIME,
+                 failures=None):
+        """
+        Inputs:
+            n_turbines  -   The number of turbines
+            n_vessels   -   The number of vessels. A single CTV, as in
+                            "environment process.py", is busy about 0.75%
+                            of the time per turbine with the shared failure
+                            table, so it can serve up to about 130 turbines.
+            sim_time    -   The length of the simulation in hours
+            failures    -   A dataframe of the failure types, by default
+                            failure_sampling.read_failures()
+        """
+        if failures is None:
+            failures = failure_sampling.read_failures()
+        self.n_turbines = n_turbines
+        self.n_vessels = n_vessels
+        self.sim_time = sim_time
+        self.failures = failures[["Failure Type", "MTBF", "LenOfRepair"]].copy()
+
+    def run(self, seed=None):
+        """
+        Runs one replication of the simulation.
+
+        Inputs:
+            seed    -   A seed or numpy.random.SeedSequence, from which the
+                        failure stream of each turbine is spawned
+
+        Outputs:
+            kpis    -   A dictionary of the KPIs of the replication
+        """
+        env = simpy.Environment()
+        streams = failure_sampling.failure_streams(self.failures["MTBF"],
+                                                   self.n_turbines, seed=seed)
+        turbines, manager = wind_farm.farm(env, streams, self.failures,
+                                           n_vessels=self.n_vessels,
+                                           keep_failures=False)
+        env.run(until=self.sim_time)
+
+        downtime = np.array([x.total_downtime() for x in turbines])
+        failures = np.array([x.num_failures for x in turbines])
+        return {"Availability": float(1 - downtime.sum()/(self.sim_time*self.n_turbines)),
+                "Failures": int(failures.sum()),
+                "Failures per turbine": float(failures.mean()),
+                "Downtime per turbine": float(downtime.mean()),
+                "Downtime per failure": float(downtime.sum()/max(failures.sum(), 1)),
+                "Waiting per repair": float(manager.waiting_time/max(manager.num_requests, 1))}
+
+
+class kpi_aggregate(object):
+    """
+    The running mean and variance of each KPI over the replications, updated
+    one replication at a time with Welford's algorithm.
+
+    Attributes:
+        count   -   The number of replications
+        mean    -   A dictionary of the mean of each KPI
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = {}
+        self._m2 = {}
+
+    def update(self, kpis):
+        """
+        Adds the KPIs of a replication.
+        """
+        self.count += 1
+        for name, value in kpis.items():
+            mean = self.mean.get(name, 0.0)
+            delta = value - mean
+            mean += delta/self.count
+            self._m2[name] = self._m2.get(name, 0.0) + delta*(value - mean)
+            self.mean[name] = mean
+
+    def variance(self, name):
+        """
+        The sample variance of a KPI over the replications.
+        """
+        if self.count < 2:
+            return np.nan
+        return self._m2[name]/(self.count - 1)
+
+    def confidence_interval(self, name, level=0.95):
+        """
+        The Student t confidence interval of the mean of a KPI.
+        """
+        if self.count < 2:
+            return (np.nan, np.nan)
+        half_width = (stats.t.ppf(0.5 + level/2, self.count - 1)
+                      *np.sqrt(self.variance(name)/self.count))
+        return (self.mean[name] - half_width, self.mean[name] + half_width)
+
+    def summary(self, level=0.95):
+        """
+        A dataframe of the mean, standard deviation and confidence interval
+        of the mean of each KPI.
+        """
+        rows = []
+        for name in self.mean:
+            low, high = self.confidence_interval(name, level)
+            rows.append([name, self.mean[name], np.sqrt(self.variance(name)),
+                         low, high, self.count])
+        return pd.DataFrame(rows, columns=["KPI", "Mean", "Std",
+                                           "CI low", "CI high",
+                                           "Replications"]).set_index("KPI")
+
+
+def run_replication(task):
+    """
+    Runs one replication in a worker process. task is (scenario, index,
+    seed), returns (index, kpis).
+    """
+    scenario, index, seed = task
+    return index, scenario.run(seed)
+
+
+def run_replications(scenario, n_replications, seed=None, processes=None,
+                     keep=False, callback=None):
+    """
+    Runs replications of a scenario, across a process pool.
+
+    Inputs:
+        scenario        -   A scenario
+        n_replications  -   The number of replications
+        seed            -   A seed or numpy.random.SeedSequence, from which
+                            the seed of each replication is spawned
+        processes       -   The number of processes, all the CPUs if None.
+                            With 1 the replications run in this process.
+        keep            -   If the KPIs of every replication are kept
+        callback        -   Called as callback(index, kpis, aggregate) as
+                            each replication is added to the aggregate, in
+                            order of index, e.g. to report progress
+
+    Outputs:
+        aggregate       -   A kpi_aggregate of the replications
+        replications    -   If keep, a dataframe of the KPIs of each
+                            replication, indexed by replication
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    tasks = [(scenario, i, child) for i, child in enumerate(seed.spawn(n_replications))]
+    aggregate = kpi_aggregate()
+    kept = {}
+
+    def collect(results):
+        # The replications which finished before one with a lower index
+        pending = {}
+        for index, kpis in results:
+            pending[index] = kpis
+            while aggregate.count in pending:
+                next_index = aggregate.count
+                kpis = pending.pop(next_index)
+                aggregate.update(kpis)
+                if keep:
+                    kept[next_index] = kpis
+                if callback is not None:
+                    callback(next_index, kpis, aggregate)
+
+    if processes == 1:
+        collect(map(run_replication, tasks))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            collect(pool.imap_unordered(run_replication, tasks))
+
+    if keep:
+        return aggregate, pd.DataFrame.from_dict(kept, orient="index").sort_index()
+    return aggregate
+
+
+if __name__ == "__main__":
+    n_replications = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    farm = scenario()
+
+    def progress(index, kpis, aggregate):
+        low, high = aggregate.confidence_interval("Availability")
+        print("Replication %d: availability %.5f, mean %.5f (%.5f - %.5f)"
+              % (index, kpis["Availability"], aggregate.mean["Availability"],
+                 low, high))
+
+    aggregate = run_replications(farm, n_replications, seed=42,
+                                 processes=processes, callback=progress)
+    print()
+    print(aggregate.summary().to_string())
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+The turbines and resource manager of the wind farm O&M simulation, first
+written in "environment process.py".
+
+A turbine works until its next failure, then asks the resource manager for
+a repair and waits until it is fixed. The resource manager queues the
+repair for a vessel of the fleet, a simpy.PreemptiveResource, records it in
+its failure list and signals the turbine once the vessel has finished the
+repair. Only the time working counts towards the next failure.
+
+Nothing is kept in module globals: the environment, the fleet and the
+failure stream of each turbine are passed in, so a script can build as many
+farms as it needs, see farm and replications.py.
+"""
+
+import numpy as np
+import pandas as pd
+import simpy
+
+# The columns of resource_manager.failure_list
+FAILURE_LIST_COLUMNS = ["Turbine", "Failure", "Status", "Time to repaired",
+                        "Start", "Finish", "Type", "CTV", "SOV",
+                        "Helicopter", "Failure ID"]
+
+
+class turbine(object):
+    """
+    A turbine produces electrictiy when not broken, and stops when there is a
+    failure
+
+    Attributes:
+        power           -   The time spent working, up to the last failure
+        downtime        -   The time spent broken, up to the last repair
+        num_failures    -   The number of failures
+        broken          -   If the turbine is waiting for a repair
+    """
+
+    def __init__(self, env, name, resource_manager, failure_stream,
+                 failure_names, repair_times):
+        """
+        Inputs:
+            env             -   The simpy environment
+            name            -   The name of the turbine
+            resource_manager -  The resource_manager of the fleet
+            failure_stream  -   A failure_sampling.failure_stream of the
+                                failures of the turbine
+            failure_names   -   The name of each failure type
+            repair_times    -   The length of the repair of each failure
+                                type
+        """
+        self.env = env
+        self.name = name
+        self.failure_stream = failure_stream
+        self.failure_names = failure_names
+        self.repair_times = repair_times
+        self.power = 0
+        self.downtime = 0
+        self.num_failures = 0
+        self.failure_type = ""
+        self.time_to_fail = 0
+        self.len_of_repair = 0
+        self.broken = False
+        self.broken_since = 0
+        self.fixed = env.event()
+        self.process = env.process(self.working(resource_manager))
+
+    def working(self, resource_manager):
+        while True:
+            try:
+                # Create a failure
+                start = self.env.now
+                self.failure_type, self.time_to_fail, self.len_of_repair = self.break_machine()
+
+                # Wait until that failure occurs
+                yield self.env.timeout(self.time_to_fail)
+                self.power += self.env.now - start
+                self.num_failures += 1
+
+                # Wait until the failure is fixed
+                yield self.env.process(self.broken_machine(resource_manager))
+
+            except simpy.Interrupt:
+                print("Interrupted")
+
+    def broken_machine(self, resource_manager):
+        """
+        Asks the resource manager for a repair and waits until the turbine
+        is fixed.
+        """
+        self.broken = True
+        self.broken_since = self.env.now
+        self.fixed = self.env.event()
+        resource_manager.request_resource(self, self.failure_type,
+                                          self.len_of_repair)
+        yield self.fixed
+        self.downtime += self.env.now - self.broken_since
+        self.broken = False
+
+    def break_machine(self):
+        """
+        The type, time from now and length of repair of the next failure. The
+        time is from now as the turbine only fails while it is working.
+        """
+        fail_time, fail_type = self.failure_stream.next_failure()
+        return (self.failure_names[fail_type], fail_time,
+                self.repair_times[fail_type])
+
+    def total_downtime(self):
+        """
+        The time spent broken, including a failure which is not yet repaired.
+        """
+        if self.broken:
+            return self.downtime + self.env.now - self.broken_since
+        return self.downtime
+
+
+class resource_manager(object):
+    """
+    Manages the fleet of vessels
+
+    Attributes:
+        num_requests    -   The number of repairs requested
+        waiting_time    -   The total time turbines waited for a vessel,
+                            over the repairs which have started
+    """
+
+    def __init__(self, env, name, CTVs, keep_failures=True):
+        """
+        Inputs:
+            env             -   The simpy environment
+            name            -   The name of the resource manager
+            CTVs            -   The fleet, a list of simpy resources. Every
+                                repair uses the first.
+            keep_failures   -   If a row of the failure list is kept for
+                                every repair
+        """
+        self.env = env
+        self.name = name
+        self.CTVs = CTVs
+        self.keep_failures = keep_failures
+        self.failures = []
+        self.failure_id = 0
+        self.num_requests = 0
+        self.waiting_time = 0
+
+    @property
+    def failure_list(self):
+        """
+        A dataframe of every repair, with the columns FAILURE_LIST_COLUMNS.
+        """
+        return pd.DataFrame(self.failures, columns=FAILURE_LIST_COLUMNS)
+
+    def request_resource(self, turbine, failure_type, len_of_repair):
+        """
+        A wind turbine has requested a vessel to fix a failure. The repair
+        waits in the queue of the fleet until a vessel is free, and the
+        turbine's fixed event succeeds once it is done.
+        """
+        failure = None
+        if self.keep_failures:
+            failure = [turbine.name, failure_type, "unrepaired", len_of_repair,
+                       self.env.now, np.nan, "corrective", 1, 1, 0,
+                       self.failure_id]
+            self.failures.append(failure)
+        self.failure_id += 1
+        self.num_requests += 1
+        return self.env.process(self.waiting_failure(turbine, len_of_repair,
+                                                     failure))
+
+    def waiting_failure(self, turbine, len_of_repair, failure=None):
+        CTV = self.CTVs[0]
+        requested = self.env.now
+        with CTV.request(priority=1) as req:
+            yield req
+            self.waiting_time += self.env.now - requested
+            yield self.env.timeout(len_of_repair)
+        if failure is not None:
+            failure[2] = "repaired"
+            failure[3] = 0
+            failure[5] = self.env.now
+        turbine.fixed.succeed()
+
+
+def farm(env, failure_streams, failures, n_vessels=1, keep_failures=True):
+    """
+    Builds a wind farm in an environment, a turbine for each failure stream
+    sharing a fleet of n_vessels vessels.
+
+    Inputs:
+        env             -   The simpy environment
+        failure_streams -   The failure_sampling.failure_stream of each
+                            turbine
+        failures        -   The failure types, with the columns
+                            "Failure Type" and "LenOfRepair", see
+                            failure_sampling.read_failures
+        n_vessels       -   The number of vessels
+        keep_failures   -   If the resource manager keeps a failure list
+
+    Outputs:
+        turbines        -   A list of the turbines
+        manager         -   The resource_manager of the fleet
+    """
+    CTVs = [simpy.PreemptiveResource(env, capacity=n_vessels)]
+    manager = resource_manager(env, "rm1", CTVs, keep_failures=keep_failures)
+    failure_names = list(failures["Failure Type"])
+    repair_times = [float(x) for x in failures["LenOfRepair"]]
+    turbines = [turbine(env, i, manager, stream, failure_names, repair_times)
+                for i, stream in enumerate(failure_streams)]
+    return turbines, manager
@@ -5,12 +5,111 @@ Created on Mon Nov 30 16:02:15 2020
 @author: Rastko
 """
 
+import collections.abc
+import time
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from mpl_toolkits.mplot3d import Axes3D
 from scipy.spatial.transform import Rotation as R
+import differentiation
+
+
+# The rows of the backing store of an ansys_accelerometer
+STORE_ROWS = ["Time", "X", "Y", "Z", "Rot x", "Rot y", "Rot z",
+              "Acc x", "Acc y", "Acc z"]
+
+
+class parameter:
+    """
+    An input of an ansys_accelerometer. Setting it removes every
+    lazy_quantity which depends on it from the cache.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+        instance.invalidate(self.name)
+
+
+class lazy_quantity:
+    """
+    A derived quantity of an ansys_accelerometer, which is calculated the
+    first time it is used and kept until a parameter or quantity it depends
+    on changes.
+
+    Used as a decorator, with the names of what the quantity depends on:
+
+        @lazy_quantity("acc_directions", "rotation")
+        def rotated_acc_directions(self):
+    """
+
+    def __init__(self, *depends_on):
+        self.depends_on = depends_on
+
+    def __call__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        cache = instance.__dict__.setdefault("_cache", {})
+        if self.name not in cache:
+            start = time.perf_counter()
+            cache[self.name] = self.function(instance)
+            instance.report_compute(self.name, time.perf_counter()-start)
+        return cache[self.name]
+
+
+class motion_data_view(collections.abc.Mapping):
+    """
+    A read only dictionary of the motion data of an ansys_accelerometer. The
+    values are looked up on the accelerometer when they are read, so nothing
+    is copied and derived quantities are only calculated once they are used.
+    """
+
+    KEYS = {'Ax': lambda acc: acc.rotated_acc_vectors[:, 0],
+            'Ay': lambda acc: acc.rotated_acc_vectors[:, 1],
+            'Az': lambda acc: acc.rotated_acc_vectors[:, 2],
+            'Roll': lambda acc: acc.new_rotations[0],
+            'Pitch': lambda acc: acc.new_rotations[1],
+            'Yaw': lambda acc: acc.new_rotations[2],
+            'Roll acc': lambda acc: acc.rotational_acc[0],
+            'Pitch acc': lambda acc: acc.rotational_acc[1],
+            'Yaw acc': lambda acc: acc.rotational_acc[2],
+            'Time': lambda acc: acc.t,
+            'Position': lambda acc: acc.position}
+
+    def __init__(self, accelerometer):
+        self.accelerometer = accelerometer
+
+    def __getitem__(self, key):
+        return self.KEYS[key](self.accelerometer)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
 
 
 class ansys_accelerometer:
@@ -18,9 +117,31 @@ class ansys_accelerometer:
     Converts the global positioning data provided by ANSYS into what an
     accelerometer would measure at the COG. The accelerations can then be
     translated to any point.
+
+    The time, position, rotation and global acceleration of every frame can
+    be kept in a memory mapped file instead of in memory, see backing_file.
+    The file holds a C ordered float64 array of shape (10, num_frames), with
+    one row for each of STORE_ROWS: the time, the position X, Y, Z, the
+    rotation Rot x, Rot y, Rot z and the global acceleration Acc x, Acc y,
+    Acc z, which is written when the acceleration is calculated.
+
+    The derived quantities (the global acceleration, rotated directions and
+    accelerations, rotations and rotational accelerations in the local
+    reference frame) are lazy_quantity's, calculated the first time they are
+    used and then kept. Changing a parameter, e.g. person_rot or
+    differentiator, clears only the quantities which depend on it.
+
+    The peak memory of the derived quantities is about 240 bytes per frame
+    with the "matrix" kernel, which keeps the rotation matrices and the
+    rotated directions (72 bytes per frame each) as well as the local
+    accelerations, rotations and rotational accelerations (24 bytes per
+    frame each), and about 264 bytes per frame with the "euler" kernel. The
+    two kernels take about the same time, the "matrix" kernel being at most
+    about 6% faster on long records. See "TEST SCRIPTS/Benchmarks/frame
+    rotation.py".
     """
 
-    def __init__(self, df, ship_rot, person_rot, inc_gravity=False, position=[0,0,0]):
+    def __init__(self, df, ship_rot, person_rot, inc_gravity=False, position=[0,0,0], backing_file=None, on_compute=None, kernel="matrix", differentiator="backward"):
         """
         Initialises an ansys_accelerometer, which converts the global movement
         data of an ANSYS file to what an accelerometer would measure.
@@ -37,80 +158,237 @@ class ansys_accelerometer:
         
         CoG:            The position of the accelerometer, relative to a fixed
                         point on the body.
-        """
+
+        backing_file:   A file to memory map the time series into, or None
+                        to keep them in memory.
+
+        on_compute:     A function called as on_compute(name, seconds) each
+                        time a derived quantity is calculated. Every
+                        calculation is also recorded in compute_log.
+
+        kernel:         How the local reference frame is rotated at each
+                        frame. "matrix" builds the rotation matrices of every
+                        frame once and derives everything from them, "euler"
+                        is the previous method of rotating each axis
+                        separately and finding the rotations from cross
+                        products, kept as a reference.
+
+        differentiator: How the positions and rotations are differentiated,
+                        the name of one of
+                        differentiation.DIFFERENTIATORS ("backward",
+                        "central", "savgol" or "spectral") or a function,
+                        see differentiation.differentiate. "backward" is
+                        the original method, which has a spike at the start
+                        of the record.
+        """
+        self.compute_log = []
+        self.on_compute = on_compute
+        if kernel not in ("matrix", "euler"):
+            raise ValueError("kernel must be 'matrix' or 'euler', not %r"
+                             % (kernel,))
+        self.kernel = kernel
+        self.differentiator = differentiator
+        self.inc_gravity = inc_gravity
+        self.ship_rot = ship_rot
         self.person_rot = person_rot
-        self.rot_z = ship_rot[2] + self.person_rot
-        self.rot_y = ship_rot[1]
-        self.rot_x = ship_rot[0]
-        self.t, self.loc, self.rotation, self.acceleration = self.load_data(df, inc_gravity=inc_gravity)
+        self.position = position
+        self.t, self.loc, self.rotation = self.load_data(df)
+        self.num_frames = len(self.t)
+        self.backing_file = backing_file
+        if backing_file is not None:
+            self.store_data(backing_file)
+
+        # Everything else is calculated when it is first used
+        self.motion_data = motion_data_view(self)
+
+    # The inputs, changing one of these clears the quantities which depend
+    # on it
+    ship_rot = parameter()
+    person_rot = parameter()
+    t = parameter()
+    frame_rate = parameter()
+    loc = parameter()
+    rotation = parameter()
+    kernel = parameter()
+    differentiator = parameter()
+    inc_gravity = parameter()
+
+    @property
+    def rot_x(self):
+        return self.ship_rot[0]
+
+    @property
+    def rot_y(self):
+        return self.ship_rot[1]
+
+    @property
+    def rot_z(self):
+        return self.ship_rot[2] + self.person_rot
+
+    def invalidate(self, name):
+        """
+        Removes every cached quantity which depends on name, directly or
+        through another quantity.
+        """
+        cache = self.__dict__.get("_cache")
+        if not cache:
+            return
+        for quantity in self.dependents(name):
+            cache.pop(quantity, None)
+
+    @classmethod
+    def dependents(cls, name):
+        """
+        Returns the names of the lazy quantities which depend on name,
+        directly or through another quantity.
+        """
+        quantities = {key: value for key, value in vars(cls).items()
+                      if isinstance(value, lazy_quantity)}
+        found = set()
+        new = {name}
+        while new:
+            new = {key for key, quantity in quantities.items()
+                   if key not in found and new.intersection(quantity.depends_on)}
+            found |= new
+        return found
+
+    def report_compute(self, name, seconds):
+        """
+        Records that the quantity name was calculated and took seconds,
+        including any quantities it depends on which were calculated along
+        the way, and passes it on to on_compute if it is set.
+        """
+        self.compute_log.append((name, seconds))
+        if self.on_compute is not None:
+            self.on_compute(name, seconds)
+
+    def store_data(self, backing_file):
+        """
+        Moves the time, position, rotation and acceleration into a memory
+        mapped file, laid out as described in the class docstring.
+        """
+        store = np.memmap(backing_file,
+                          dtype=np.float64,
+                          mode="w+",
+                          shape=(len(STORE_ROWS), self.num_frames))
+        store[0] = self.t
+        store[1:4] = self.loc.T
+        store[4:7] = self.rotation.T
+        store.flush()
+        self._store = store
+        self.t = pd.Series(store[0], name=self.t.name, copy=False)
+        self.loc = store[1:4].T
+        self.rotation = store[4:7].T
+        # The acceleration is written to the file when it is calculated
+
+    @lazy_quantity("ship_rot", "person_rot")
+    def acc_directions(self):
+        """
+        The local reference frame
+        """
+        return self.accelerometer_directions(rot_z=self.rot_z,
+                                             rot_y=self.rot_y,
+                                             rot_x=self.rot_x)
+
+    @lazy_quantity("rotation")
+    def frame_matrices(self):
+        """
+        The rotation matrix of each frame, shape (num_frames, 3, 3)
+        """
+        return R.from_euler("XYZ", self.rotation, degrees=True).as_matrix()
+
+    @lazy_quantity("acc_directions", "rotation", "frame_matrices", "kernel")
+    def rotated_acc_directions(self):
+        """
+        The local reference frame rotated at each time step
+        """
+        if self.kernel == "matrix":
+            return self.rotated_directions_from_matrices(self.acc_directions,
+                                                         self.frame_matrices)
+        return self.rotated_accelerometer_directions(self.acc_directions,
+                                                     self.rotation)
 
-        #define the local reference frame
-        self.acc_directions = self.accelerometer_directions(rot_z=self.rot_z,
-                                                            rot_y=self.rot_y,
-                                                            rot_x=self.rot_x)
+    @lazy_quantity("rotated_acc_directions", "acceleration", "kernel")
+    def rotated_acc_vectors(self):
+        """
+        The component of acceleration in the direction of the rotated
+        reference frame at each time step
+        """
+        if self.kernel == "matrix":
+            return self.project_onto_directions(self.rotated_acc_directions,
+                                                self.acceleration)
+        return self.rotated_accelerometer_vectors(self.rotated_acc_directions,
+                                                  self.acceleration)
 
-        # Rotate the local reference frame at each time step
-        self.rotated_acc_directions = self.rotated_accelerometer_directions(self.acc_directions,
-                                                                            self.rotation)
+    @lazy_quantity("loc", "t", "differentiator", "inc_gravity")
+    def acceleration(self):
+        """
+        The global acceleration, the second derivative of the position. With
+        a backing file it is kept in the acceleration rows of the file.
+        """
+        acceleration = self.differentiate(self.loc, self.t, order=2, axis=0)
+        if self.inc_gravity:
+            acceleration[:, 2] -= 9.81
+        store = self.__dict__.get("_store")
+        if store is None:
+            return acceleration
+        store[7:10] = acceleration.T
+        return store[7:10].T
 
-        # Calculate the component of acceleration in the direction of the 
-        # rotated reference frame at each time step
-        self.rotated_acc_vectors = self.rotated_accelerometer_vectors(self.rotated_acc_directions,
-                                                                      self.acceleration)
+    @lazy_quantity("acceleration")
+    def max_acc(self):
+        """
+        The largest magnitude of the global acceleration
+        """
+        return np.nanmax(np.linalg.norm(self.acceleration, axis=1))
 
-        self.num_frames = len(self.t)
-        self.max_acc = np.nanmax(np.linalg.norm(self.acceleration, axis=1))
+    @lazy_quantity("acc_directions", "rotated_acc_directions", "kernel")
+    def new_rotations(self):
+        """
+        The roll, pitch and yaw in the new reference frame
+        """
+        return self.local_rotations(self.acc_directions,
+                                    self.rotated_acc_directions)
 
-        # Calculate the roll, pitch and yaw in the new reference frame
-        self.new_rotations = self.calc_rotation(self.acc_directions,
-                                                self.rotated_acc_directions)
+    @lazy_quantity("new_rotations", "t", "differentiator")
+    def rotational_acc(self):
+        """
+        The rotational acceleration in the new reference frame
+        """
+        return self.calc_rot_acceleration(self.new_rotations, self.t)
 
-        # Calculate the rotational acceleration in the new reference frame
-        self.rotational_acc = self.calc_rot_acceleration(self.new_rotations, self.t)
-        
-        self.motion_data = {'Ax': self.rotated_acc_vectors[:,0],
-                            'Ay': self.rotated_acc_vectors[:,1],
-                            'Az': self.rotated_acc_vectors[:,2],
-                            'Roll': self.new_rotations[0],
-                            'Pitch': self.new_rotations[1],
-                            'Yaw': self.new_rotations[2],
-                            'Roll acc': self.rotational_acc[0],
-                            'Pitch acc': self.rotational_acc[1],
-                            'Yaw acc': self.rotational_acc[2],
-                            'Time': self.t,
-                            'Position': position}
-
-    def load_data(self, df, inc_gravity=True):
-        """
-        Read the motion data from an ansys aqwa file.
+    def load_data(self, df):
+        """
+        Read the motion data from an ansys aqwa file. The acceleration is
+        derived from the positions when it is first used.
         """
         t = df["Time"]
         self.frame_rate = t.diff()[1]
         loc = np.array(df[["X", "Y", "Z"]])
         rotation = np.array(df[["Rot x", "Rot y", "Rot z"]])
-        acceleration = self.calc_acceleration(self.calc_acceleration(loc, t),
-                                              t)
-        if inc_gravity:
-            acceleration[:, 2] -= 9.81
-        return t, loc, rotation, acceleration
+        return t, loc, rotation
+
+    def differentiate(self, values, t, order=1, axis=0):
+        """
+        Differentiates values with respect to t using the differentiator of
+        the accelerometer.
+        """
+        return differentiation.differentiate(values, t, order=order,
+                                             method=self.differentiator,
+                                             axis=axis)
 
     def calc_acceleration(self, position, t):
         """
-        Calculate the global acceleration acceleration from the global
-        positioion
+        Calculate the first time derivative of the global position
         """
-        dloc = np.diff(position, axis=0, prepend=0)
-        acc = dloc/self.frame_rate
-        return acc
+        return self.differentiate(position, t, order=1, axis=0)
 
     def calc_rot_acceleration(self, rotation, t):
         """
-        Calculate the global acceleration acceleration from the global
-        positioion
+        Calculate the rotational acceleration from the rotations, with time
+        along the last axis
         """
-        drot = np.diff(rotation, prepend=0)/self.frame_rate
-        d2rot = np.diff(drot, prepend =0)/self.frame_rate
-        return d2rot
+        return self.differentiate(rotation, t, order=2, axis=-1)
 
     def accelerometer_directions(self, origin_directions=np.array([[1, 0, 0],[0, 1, 0],[0, 0, 1]]), rot_z=0, rot_y=0, rot_x=0):
         """
@@ -134,6 +412,23 @@ class ansys_accelerometer:
                                           axis=1)
         return rotated_acc_directions
 
+    def rotated_directions_from_matrices(self, directions, matrices):
+        """
+        Rotate the local origin axis' by the rotation matrix of each frame,
+        all at once. Returns an array of shape (num_frames, 3, 3) where
+        [i, j] is the rotated direction j at frame i.
+        """
+        return np.matmul(directions, np.swapaxes(matrices, -1, -2))
+
+    def project_onto_directions(self, rotated_acc_directions, acceleration):
+        """
+        Calculate the component of the global acceleration in the direction of
+        the local orientation at each time frame with a single batched matrix
+        product. See rotated_accelerometer_vectors.
+        """
+        return np.matmul(rotated_acc_directions,
+                         acceleration[..., np.newaxis])[..., 0]
+
     def rotated_accelerometer_vectors(self, rotated_acc_directions, acceleration):
         """
         Calculate the component of the global acceleration in the direction of
@@ -252,6 +547,9 @@ class ansys_accelerometer:
         Roll is rotation about the X axis.
         Pitch is rotation about the Y axis.
         Yaw is rotation about the Z axis.
+        Any leading dimensions of original_vectors (..., 3, 3) and
+        rotated_vectors (..., n, 3, 3) are broadcast, e.g. one set of
+        vectors per heading.
         """
         rotation = []
         for rot_about in [0, 1, 2]:
@@ -261,9 +559,9 @@ class ansys_accelerometer:
                 rotated_vector_number = 2
             else:
                 rotated_vector_number = 0
-            rotation_vector = rotated_vectors[:, rot_about]
-            original_rotated_vector = original_vectors[rotated_vector_number]
-            rotated_vector = rotated_vectors[:, rotated_vector_number]
+            rotation_vector = rotated_vectors[..., rot_about, :]
+            original_rotated_vector = np.expand_dims(original_vectors[..., rotated_vector_number, :], -2)
+            rotated_vector = rotated_vectors[..., rotated_vector_number, :]
         #    print(rotation_vector)
         #    print(original_rotated_vector)
         #    print(rotated_vector)
@@ -281,6 +579,37 @@ class ansys_accelerometer:
 
         return rotation
 
+    def calc_rotation_from_matrices(self, original_vectors, rotated_vectors, return_deg=True):
+        """
+        Calculates the same roll, pitch and yaw as calc_rotation directly
+        from the dot products of the original and rotated directions.
+
+        For the rotation about axis a, calc_rotation measures the angle
+        between the normals n1 = r_a x o_b and n2 = r_a x r_b, where b is the
+        next axis and c the one after. As the rotated directions are
+        orthonormal and right handed, (n1 x n2).r_a = -o_b.r_c and
+        n1.n2 = o_b.r_b, so only the (..., 3, 3) matrix of dot products
+        G[i, j] = o_i.r_j is needed.
+        """
+        G = np.matmul(np.expand_dims(original_vectors, -3),
+                      np.swapaxes(rotated_vectors, -1, -2))
+        rotation = np.stack([np.arctan2(-G[..., 1, 2], G[..., 1, 1]),
+                             np.arctan2(-G[..., 2, 0], G[..., 2, 2]),
+                             np.arctan2(-G[..., 0, 1], G[..., 0, 0])])
+        if return_deg:
+            rotation = np.rad2deg(rotation)
+        return rotation
+
+    def local_rotations(self, original_vectors, rotated_vectors):
+        """
+        The roll, pitch and yaw in degrees, using the kernel of the
+        accelerometer.
+        """
+        if self.kernel == "matrix":
+            return self.calc_rotation_from_matrices(original_vectors,
+                                                    rotated_vectors)
+        return self.calc_rotation(original_vectors, rotated_vectors)
+
     def calc_deck_angle(self):
         """
         Calculates the deck angle at each time step
@@ -316,8 +645,8 @@ class ansys_accelerometer:
         Calculates the angle between two vectors a, b, with the right hand rule
         with vector n which is perpendicular to both a and b.
         """
-        A = np.einsum('ij,ij->i', np.cross(a, b), n)
-        B = np.einsum('ij,ij->i', a, b)
+        A = np.einsum('...j,...j->...', np.cross(a, b), n)
+        B = np.einsum('...j,...j->...', a, b)
         beta = np.arctan2(A, B)
         if returnDeg == True:
             beta = np.rad2deg(beta)
@@ -344,6 +673,75 @@ class ansys_accelerometer:
         YY_person = np.reshape(person_coords[:,1], YY.shape)
         ZZ_person = np.reshape(person_coords[:,2], ZZ.shape)
         return XX_person, YY_person, ZZ_person
+
+    def heading_mixing(self, person_rots):
+        """
+        The person rotation only adds a constant rotation about the local Z
+        axis, so the local axes at person rotation p are a mix of the local
+        axes at self.person_rot. Returns the (n_headings, 3, 3) matrices M
+        where new_axis[i] = M[i, j]*axis[j].
+        """
+        delta = np.deg2rad(np.asarray(person_rots, dtype=float) - self.person_rot)
+        c, s = np.cos(delta), np.sin(delta)
+        M = np.zeros(delta.shape + (3, 3))
+        M[:, 0, 0] = c
+        M[:, 0, 1] = s
+        M[:, 1, 0] = -s
+        M[:, 1, 1] = c
+        M[:, 2, 2] = 1
+        return M
+
+    def headings_motion_data(self, person_rots):
+        """
+        Calculates the motion data for a list of person rotations at once,
+        reusing the kinematics of the ship which do not depend on the person
+        rotation.
+
+        Inputs:
+            person_rots -   The rotations of the person on the ship.
+
+        Returns:
+            motion_data -   A dictionary with the same keys as motion_data,
+                            where the accelerations, rotations and rotational
+                            accelerations have shape (n_headings, n_frames).
+        """
+        M = self.heading_mixing(person_rots)
+        acc_directions = np.matmul(M, self.acc_directions)
+        rotated_acc_directions = np.einsum('hij,njk->hnik',
+                                           M,
+                                           self.rotated_acc_directions)
+        rotated_acc_vectors = np.einsum('hij,nj->hni',
+                                        M,
+                                        self.rotated_acc_vectors)
+        new_rotations = self.local_rotations(acc_directions,
+                                             rotated_acc_directions)
+        rotational_acc = self.calc_rot_acceleration(new_rotations, self.t)
+        return {'Ax': rotated_acc_vectors[..., 0],
+                'Ay': rotated_acc_vectors[..., 1],
+                'Az': rotated_acc_vectors[..., 2],
+                'Roll': new_rotations[0],
+                'Pitch': new_rotations[1],
+                'Yaw': new_rotations[2],
+                'Roll acc': rotational_acc[0],
+                'Pitch acc': rotational_acc[1],
+                'Yaw acc': rotational_acc[2],
+                'Time': self.t,
+                'Position': self.position}
+
+    def coordinates_for_headings(self, XX, YY, ZZ, person_rots):
+        """
+        The coordinates XX, YY, ZZ in the reference frame of the person for a
+        list of person rotations, see coordinates_in_person_rf. Returns
+        arrays of shape (n_headings,) + XX.shape.
+        """
+        r = R.from_euler('Z', np.reshape(person_rots, (-1, 1)), degrees=True)
+        ship_coords = np.stack((np.ravel(XX), np.ravel(YY), np.ravel(ZZ)))
+        person_coords = np.matmul(r.as_matrix(), ship_coords)
+        shape = (len(person_coords),) + np.shape(XX)
+        XX_person = np.reshape(person_coords[:, 0], shape)
+        YY_person = np.reshape(person_coords[:, 1], shape)
+        ZZ_person = np.reshape(person_coords[:, 2], shape)
+        return XX_person, YY_person, ZZ_person
 #accelerometer = ansys_accelerometer('sample data.xlsx', rot_x=180)
 #accelerometer.animate_plot()
 #accelerometer.save_data("results3")
\ No newline at end of file
@@ -17,11 +17,14 @@ import numpy as np
 import matplotlib.animation as animation
 import pandas as pd
 import STL_loader
+import motion_records
 import os.path
 
 root = tk.Tk()
 root.withdraw()
 
+MOTION_CACHE = motion_records.motion_record_cache(".\\Data\\motion_cache")
+
 
 def input_float(prompt=""):
     loop = True
@@ -87,16 +90,7 @@ def select_run(turbine_type):
     ROT_file = d+"\\"+run+"ROT.csv"
     print(CG_file)
     print(ROT_file)
-    CG = pd.read_csv(CG_file, skiprows=5,encoding = "ISO-8859-1")
-    ROT = pd.read_csv(ROT_file, skiprows=5, encoding = "ISO-8859-1")
-    df = pd.DataFrame(CG["*Time (s)"], columns=["Time (s)"])
-    df["Time"] = CG["*Time (s)"]
-    df["X"] = CG["Line A (m)"]
-    df["Y"] = CG["Line B (m)"]
-    df["Z"] = CG["Line C (m)"]
-    df["Rot x"] = ROT.iloc[:,1]
-    df["Rot y"] = ROT.iloc[:,2]
-    df["Rot z"] = ROT.iloc[:,3]
+    df = motion_records.read_aqwa_run(CG_file, ROT_file, cache=MOTION_CACHE)
     return df, HZ, TZ, direction, d, run
 
 # =============================================================================
@@ -153,27 +147,19 @@ Ax, Ay, Az, A = MII.translate_accelerations(XX,
                                             ZZ,
                                             MSI_accelerometer)
 
-MSI = MII.calc_MSI(Az, XX, MSI_accelerometer, tasks["Exposure time"])
-
-Ax_rms, Ay_rms, Az_rms, A_rms = [MII.calc_RMS(x) for x in [Ax, Ay, Az, A]]
-Ax_max, Ay_max, Az_max, A_max = [np.max(x, axis=3) for x in [Ax, Ay, Az, A]]
-Ax_min, Ay_min, Az_min, A_min = [np.min(x, axis=3) for x in [Ax, Ay, Az, A]]
-
-tasks["MSI"] = MSI.flatten()
-tasks["Ax_rms"] = Ax_rms.flatten()
-tasks["Ay_rms"] = Ay_rms.flatten()
-tasks["Az_rms"] = Az_rms.flatten()
-tasks["A_rms"] = A_rms.flatten()
-
-tasks["Ax_max"] = Ax_max.flatten()
-tasks["Ay_max"] = Ay_max.flatten()
-tasks["Az_max"] = Az_max.flatten()
-tasks["A_max"] = A_max.flatten()
-
-tasks["Ax_min"] = Ax_min.flatten()
-tasks["Ay_min"] = Ay_min.flatten()
-tasks["Az_min"] = Az_min.flatten()
-tasks["A_min"] = A_min.flatten()
+# The RMS, max, min, MSI and MII rates of every task point, in one table
+# which is joined onto the tasks.
+statistics = MII.motion_statistics(Ax,
+                                   Ay,
+                                   Az,
+                                   A,
+                                   accelerometer=MSI_accelerometer,
+                                   exposure_time=tasks["Exposure time"].to_numpy(),
+                                   Cts=[tasks["Sideways tip coeff"].to_numpy(),
+                                        tasks["Foreward tip coeff"].to_numpy()],
+                                   h=tasks["h"].to_numpy(),
+                                   index=tasks.index)
+tasks = tasks.join(statistics)
 
 # =============================================================================
 # CALCULATING MII
@@ -181,31 +167,18 @@ tasks["A_min"] = A_min.flatten()
 
 print("CALCULATIONS FOR MII")
 
-side_mii_rate = MII.calc_MII_rate(Ay,
-                                  Az,
-                                  XX,
-                                  MSI_accelerometer,
-                                  tasks["Sideways tip coeff"].to_numpy(),
-                                  h=tasks["h"].to_numpy())
+side_mii_rate = tasks["Sideways MII Rate"].to_numpy()
+fore_mii_rate = tasks["Foreward MII Rate"].to_numpy()
 
 side_E_task = MII.calc_E_task(side_mii_rate,
                               tasks["Recovery time"].to_numpy())
 
-tasks["Sideways MII Rate"] = side_mii_rate
 tasks["Sideways MII Task Eff."] = side_E_task
 
-fore_mii_rate = MII.calc_MII_rate(Ax,
-                                  Az,
-                                  XX,
-                                  MSI_accelerometer,
-                                  tasks["Foreward tip coeff"].to_numpy(),
-                                  h=tasks["h"].to_numpy())
-
 fore_E_task = MII.calc_E_task(fore_mii_rate,
                               tasks["Recovery time"].to_numpy())
 
-tasks["Foreward MII Rate"] = side_mii_rate
-tasks["Foreward MII Task Eff."] = side_E_task
+tasks["Foreward MII Task Eff."] = fore_E_task
 
 combined_rate = side_mii_rate + fore_mii_rate
 combined_E_task = MII.calc_E_task(combined_rate,
@@ -4,7 +4,17 @@ Created on Tue Dec  1 14:35:39 2020
 
 @author: Rastko
 """
+import collections
+import functools
+import math
 import numpy as np
+import pandas as pd
+import differentiation
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def mesh_grid_points(acc_pos, height, length, beam, nh=10, nl=10, nb=10):
@@ -127,10 +137,148 @@ def calc_trips(Rt, t_coeff):
 
 
 def count_trips(trips):
-    return int(np.count_nonzero(trips != np.roll(trips, -1))/2)
+    return int(count_trips_batch(trips))
+
 
+def count_trips_batch(trips):
+    """
+    Counts the trips in each time series of trips, with time along the last
+    axis. A change of state between the last and first sample is counted, as
+    if the series wrapped around.
+    """
+    trips = np.asarray(trips)
+    changes = np.count_nonzero(np.diff(trips, axis=-1), axis=-1)
+    changes += trips[..., -1] != trips[..., 0]
+    return changes // 2
+
+
+# The coupling between the lever arm [dx, dy, dz] and the angular
+# accelerations [Roll, Pitch, Yaw] for each translated acceleration
+# [Ax, Ay, Az], so that A[c] = A_acc[c] + dr[k]*COUPLING[c, k, j]*d2rot[j].
+# Matches trans_long, trans_lat and trans_vert.
+LEVER_ARM_COUPLING = np.array([[[0, 0, 0],
+                                [0, 0, 1],
+                                [0, -1, 0]],
+                               [[0, 0, 1],
+                                [0, 0, 0],
+                                [1, 0, 0]],
+                               [[0, 1, 0],
+                                [-1, 0, 0],
+                                [0, 0, 0]]], dtype=float)
+
+
+class motion_kinematics:
+    """
+    The motion of an accelerometer that is needed to translate accelerations
+    to other points. It is calculated once per accelerometer and can be
+    reused for any number of points.
+    Attributes:
+        time            --  The time series
+        time_step       --  The average time step
+        linear          --  The accelerometer accelerations [Ax, Ay, Az],
+                            shape (3, n_time)
+        angles          --  The rotations [Roll, Pitch, Yaw] in radians,
+                            shape (3, n_time)
+        angular_acc     --  The rotational accelerations of [Roll, Pitch,
+                            Yaw], shape (3, n_time)
+    Methods:
+        from_accelerometer  --  Create the kinematics of an accelerometer
+        translate           --  The accelerations at a set of lever arms
+    """
 
-def translate_accelerations(XX, YY, ZZ, accelerometer, degrees=True):
+    def __init__(self, Ax, Ay, Az, Roll, Pitch, Yaw, Time, degrees=True,
+                 dtype=np.float64, differentiator="backward"):
+        """
+        Initialise the kinematics from the accelerometer time series.
+        Inputs:
+            Ax, Ay, Az          -- Accelerations time series
+            Roll, Pitch, Yaw    -- Rotation time series
+            Time                -- The time series
+            degrees             -- If the rotations are in degrees
+            dtype               -- The dtype of the translated accelerations.
+                                   The derivatives are always taken in
+                                   float64.
+            differentiator      -- How the rotations are differentiated, see
+                                   differentiation.differentiate. "backward"
+                                   is the original method.
+        """
+        self.time = np.asarray(Time, dtype=float)
+        self.time_step = np.average(np.diff(self.time))
+        self.linear = np.array([Ax, Ay, Az], dtype=float)
+        self.angles = np.array([Roll, Pitch, Yaw], dtype=float)
+        if degrees:
+            self.angles = np.deg2rad(self.angles)
+        if differentiator == "backward":
+            # The original differences, using the average time step
+            d_angles = np.diff(self.angles, axis=-1, prepend=0)/self.time_step
+            self.angular_acc = np.diff(d_angles, axis=-1, prepend=0)/self.time_step
+        else:
+            self.angular_acc = differentiation.differentiate(self.angles,
+                                                             self.time,
+                                                             order=2,
+                                                             method=differentiator,
+                                                             axis=-1)
+        self.linear = self.linear.astype(dtype, copy=False)
+        self.angular_acc = self.angular_acc.astype(dtype, copy=False)
+
+    @classmethod
+    def from_accelerometer(cls, accelerometer, degrees=True, dtype=np.float64):
+        """
+        Create the kinematics of an accelerometer.
+
+        accelerometer - A class with a dictionary .motion_data which holds
+                        "Ax", "Ay", "Az", "Roll", "Pitch", "Yaw", "Time" time
+                        series data. Its differentiator is used if it has
+                        one.
+        """
+        motion_data = accelerometer.motion_data
+        return cls(motion_data["Ax"],
+                   motion_data["Ay"],
+                   motion_data["Az"],
+                   motion_data["Roll"],
+                   motion_data["Pitch"],
+                   motion_data["Yaw"],
+                   motion_data["Time"],
+                   degrees=degrees,
+                   dtype=dtype,
+                   differentiator=getattr(accelerometer, "differentiator",
+                                          "backward"))
+
+    @property
+    def num_frames(self):
+        return self.time.shape[-1]
+
+    def translate(self, dx, dy, dz):
+        """
+        Calculates the accelerations at points with lever arms dx, dy, dz
+        from the accelerometer.
+
+        Inputs:
+            dx, dy, dz -    The distance of each point from the accelerometer.
+                            If the time series have leading dimensions (e.g.
+                            one series per heading), the points must have the
+                            same leading dimensions.
+
+        Returns:
+            Ax, Ay, Az, A - The accelerations at each point, with shape
+                            (..., n_points, n_time). They are views into a
+                            single (3, ..., n_points, n_time) array.
+        """
+        shape = self.linear.shape[1:-1] + (-1,)
+        lever = np.stack((np.reshape(dx, shape),
+                          np.reshape(dy, shape),
+                          np.reshape(dz, shape)), axis=-1)
+        lever = lever.astype(self.linear.dtype, copy=False)
+        coeff = np.einsum('...nk,ckj->c...nj', lever,
+                          LEVER_ARM_COUPLING.astype(lever.dtype))
+        acc = np.matmul(coeff, np.moveaxis(self.angular_acc, 0, -2))
+        acc += self.linear[..., np.newaxis, :]
+        A = np.sqrt(np.einsum('c...,c...->...', acc, acc))
+        return acc[0], acc[1], acc[2], A
+
+
+def translate_accelerations(XX, YY, ZZ, accelerometer, degrees=True,
+                            kinematics=None):
     """
     Translates accelerations in 3D coorindates XX, YY, ZZ, relative to the
     position of the accelerometer.
@@ -139,34 +287,17 @@ def translate_accelerations(XX, YY, ZZ, accelerometer, degrees=True):
 
     accelerometer - A class with a dictionary .motion_data which holds "Az",
                     "Ay", "Az", "Roll", "Pitch", "Yaw", "Time" time series data
+
+    kinematics -    A motion_kinematics of the accelerometer. Pass one in to
+                    reuse it between calls, otherwise it is created.
     """
-    Az = trans_vert(XX,
-                    YY,
-                    accelerometer.motion_data["Az"],
-                    accelerometer.motion_data["Pitch"],
-                    accelerometer.motion_data["Roll"],
-                    accelerometer.motion_data["Time"],
-                    degrees=degrees)
-
-    Ay = trans_lat(XX,
-                   ZZ,
-                   accelerometer.motion_data["Ay"],
-                   accelerometer.motion_data["Yaw"],
-                   accelerometer.motion_data["Roll"],
-                   accelerometer.motion_data["Time"],
-                   degrees=degrees)
-
-    Ax = trans_long(YY,
-                    ZZ,
-                    accelerometer.motion_data["Ax"],
-                    accelerometer.motion_data["Yaw"],
-                    accelerometer.motion_data["Pitch"],
-                    accelerometer.motion_data["Time"],
-                    degrees=degrees)
-
-    A = np.linalg.norm([Ax, Ay, Az], axis=0)
-
-    shape = np.append(XX.shape, len(accelerometer.motion_data["Az"]))
+    if kinematics is None:
+        kinematics = motion_kinematics.from_accelerometer(accelerometer,
+                                                          degrees=degrees)
+
+    Ax, Ay, Az, A = kinematics.translate(XX, YY, ZZ)
+
+    shape = np.append(np.shape(XX), kinematics.num_frames)
     Az = np.reshape(Az, shape)
     Ay = np.reshape(Ay, shape)
     Ax = np.reshape(Ax, shape)
@@ -175,6 +306,169 @@ def translate_accelerations(XX, YY, ZZ, accelerometer, degrees=True):
     return Ax, Ay, Az, A
 
 
+def translate_accelerations_for_headings(XX, YY, ZZ, accelerometer,
+                                        person_rots, degrees=True):
+    """
+    Translates accelerations to the coordinates XX, YY, ZZ for a list of
+    person rotations at once. The ship kinematics are only calculated once and
+    each heading only adds a rotation about the local Z axis.
+
+    XX, YY, ZZ -    The coordinates in the ship reference frame, relative to
+                    the accelerometer.
+
+    accelerometer - An ANSYS_tools.ansys_accelerometer.
+
+    person_rots -   The rotations of the person on the ship.
+
+    Returns:
+        Ax, Ay, Az, A - The accelerations with shape
+                        (n_headings,) + XX.shape + (n_time,).
+
+        motion_data -   The motion data of the accelerometer for each heading,
+                        see ansys_accelerometer.headings_motion_data.
+    """
+    motion_data = accelerometer.headings_motion_data(person_rots)
+    XX, YY, ZZ = accelerometer.coordinates_for_headings(XX, YY, ZZ,
+                                                        person_rots)
+    kinematics = motion_kinematics(motion_data["Ax"],
+                                   motion_data["Ay"],
+                                   motion_data["Az"],
+                                   motion_data["Roll"],
+                                   motion_data["Pitch"],
+                                   motion_data["Yaw"],
+                                   motion_data["Time"],
+                                   degrees=degrees,
+                                   differentiator=getattr(accelerometer,
+                                                          "differentiator",
+                                                          "backward"))
+
+    Ax, Ay, Az, A = kinematics.translate(XX, YY, ZZ)
+
+    shape = np.append(np.shape(XX), kinematics.num_frames)
+    Az = np.reshape(Az, shape)
+    Ay = np.reshape(Ay, shape)
+    Ax = np.reshape(Ax, shape)
+    A = np.reshape(A, shape)
+
+    return Ax, Ay, Az, A, motion_data
+
+
+def chunk_size_for_budget(n_time, memory_budget, dtype=np.float64):
+    """
+    Returns the number of points whose time series can be processed at once
+    within memory_budget bytes.
+
+    Each point holds Ax, Ay, Az and A, plus working arrays for the reductions
+    (the float64 spectrum in the MSI and the tip ratios of the MII), which
+    are allowed for as roughly eight more float64 time series.
+    """
+    bytes_per_point = n_time*(4*np.dtype(dtype).itemsize + 8*8)
+    return max(1, int(memory_budget // bytes_per_point))
+
+
+def iter_translated_chunks(XX, YY, ZZ, kinematics, chunk_size):
+    """
+    Translates the accelerations to the points XX, YY, ZZ in blocks of
+    chunk_size points, so the time series of every point is never held at
+    once.
+
+    Yields:
+        points -        A slice of the flattened points in the chunk.
+
+        Ax, Ay, Az, A - The accelerations at the points in the chunk, with
+                        shape (n_chunk_points, n_time).
+    """
+    dx, dy, dz = np.ravel(XX), np.ravel(YY), np.ravel(ZZ)
+    for start in range(0, len(dx), chunk_size):
+        points = slice(start, start+chunk_size)
+        Ax, Ay, Az, A = kinematics.translate(dx[points], dy[points], dz[points])
+        yield points, Ax, Ay, Az, A
+
+
+def translate_accelerations_chunked(XX, YY, ZZ, accelerometer,
+                                    exposure_time=None, Cts=None, h=0.91,
+                                    g=9.81, memory_budget=256*2**20,
+                                    dtype=np.float64, degrees=True,
+                                    kinematics=None, percentiles=(),
+                                    engine="auto"):
+    """
+    Translates accelerations to the coordinates XX, YY, ZZ one block of
+    points at a time and keeps only the reductions of each time series,
+    instead of the time series themselves.
+
+    Inputs:
+        XX, YY, ZZ -    Use mesh_grid_points to generate
+
+        accelerometer - A class with a dictionary .motion_data which holds
+                        "Ax", "Ay", "Az", "Roll", "Roll acc", "Pitch", "Yaw",
+                        "Time" time series data
+
+        exposure_time - The exposure time for the MSI, either a single value
+                        or one value per point. The MSI is skipped if None.
+
+        Cts -           A list of the tipping coefficients of the sideways and
+                        foreward directions, for the MII rates. The MII rates
+                        are skipped if None.
+
+        h -             The height of the centre of gravity, see
+                        calc_MII_rates.
+
+        g -             The acceleration due to gravity.
+
+        memory_budget - The approximate memory in bytes used by each block.
+
+        dtype -         The dtype of the translated accelerations, e.g.
+                        np.float32 to halve the memory per point.
+
+        kinematics -    A motion_kinematics of the accelerometer. It is
+                        created if not given.
+
+        percentiles -   Percentiles of each component to keep, see
+                        motion_statistics.
+
+        engine -        The reduction engine, see reduce_series.
+
+    Returns:
+        results -       A dictionary of arrays with the shape of XX, with the
+                        same names as the columns of motion_statistics.
+    """
+    if kinematics is None:
+        kinematics = motion_kinematics.from_accelerometer(accelerometer,
+                                                          degrees=degrees,
+                                                          dtype=dtype)
+    n_points = np.size(XX)
+    chunk_size = chunk_size_for_budget(kinematics.num_frames, memory_budget,
+                                       dtype=dtype)
+
+    if exposure_time is not None:
+        exposure_time = np.broadcast_to(np.ravel(exposure_time), n_points)
+    if Cts is not None:
+        Cts = [np.broadcast_to(np.ravel(Ct), n_points) for Ct in Cts]
+        h = np.broadcast_to(np.ravel(h), n_points)
+
+    results = {}
+    for points, Ax, Ay, Az, A in iter_translated_chunks(XX, YY, ZZ,
+                                                        kinematics,
+                                                        chunk_size):
+        chunk = motion_statistics_arrays(
+            Ax, Ay, Az, A,
+            accelerometer=accelerometer,
+            exposure_time=None if exposure_time is None else exposure_time[points],
+            Cts=None if Cts is None else [Ct[points] for Ct in Cts],
+            h=h if Cts is None else h[points],
+            g=g,
+            percentiles=percentiles,
+            engine=engine)
+        for name, values in chunk.items():
+            if name not in results:
+                results[name] = np.empty(n_points, dtype=values.dtype)
+            results[name][points] = values
+
+    for name in results:
+        results[name] = np.reshape(results[name], np.shape(XX))
+    return results
+
+
 def trans_vert(dx, dy, Az, Pitch, Roll, Time_step, degrees):
     """
     dx:         Relative distance in x from the accelerometer
@@ -240,100 +534,528 @@ def trans_long(dy, dz, Ax, Yaw, Pitch, Time_step, degrees):
     return translated
 
 
-def octave(Az, TIMES, Scale_factor):
+class band_table:
+    """
+    A table of frequency bands and the weighting applied to each band.
+    Attributes:
+        edges       --  An (n, 2) array of the lower and upper frequency of
+                        each band at full scale (Hz)
+        weights     --  An (n,) array of the weighting of each band
+    Methods:
+        scaled      --  The band edges for a model scale factor
+        masks       --  Which frequencies fall into each band
+    """
+
+    def __init__(self, edges, weights):
+        """
+        Initialise a band table
+        Inputs:
+            edges   -- A list of [lower, upper] frequencies of each band
+            weights -- A list of the weighting of each band
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def scaled(self, Scale_factor):
+        """
+        Returns the band edges for a model of scale Scale_factor
+        """
+        return self.edges*np.sqrt(Scale_factor)
+
+    def masks(self, xf, Scale_factor):
+        """
+        Returns a boolean array of shape (n_bands, len(xf)) which is True
+        where the frequency xf falls inside the band.
+        """
+        edges = self.scaled(Scale_factor)
+        xf = np.abs(xf)
+        return ((xf >= edges[:, [0]]) & (xf <= edges[:, [1]]))
+
+
+# The octave bands and weightings used in the MSI calculation, ordered from
+# the lowest band (bd10) to the highest band (bd0).
+MSI_BANDS = band_table(edges=[[0.089, 0.112],
+                              [0.112, 0.141],
+                              [0.141, 0.178],
+                              [0.178, 0.224],
+                              [0.224, 0.282],
+                              [0.282, 0.355],
+                              [0.355, 0.447],
+                              [0.447, 0.562],
+                              [0.562, 0.708],
+                              [0.708, 0.892],
+                              [0.892, 1.108]],
+                       weights=[0.695, 0.895, 1.006, 0.992, 0.854, 0.619,
+                                0.384, 0.224, 0.116, 0.053, 0.0235])
+
+
+# The length of a record used in an FFT.
+#   n_samples   -- The number of samples in the record
+#   n_used      -- The number of samples of the record that are used
+#   n_fft       -- The length of the FFT, n_fft - n_used zeros are padded
+#   n_discarded -- The number of samples cut from the end of the record
+fft_plan = collections.namedtuple("fft_plan", ["n_samples",
+                                               "n_used",
+                                               "n_fft",
+                                               "n_discarded"])
+
+
+def previous_fast_len(n):
+    """
+    Returns the largest 5-smooth number (2^a 3^b 5^c) which is not larger
+    than n.
+    """
+    best = 1
+    p5 = 1
+    while p5 <= n:
+        p35 = p5
+        while p35 <= n:
+            # The largest power of two which fits on top of 3^b 5^c
+            best = max(best, p35 << ((n // p35).bit_length() - 1))
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+@functools.lru_cache(maxsize=None)
+def plan_fft_length(n_samples, mode="trim"):
+    """
+    Chooses the length of the FFT of a record of n_samples. Plans are cached
+    per record length.
+
+    Inputs:
+        n_samples - The number of samples in the record.
+
+        mode -      "trim" cuts the record down to the previous 5-smooth
+                    length, which loses only a few samples.
+                    "pad" uses every sample and zero pads up to the next
+                    5-smooth length. The record is not detrended or
+                    windowed, so the padding adds a jump at its end which
+                    leaks energy into the upper bands.
+                    "legacy" cuts the record down to the largest odd square
+                    which is not divisible by 3, as was done previously.
+
+                    The default "trim" keeps more of the record than
+                    "legacy", so the band RMS and MSI differ from results
+                    calculated before it, by about 1.5% on the Semi-Sub
+                    H2-1 TZ4-89 run (6.138 against 6.053). Pass
+                    length_plan="legacy" to reproduce earlier results
+                    exactly.
+
+    Returns:
+        plan -      An fft_plan.
+    """
     from scipy import fftpack
-    sf = np.sqrt(Scale_factor)
-    bd10 = [0.089*sf, 0.112*sf]
-    bd9 = [0.112*sf, 0.141*sf]
-    bd8 = [0.141*sf, 0.178*sf]
-    bd7 = [0.178*sf, 0.224*sf]
-    bd6 = [0.224*sf, 0.282*sf]
-    bd5 = [0.282*sf, 0.355*sf]
-    bd4 = [0.355*sf, 0.447*sf]
-    bd3 = [0.447*sf, 0.562*sf]
-    bd2 = [0.562*sf, 0.708*sf]
-    bd1 = [0.708*sf, 0.892*sf]
-    bd0 = [0.892*sf, 1.108*sf]
-    ldata = len(Az)
-    loop = [0]
-    for i in loop:
-        if ldata % np.sqrt(ldata) == 0 and ldata % 2 and ldata % 3:
-            pass
-        else:
-            ldata = ldata - 1
-            loop.append(0)
-    Az = Az[0:ldata]
-    TIMES = TIMES[0:ldata]
+    if mode == "pad":
+        n_used = n_samples
+        n_fft = fftpack.next_fast_len(n_samples)
+    elif mode == "trim":
+        n_used = n_fft = previous_fast_len(n_samples)
+    elif mode == "legacy":
+        m = math.isqrt(n_samples)
+        while m > 1 and not (m % 2 and m % 3):
+            m -= 1
+        n_used = n_fft = m**2
+    else:
+        raise ValueError("mode must be 'pad', 'trim' or 'legacy', not %r"
+                         % (mode,))
+    return fft_plan(n_samples, n_used, n_fft, n_samples - n_used)
+
+
+def octave(Az, TIMES, Scale_factor, method="spectral", bands=MSI_BANDS,
+           length_plan="trim"):
+    """
+    Calculates the RMS of a single acceleration time series in each octave
+    band. See octave_batch.
+    """
+    RMSF = octave_batch(np.asarray(Az)[np.newaxis], TIMES, Scale_factor,
+                        method=method, bands=bands,
+                        length_plan=length_plan)[0]
+    return list(RMSF)
+
+
+def octave_batch(Az, TIMES, Scale_factor, method="spectral", bands=MSI_BANDS,
+                 length_plan="trim"):
+    """
+    Calculates the RMS in each octave band for many time series at once.
+
+    Inputs:
+        Az -            Acceleration time series with time along the last
+                        axis, e.g. the output of translate_accelerations.
+
+        TIMES -         The time series, shared by every series in Az.
+
+        Scale_factor -  The model scale factor.
+
+        method -        "spectral" takes the band RMS straight from the sum
+                        of the squared spectral coefficients in the band
+                        (Parseval's theorem). "time" filters the spectrum,
+                        transforms each band back into the time domain and
+                        takes the RMS there, and is kept as a reference.
+
+        bands -         A band_table of the bands to calculate.
+
+        length_plan -   How the length of the FFT is chosen, either an
+                        fft_plan or a mode for plan_fft_length. The default
+                        "trim" changes results from those calculated before
+                        it, use "legacy" to reproduce them.
+
+    Returns:
+        RMSF -          An array of shape Az.shape[:-1] + (len(bands),)
+                        holding the RMS in each band.
+    """
+    from scipy import fftpack
+    Az = np.asarray(Az)
+    if not isinstance(length_plan, fft_plan):
+        length_plan = plan_fft_length(Az.shape[-1], length_plan)
+    ldata = length_plan.n_used
+    Az = Az[..., 0:ldata]
+    TIMES = np.asarray(TIMES)[0:ldata]
     time_steps = np.diff(TIMES)
 
     # find average of timesteps, only a precaution to properly account for a
     # slightly varied sample rate
     time_step = np.average(time_steps)
 
-    # performing fft of the wave elevations, makes it absolute
-    freq_fft = fftpack.rfft(np.array(Az))
+    # performing fft of the wave elevations along the time axis of every
+    # series at once, zero padded up to the planned length
+    freq_fft = fftpack.rfft(Az, n=length_plan.n_fft, axis=-1)
 
     # find frequency range
-    xf = fftpack.rfftfreq(len(freq_fft), d=time_step)
-
-    b10 = np.copy(freq_fft)
-    b9 = np.copy(freq_fft)
-    b8 = np.copy(freq_fft)
-    b7 = np.copy(freq_fft)
-    b6 = np.copy(freq_fft)
-    b5 = np.copy(freq_fft)
-    b4 = np.copy(freq_fft)
-    b3 = np.copy(freq_fft)
-    b2 = np.copy(freq_fft)
-    b1 = np.copy(freq_fft)
-    b0 = np.copy(freq_fft)
-
-    b10[np.abs(xf) < bd10[0]] = 0
-    b10[np.abs(xf) > bd10[1]] = 0
-    b9[np.abs(xf) < bd9[0]] = 0
-    b9[np.abs(xf) > bd9[1]] = 0
-    b8[np.abs(xf) < bd8[0]] = 0
-    b8[np.abs(xf) > bd8[1]] = 0
-    b7[np.abs(xf) < bd7[0]] = 0
-    b7[np.abs(xf) > bd7[1]] = 0
-    b6[np.abs(xf) < bd6[0]] = 0
-    b6[np.abs(xf) > bd6[1]] = 0
-    b5[np.abs(xf) < bd5[0]] = 0
-    b5[np.abs(xf) > bd5[1]] = 0
-    b4[np.abs(xf) < bd4[0]] = 0
-    b4[np.abs(xf) > bd4[1]] = 0
-    b3[np.abs(xf) < bd3[0]] = 0
-    b3[np.abs(xf) > bd3[1]] = 0
-    b2[np.abs(xf) < bd2[0]] = 0
-    b2[np.abs(xf) > bd2[1]] = 0
-    b1[np.abs(xf) < bd1[0]] = 0
-    b1[np.abs(xf) > bd1[1]] = 0
-    b0[np.abs(xf) < bd0[0]] = 0
-    b0[np.abs(xf) > bd0[1]] = 0
-
-    b10, b9, b8, b7, b6 = fftpack.irfft(b10), fftpack.irfft(b9), fftpack.irfft(b8), fftpack.irfft(b7), fftpack.irfft(b6)
-    b5, b4, b3, b2, b1, b0 = fftpack.irfft(b5), fftpack.irfft(b4), fftpack.irfft(b3), fftpack.irfft(b2), fftpack.irfft(b1), fftpack.irfft(b0)
-
-    RMSF = [RMS(b10), RMS(b9), RMS(b8), RMS(b7), RMS(b6), RMS(b5), RMS(b4),
-            RMS(b3), RMS(b2), RMS(b1), RMS(b0)]
+    xf = fftpack.rfftfreq(length_plan.n_fft, d=time_step)
+
+    masks = bands.masks(xf, Scale_factor)
+
+    if method == "spectral":
+        # fftpack packs the spectrum as [y(0), Re(y(1)), Im(y(1)), ...], so
+        # every coefficient apart from the mean (and the Nyquist term of an
+        # even length series) is counted twice in the sum of squares.
+        # The zero padding adds no energy, so the mean square is taken over
+        # the samples that were used.
+        parseval = np.full(length_plan.n_fft, 2.0)
+        parseval[0] = 1
+        if length_plan.n_fft % 2 == 0:
+            parseval[-1] = 1
+        power = freq_fft**2 * parseval
+        RMSF = np.sqrt(np.matmul(power, masks.T.astype(float))
+                       / (length_plan.n_fft * ldata))
+    elif method == "time":
+        # Filter every series to one band at a time, so only one copy of the
+        # spectrum is held in memory
+        RMSF = np.empty(Az.shape[:-1] + (len(bands),))
+        for i, mask in enumerate(masks):
+            b = fftpack.irfft(np.where(mask, freq_fft, 0), axis=-1)
+            RMSF[..., i] = np.sqrt(np.sum(b**2, axis=-1) / ldata)
+    else:
+        raise ValueError("method must be 'spectral' or 'time', not %r"
+                         % (method,))
 
     return RMSF
 
 
-def MSI(Azs, Times, Scale_factor, Exposure_Time, k=1/3):
-    RMS = octave(Azs, Times, Scale_factor)
-    RMS = np.array(RMS)
+def MSI(Azs, Times, Scale_factor, Exposure_Time, k=1/3, method="spectral",
+        bands=MSI_BANDS, length_plan="trim"):
+    """
+    Calculates the MSI of a single acceleration time series. See MSI_batch.
+    """
+    return MSI_batch(np.asarray(Azs)[np.newaxis], Times, Scale_factor,
+                     Exposure_Time, k=k, method=method, bands=bands,
+                     length_plan=length_plan)[0]
+
+
+def MSI_batch(Azs, Times, Scale_factor, Exposure_Time, k=1/3,
+              method="spectral", bands=MSI_BANDS, length_plan="trim"):
+    """
+    Calculates the MSI for many acceleration time series at once.
+
+    Inputs:
+        Azs -           Acceleration in z time series with time along the last
+                        axis.
+
+        Times -         The time series, shared by every series in Azs.
+
+        Scale_factor -  The model scale factor.
+
+        Exposure_Time - The exposure time in hours. Either a single value or
+                        one value per series, broadcast against
+                        Azs.shape[:-1].
+
+        k -             The MSI constant.
+
+        method -        How the band RMS is calculated, see octave_batch.
+
+        bands -         A band_table of the bands and their weightings.
+
+        length_plan -   How the length of the FFT is chosen, see octave_batch.
+
+    Returns:
+        MSI -           An array of shape Azs.shape[:-1] of the MSI of each
+                        series.
+    """
+    RMS = octave_batch(Azs, Times, Scale_factor, method=method, bands=bands,
+                       length_plan=length_plan)
     RMSms = RMS
-    Weights = np.array([0.695, 0.895, 1.006, 0.992, 0.854, 0.619, 0.384, 0.224,
-                        0.116, 0.053, 0.0235])
-    RMSW = RMSms * Weights
+    RMSW = RMSms * bands.weights
     RMSW2 = RMSW**2
-    aw = np.sqrt(np.sum(RMSW2))
-    MSDV = aw * np.sqrt(Exposure_Time * 60 * 60)
+    aw = np.sqrt(np.sum(RMSW2, axis=-1))
+    MSDV = aw * np.sqrt(np.asarray(Exposure_Time, dtype=float) * 60 * 60)
     MSI = MSDV * k
     return MSI
 
 
+class lever_arm_basis:
+    """
+    The accelerations at a set of points, stored as the six time series of
+    the accelerometer (Ax, Ay, Az and the angular accelerations of Roll,
+    Pitch and Yaw) and the coefficients of each point, rather than one time
+    series per point.
+
+    The acceleration of component c at a point with lever arm r is
+    A_c = A_acc[c] + r[k]*LEVER_ARM_COUPLING[c, k, j]*d2rot[j], a linear
+    combination of the six base series. So the mean square of A_c is a
+    quadratic form of the coefficients with the 6x6 Gram matrix of the base
+    series, and the energy in each frequency band is a quadratic form with
+    the band limited Gram matrix of their spectra. The RMS accelerations and
+    the MSI of every point therefore only need the base series, O(n_time +
+    n_points) memory instead of O(n_time * n_points). The extremes,
+    percentiles and MII rates need the time series themselves, which are
+    made a block of points at a time.
+    Attributes:
+        kinematics      --  The motion_kinematics of the accelerometer
+        shape           --  The shape of the grid of points
+        coefficients    --  The coefficient of each base series for each
+                            component at each point, shape (3, n_points, 6)
+    Methods:
+        from_accelerometer  --  The basis of an accelerometer at points
+        gram                --  The Gram matrix of the base series
+        band_gram           --  The band limited Gram matrices
+        rms                 --  The RMS acceleration of a component
+        band_rms            --  The RMS of a component in each band
+        MSI                 --  The MSI of each point
+        series              --  The time series of selected points
+        iter_chunks         --  The time series a block of points at a time
+        statistics          --  The statistics of translate_accelerations_chunked
+    """
+
+    def __init__(self, kinematics, XX, YY, ZZ):
+        """
+        Initialise the basis of the points XX, YY, ZZ, relative to the
+        accelerometer.
+        Inputs:
+            kinematics  -- A motion_kinematics without leading dimensions
+            XX, YY, ZZ  -- The lever arms of the points
+        """
+        if kinematics.linear.ndim != 2:
+            raise ValueError("lever_arm_basis needs kinematics of a single "
+                             "accelerometer, without leading dimensions")
+        self.kinematics = kinematics
+        self.shape = np.shape(XX)
+        lever = np.stack((np.ravel(XX), np.ravel(YY), np.ravel(ZZ)), axis=-1)
+        n_points = len(lever)
+        self.coefficients = np.zeros((3, n_points, 6))
+        for c in range(3):
+            self.coefficients[c, :, c] = 1
+        self.coefficients[:, :, 3:] = np.einsum('nk,ckj->cnj', lever,
+                                                LEVER_ARM_COUPLING)
+        self._gram = None
+        self._band_grams = {}
+
+    @classmethod
+    def from_accelerometer(cls, accelerometer, XX, YY, ZZ, degrees=True):
+        """
+        The basis of the accelerations of an accelerometer at the points XX,
+        YY, ZZ. See motion_kinematics.from_accelerometer.
+        """
+        return cls(motion_kinematics.from_accelerometer(accelerometer,
+                                                        degrees=degrees),
+                   XX, YY, ZZ)
+
+    @property
+    def num_points(self):
+        return self.coefficients.shape[1]
+
+    @property
+    def base_series(self):
+        """
+        The six base series, shape (6, n_time)
+        """
+        return np.concatenate([self.kinematics.linear,
+                               self.kinematics.angular_acc]).astype(float)
+
+    def gram(self):
+        """
+        The 6x6 matrix of the mean products of the base series
+        """
+        if self._gram is None:
+            base = self.base_series
+            self._gram = base @ base.T/base.shape[-1]
+        return self._gram
+
+    def band_gram(self, Scale_factor=1, bands=MSI_BANDS, length_plan="trim"):
+        """
+        The (n_bands, 6, 6) matrices of the mean products of the base series
+        within each band, calculated from their spectra as octave_batch, so
+        that the quadratic form of a point gives its squared band RMS.
+        """
+        from scipy import fftpack
+        if not isinstance(length_plan, fft_plan):
+            length_plan = plan_fft_length(self.kinematics.num_frames,
+                                          length_plan)
+        # Keyed on the band edges rather than the table, as a freed table's
+        # id can be reused by a new one
+        key = (Scale_factor, tuple(map(tuple, bands.edges.tolist())),
+               length_plan)
+        if key not in self._band_grams:
+            ldata = length_plan.n_used
+            base = self.base_series[:, :ldata]
+            time_step = np.average(np.diff(self.kinematics.time[:ldata]))
+            freq_fft = fftpack.rfft(base, n=length_plan.n_fft, axis=-1)
+            xf = fftpack.rfftfreq(length_plan.n_fft, d=time_step)
+            masks = bands.masks(xf, Scale_factor).astype(float)
+            # The packed spectrum counts every coefficient apart from the
+            # mean (and the Nyquist term) twice, see octave_batch
+            parseval = np.full(length_plan.n_fft, 2.0)
+            parseval[0] = 1
+            if length_plan.n_fft % 2 == 0:
+                parseval[-1] = 1
+            weighted = freq_fft*parseval
+            self._band_grams[key] = (np.einsum('if,bf,jf->bij', weighted,
+                                               masks, freq_fft)
+                                     / (length_plan.n_fft*ldata))
+        return self._band_grams[key]
+
+    def _quadratic_form(self, component, matrix):
+        W = self.coefficients[component]
+        return np.einsum('pi,...ij,pj->p...', W, matrix, W)
+
+    def rms(self, component):
+        """
+        The RMS of a component at each point, with the shape of the grid.
+        component is 0, 1 or 2 for Ax, Ay and Az, or 3 for the magnitude A.
+        """
+        if component == 3:
+            mean_square = sum(self._quadratic_form(c, self.gram())
+                              for c in range(3))
+        else:
+            mean_square = self._quadratic_form(component, self.gram())
+        return np.reshape(np.sqrt(np.maximum(mean_square, 0)), self.shape)
+
+    def band_rms(self, component=2, Scale_factor=1, bands=MSI_BANDS,
+                 length_plan="trim"):
+        """
+        The RMS of a component in each band at each point, with shape
+        self.shape + (n_bands,), the same as octave_batch of the time series.
+        """
+        mean_square = self._quadratic_form(component,
+                                           self.band_gram(Scale_factor, bands,
+                                                          length_plan))
+        return np.reshape(np.sqrt(np.maximum(mean_square, 0)),
+                          self.shape + (len(bands),))
+
+    def MSI(self, Exposure_Time, Scale_factor=1, k=1/3, bands=MSI_BANDS,
+            length_plan="trim"):
+        """
+        The MSI of Az at each point, the same as MSI_batch of the time series.
+        """
+        RMS = np.reshape(self.band_rms(2, Scale_factor, bands, length_plan),
+                         (self.num_points, len(bands)))
+        aw = np.sqrt(np.sum((RMS*bands.weights)**2, axis=-1))
+        MSDV = aw*np.sqrt(np.ravel(np.asarray(Exposure_Time, dtype=float))
+                          * 60 * 60)
+        return np.reshape(MSDV*k, self.shape)
+
+    def series(self, points=None):
+        """
+        Makes the time series of selected points.
+
+        Inputs:
+            points -        The indices of the points in the flattened grid,
+                            or None for every point.
+
+        Returns:
+            Ax, Ay, Az, A - The accelerations at the points with shape
+                            (n_selected, n_time).
+        """
+        W = self.coefficients if points is None else self.coefficients[:, points]
+        acc = np.matmul(W, self.base_series).astype(self.kinematics.linear.dtype,
+                                                     copy=False)
+        A = np.sqrt(np.einsum('c...,c...->...', acc, acc))
+        return acc[0], acc[1], acc[2], A
+
+    def iter_chunks(self, chunk_size):
+        """
+        Makes the time series in blocks of chunk_size points, see
+        iter_translated_chunks.
+        """
+        for start in range(0, self.num_points, chunk_size):
+            points = slice(start, start+chunk_size)
+            Ax, Ay, Az, A = self.series(points)
+            yield points, Ax, Ay, Az, A
+
+    def statistics(self, accelerometer=None, exposure_time=None, Cts=None,
+                   h=0.91, g=9.81, extremes=True, percentiles=(),
+                   memory_budget=256*2**20, engine="auto"):
+        """
+        Calculates the statistics of translate_accelerations_chunked. The
+        RMS and MSI come straight from the basis, and the time series are
+        only made, a block at a time, for the extremes, percentiles and MII
+        rates.
+
+        Inputs:
+            extremes -  If the max and min of each component are calculated.
+
+            Other inputs as translate_accelerations_chunked.
+
+        Returns:
+            results -   A dictionary of arrays with the shape of the grid.
+        """
+        results = {}
+        for i, name in enumerate(["Ax", "Ay", "Az", "A"]):
+            results[name+"_rms"] = np.ravel(self.rms(i))
+        if exposure_time is not None:
+            exposure_time = np.broadcast_to(np.ravel(exposure_time),
+                                            self.num_points)
+            results["MSI"] = np.ravel(self.MSI(exposure_time)).astype(np.float32)
+
+        if extremes or len(percentiles) or Cts is not None:
+            if Cts is not None:
+                Cts = [np.broadcast_to(np.ravel(Ct), self.num_points)
+                       for Ct in Cts]
+                h = np.broadcast_to(np.ravel(h), self.num_points)
+            chunk_size = chunk_size_for_budget(self.kinematics.num_frames,
+                                               memory_budget,
+                                               dtype=self.kinematics.linear.dtype)
+            for points, Ax, Ay, Az, A in self.iter_chunks(chunk_size):
+                chunk = {}
+                for name, series in zip(["Ax", "Ay", "Az", "A"],
+                                        [Ax, Ay, Az, A]):
+                    if extremes:
+                        _, chunk[name+"_max"], chunk[name+"_min"] = reduce_series(series, engine=engine)
+                    if len(percentiles):
+                        values = np.percentile(series, percentiles, axis=-1)
+                        for percentile, value in zip(percentiles, values):
+                            chunk[name+"_p%g" % percentile] = value
+                if Cts is not None:
+                    side, fore = calc_MII_rates([Ay, Ax], Az, None,
+                                                accelerometer,
+                                                [Ct[points] for Ct in Cts],
+                                                h=h[points], g=g)
+                    chunk["Sideways MII Rate"] = side
+                    chunk["Foreward MII Rate"] = fore
+                for name, values in chunk.items():
+                    if name not in results:
+                        results[name] = np.empty(self.num_points,
+                                                 dtype=values.dtype)
+                    results[name][points] = values
+
+        for name in results:
+            results[name] = np.reshape(results[name], self.shape)
+        return results
+
+
 def RMS(DATA):
     DATA = np.array(DATA)
     return np.sqrt(np.mean(DATA**2))
@@ -345,7 +1067,176 @@ def calc_RMS(series, axis=3):
     return RMS
 
 
-def calc_MSI(Az, XX, accelerometer, exposure_time):
+def _reduce_series_numpy(series):
+    """
+    RMS, max and min along the last axis of a 2D array using NumPy.
+    """
+    rms = np.sqrt(np.einsum('ij,ij->i', series, series)/series.shape[-1])
+    return rms, np.max(series, axis=-1), np.min(series, axis=-1)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _reduce_series_numba(series):
+        """
+        RMS, max and min along the last axis of a 2D array, reading each
+        value once.
+        """
+        n_points, n_time = series.shape
+        rms = np.empty(n_points)
+        high = np.empty(n_points)
+        low = np.empty(n_points)
+        for i in numba.prange(n_points):
+            total = 0.0
+            high_i = series[i, 0]
+            low_i = series[i, 0]
+            for j in range(n_time):
+                x = series[i, j]
+                total += x*x
+                if x > high_i:
+                    high_i = x
+                if x < low_i:
+                    low_i = x
+            rms[i] = np.sqrt(total/n_time)
+            high[i] = high_i
+            low[i] = low_i
+        return rms, high, low
+else:
+    _reduce_series_numba = None
+
+
+def reduce_series(series, engine="auto"):
+    """
+    Calculates the RMS, max and min of time series, with time along the last
+    axis.
+
+    Inputs:
+        series -    An array of time series.
+
+        engine -    "numba" uses a compiled kernel which reads each value
+                    once, "numpy" uses one NumPy reduction per statistic and
+                    "auto" uses numba if it is installed.
+
+    Returns:
+        rms, max, min - Arrays of shape series.shape[:-1].
+    """
+    series = np.asarray(series)
+    shape = series.shape[:-1]
+    series = np.reshape(series, (-1, series.shape[-1]))
+    if engine == "auto":
+        engine = "numpy" if _reduce_series_numba is None else "numba"
+    if engine == "numba":
+        if _reduce_series_numba is None:
+            raise ImportError("The numba engine requires numba to be installed")
+        reduced = _reduce_series_numba(np.ascontiguousarray(series))
+    elif engine == "numpy":
+        reduced = _reduce_series_numpy(series)
+    else:
+        raise ValueError("engine must be 'auto', 'numba' or 'numpy', not %r"
+                         % (engine,))
+    return tuple(np.reshape(x, shape) for x in reduced)
+
+
+def motion_statistics_arrays(Ax, Ay, Az, A, accelerometer=None,
+                             exposure_time=None, Cts=None, h=0.91, g=9.81,
+                             percentiles=(), engine="auto",
+                             msi_method="spectral", length_plan="trim"):
+    """
+    Calculates the statistics of motion_statistics as a dictionary of 1D
+    arrays, one value per point.
+    """
+    results = {}
+    for name, series in zip(["Ax", "Ay", "Az", "A"], [Ax, Ay, Az, A]):
+        series = np.reshape(series, (-1, np.shape(series)[-1]))
+        rms, high, low = reduce_series(series, engine=engine)
+        results[name+"_rms"] = rms
+        results[name+"_max"] = high
+        results[name+"_min"] = low
+        if len(percentiles):
+            values = np.percentile(series, percentiles, axis=-1)
+            for percentile, value in zip(percentiles, values):
+                results[name+"_p%g" % percentile] = value
+    if exposure_time is not None:
+        Azs = np.reshape(Az, (-1, np.shape(Az)[-1]))
+        results["MSI"] = MSI_batch(Azs,
+                                   accelerometer.motion_data["Time"],
+                                   1,
+                                   np.ravel(exposure_time),
+                                   method=msi_method,
+                                   length_plan=length_plan).astype(np.float32)
+    if Cts is not None:
+        side, fore = calc_MII_rates([Ay, Ax],
+                                    Az,
+                                    None,
+                                    accelerometer,
+                                    Cts,
+                                    h=h,
+                                    g=g)
+        results["Sideways MII Rate"] = side
+        results["Foreward MII Rate"] = fore
+    return results
+
+
+def motion_statistics(Ax, Ay, Az, A, accelerometer=None, exposure_time=None,
+                      Cts=None, h=0.91, g=9.81, percentiles=(), index=None,
+                      engine="auto", msi_method="spectral", length_plan="trim"):
+    """
+    Calculates the statistics of the translated accelerations at every point
+    as one table.
+
+    Inputs:
+        Ax, Ay, Az, A - The accelerations at each point, from
+                        translate_accelerations.
+
+        accelerometer - The accelerometer, needed for the MSI and MII rates.
+
+        exposure_time - The exposure time for the MSI, either a single value
+                        or one value per point. The MSI is skipped if None.
+
+        Cts -           A list of the tipping coefficients of the sideways and
+                        foreward directions. The MII rates are skipped if
+                        None.
+
+        h -             The height of the centre of gravity.
+
+        g -             The acceleration due to gravity.
+
+        percentiles -   A list of percentiles (0 to 100) of each component to
+                        calculate.
+
+        index -         The index of the table, e.g. tasks.index so the table
+                        can be joined onto tasks.
+
+        engine -        The reduction engine, see reduce_series.
+
+        msi_method -    How the band RMS of the MSI is calculated, see
+                        octave_batch.
+
+        length_plan -   How the length of the FFT of the MSI is chosen, see
+                        octave_batch.
+
+    Returns:
+        table -         A DataFrame with one row per point (in the order of
+                        XX.flatten()) and columns "Ax_rms", "Ax_max",
+                        "Ax_min", "Ax_p<percentile>" and the same for Ay, Az
+                        and A, plus "MSI", "Sideways MII Rate" and "Foreward
+                        MII Rate" when requested.
+    """
+    results = motion_statistics_arrays(Ax, Ay, Az, A,
+                                       accelerometer=accelerometer,
+                                       exposure_time=exposure_time,
+                                       Cts=Cts,
+                                       h=h,
+                                       g=g,
+                                       percentiles=percentiles,
+                                       engine=engine,
+                                       msi_method=msi_method,
+                                       length_plan=length_plan)
+    return pd.DataFrame(results, index=index)
+
+
+def calc_MSI(Az, XX, accelerometer, exposure_time, method="spectral",
+             length_plan="trim"):
     """
     Calculates the MSI at a grid of points like XX.
 
@@ -361,16 +1252,23 @@ def calc_MSI(Az, XX, accelerometer, exposure_time):
 
         exposure_time - The exposure time in the MII calculation.
 
+        method -        How the band RMS is calculated, see octave_batch.
+
+        length_plan -   How the length of the FFT is chosen, see octave_batch.
+
     Returns:
         MSI -           A 3D vector of the MSI at each coordinate [x][y][z].
     """
-    MSI_value = np.empty_like(XX, dtype=np.float32)
-    count = 0
-    for i in range(XX.shape[0]):
-        for j in range(XX.shape[1]):
-            for k in range(XX.shape[2]):
-                MSI_value[i][j][k] = MSI(Az[i][j][k],accelerometer.motion_data["Time"], 1, exposure_time[count])
-                count += 1
+    Az = np.asarray(Az)
+    Az = np.reshape(Az, (-1, Az.shape[-1]))
+    exposure_time = np.asarray(exposure_time, dtype=float).flatten()
+    MSI_value = MSI_batch(Az,
+                          accelerometer.motion_data["Time"],
+                          1,
+                          exposure_time,
+                          method=method,
+                          length_plan=length_plan)
+    MSI_value = np.reshape(MSI_value, XX.shape).astype(np.float32)
     return MSI_value
 
 
@@ -403,16 +1301,53 @@ def calc_MII_rate(A_lat, Az, XX, accelerometer, Ct, h=0.91, g=9.81):
         MII_rate -      A 3D vector of the MII rate per second at each coordinate
                         [x][y][z]
     """
-    MII_rate = np.empty_like(XX, dtype=np.float32).flatten()
-    for i in range(len(MII_rate)):
-        Rt = calc_tip_ratio(h[i],
-                            accelerometer.motion_data["Roll acc"],
-                            A_lat[0,0,i],
-                            g,
-                            accelerometer.motion_data["Roll"],
-                            Az[0,0,i])
-        trips = calc_trips(Rt, Ct[i])
-        MII_rate[i] = count_trips(trips)/accelerometer.motion_data["Time"].iloc[-1]
+    MII_rate = calc_MII_rates([A_lat], Az, XX, accelerometer, [Ct], h=h, g=g)
+    return MII_rate[0]
+
+
+def calc_MII_rates(A_lats, Az, XX, accelerometer, Cts, h=0.91, g=9.81):
+    """
+    Calculates the MII rate for several tipping directions at once, e.g. the
+    sideways and foreward MII rate, at a grid of points like XX.
+
+    Inputs:
+        A_lats -        A list of the lateral acceleration time series at each
+                        coordinate, one for each direction (e.g. [Ay, Ax]).
+
+        Az -            Acceleration in z time series at each coordinate.
+
+        XX -            The X coordinates, used to create an array of the same
+                        shape
+
+        accelerometer - An object which holds a dictionary 'motion_data' which
+                        holds the roll and roll acceleration time series'
+
+        Cts -           A list of the tipping coefficients for each direction,
+                        either a single value or one value per coordinate.
+
+        h -             The height of the centre of gravity, either a single
+                        value or one value per coordinate.
+
+        g -             The acceleration due to gravity
+
+    Returns:
+        MII_rate -      An array of shape (len(A_lats), XX.size) of the MII
+                        rate per second at each coordinate for each direction
+    """
+    n_time = np.shape(Az)[-1]
+    A_lats = np.reshape(A_lats, (len(A_lats), -1, n_time))
+    Az = np.reshape(Az, (-1, n_time))
+    Cts = np.reshape(np.asarray(Cts, dtype=float), (len(A_lats), -1, 1))
+    h = np.reshape(np.asarray(h, dtype=float), (-1, 1))
+    Rt = calc_tip_ratio(h,
+                        np.asarray(accelerometer.motion_data["Roll acc"]),
+                        A_lats,
+                        g,
+                        np.asarray(accelerometer.motion_data["Roll"]),
+                        Az)
+    trips = calc_trips(Rt, Cts)
+    duration = np.asarray(accelerometer.motion_data["Time"])[-1]
+    MII_rate = (count_trips_batch(trips)/duration).astype(np.float32)
     return MII_rate
 
 
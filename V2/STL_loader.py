@@ -14,53 +14,183 @@ Imports:
     numpy, mesh from stl
 """
 
+import hashlib
+import os
 import numpy as np
+from scipy.spatial.transform import Rotation as R
 from stl import mesh as stl_mesh
 
+# The version of the geometry sidecar files, increase it when their contents
+# change so old sidecars are rebuilt
+GEOMETRY_VERSION = 1
+
+
+def file_hash(file):
+    """
+    Returns the SHA1 hash of the contents of a file.
+    """
+    sha1 = hashlib.sha1()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def index_vertices(vectors):
+    """
+    Merges the vertices which are shared between triangles.
+
+    Inputs:
+        vectors -   An (n, 3, 3) array of the three vertices of each triangle,
+                    as stl.mesh.Mesh.vectors.
+
+    Returns:
+        vertices -  An (m, 3) array of the unique vertices.
+
+        faces -     An (n, 3) array of the index of the vertices of each
+                    triangle.
+    """
+    corners = np.reshape(vectors, (-1, 3))
+    # Sorting the bit patterns of the coordinates is much quicker than
+    # np.unique(..., axis=0). Adding 0 turns -0.0 into 0.0 so they match.
+    bits = np.ascontiguousarray(corners + corners.dtype.type(0))
+    bits = bits.view("u%d" % corners.dtype.itemsize)
+    order = np.lexsort(bits.T[::-1])
+    ordered = bits[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    faces = np.empty(len(order), dtype=np.int32)
+    faces[order] = np.cumsum(first) - 1
+    vertices = corners[order[first]].astype(float)
+    return vertices, np.reshape(faces, (-1, 3))
+
+
+def _corner_sum(values):
+    """
+    The sum over the last axis, of length 3, which is quicker written out
+    than np.sum over such a short axis.
+    """
+    return values[..., 0] + values[..., 1] + values[..., 2]
+
 
 class create_object:
     """
     Creates an object.
+
+    The mesh is kept as an indexed mesh, the unique vertices and the three
+    vertex indices of each panel. The geometry derived from the file is
+    saved next to it in a sidecar file, <file>.geometry.npz, along with the
+    hash of the file, so the STL is only parsed again once it changes.
     Attributes:
         file_loc        --  File location of the hull
-        mesh            --  stl object created from the file location
+        mesh            --  stl object of the hull, made from the vertices
+                            when it is first used
+        vertices        --  The unique vertices of the mesh
+        faces           --  The indices of the vertices of each panel
         panel_centre    --  An array of the coordinates of the centre of panels
         panel_area      --  An array of the areas of panels
+        panel_normal    --  An array of the unit normals of panels
+        bounding_box    --  The [min, max] coordinates of the vertices
         L               --  The length of the hull
         B               --  The breadth of the hull
         T               --  The draught of the hull
         D               --  The depth of the hull
         centreline      --  The Y coordinate of the centreline of the hull
-        WSA             --  The wetted surface area of the hull
+        WSA             --  The wetted surface area of the hull below z = 0
     Methods:
         load_hull       -- Reload the hull after a change in the mesh. (e.g. a translation)
+        translate       -- Move the hull
+        rotate          -- Rotate the hull
+        waterplanes     -- The waterplanes at drafts and heel angles
+        clip            -- The hydrostatics of the hull below waterplanes
+        hydrostatics    -- The hydrostatics at a table of drafts and heels
     """
 
-    def __init__(self, file):
+    def __init__(self, file, cache=True):
         """
         Initialize a hull
         Inputs:
-            file -- The location of an stl file
+            file  -- The location of an stl file
+            cache -- If the geometry sidecar file is used
         Outputs:
             A hull object
         """
 
         self.file_loc = file
-        self.mesh = stl_mesh.Mesh.from_file(self.file_loc)
+        self._mesh = None
         self.panel_centre = []
         self.panel_area = []
+        self.panel_normal = []
         self.L = 0  # Length
         self.B = 0  # Breadth
         self.T = 0  # Draft
         self.D = 0  # Depth
         self.centreline = 0  # Y coordinate of the centreline
         self.WSA = 0
-        self.load_hull()
+        if not (cache and self.load_geometry()):
+            self._mesh = stl_mesh.Mesh.from_file(self.file_loc)
+            self.load_hull()
+            if cache:
+                self.save_geometry()
+
+    @property
+    def geometry_file(self):
+        return self.file_loc + ".geometry.npz"
+
+    @property
+    def mesh(self):
+        if self._mesh is None:
+            data = np.zeros(len(self.faces), dtype=stl_mesh.Mesh.dtype)
+            data["vectors"] = self.vertices[self.faces]
+            self._mesh = stl_mesh.Mesh(data)
+        return self._mesh
+
+    def load_geometry(self):
+        """
+        Loads the geometry from the sidecar file, if it was made from the
+        current contents of the STL. Returns True if it was loaded.
+        """
+        try:
+            with np.load(self.geometry_file) as geometry:
+                if (int(geometry["version"]) != GEOMETRY_VERSION
+                        or str(geometry["sha1"]) != file_hash(self.file_loc)):
+                    return False
+                self.vertices = geometry["vertices"]
+                self.faces = geometry["faces"]
+                self.panel_centre = geometry["panel_centre"]
+                self.panel_area = geometry["panel_area"]
+                self.panel_normal = geometry["panel_normal"]
+        except (OSError, KeyError, ValueError):
+            return False
+        self.calc_hull_parameters()
+        return True
+
+    def save_geometry(self):
+        """
+        Saves the geometry to the sidecar file. The file is written under a
+        temporary name first, and nothing is saved if the folder is read
+        only.
+        """
+        temp_file = "%s.%d.tmp.npz" % (self.geometry_file[:-len(".npz")],
+                                       os.getpid())
+        try:
+            np.savez(temp_file,
+                     version=GEOMETRY_VERSION,
+                     sha1=file_hash(self.file_loc),
+                     vertices=self.vertices,
+                     faces=self.faces,
+                     panel_centre=self.panel_centre,
+                     panel_area=self.panel_area,
+                     panel_normal=self.panel_normal)
+            os.replace(temp_file, self.geometry_file)
+        except OSError:
+            pass
 
     def load_hull(self):
         """
         Reload the hull after a transformation of the mesh
         """
+        self.vertices, self.faces = index_vertices(self.mesh.vectors)
         self.calc_panel_centres()
         self.calc_panel_areas()
         self.calc_hull_parameters()
@@ -69,26 +199,206 @@ class create_object:
         """
         Calculate the centre of each panel
         """
-        panel_x = (self.mesh.v0[:, 0]+self.mesh.v1[:, 0]+self.mesh.v2[:, 0])/3
-        panel_y = (self.mesh.v0[:, 1]+self.mesh.v1[:, 1]+self.mesh.v2[:, 1])/3
-        panel_z = (self.mesh.v0[:, 2]+self.mesh.v1[:, 2]+self.mesh.v2[:, 2])/3
-        self.panel_centre = np.array([panel_x, panel_y, panel_z]).transpose()
+        self.panel_centre = np.mean(self.vertices[self.faces], axis=1)
 
     def calc_panel_areas(self):
         """
-        Calculate the area of each panel
+        Calculate the area and unit normal of each panel
         """
-        AB = self.mesh.v1-self.mesh.v0
-        AC = self.mesh.v2-self.mesh.v0
-        self.panel_area = np.sum(0.5*abs(np.cross(AB, AC)), axis=1)
+        v0, v1, v2 = np.moveaxis(self.vertices[self.faces], 1, 0)
+        normal = np.cross(v1-v0, v2-v0)
+        length = np.linalg.norm(normal, axis=1)
+        self.panel_area = 0.5*length
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.panel_normal = np.where(length[:, np.newaxis] > 0,
+                                         normal/length[:, np.newaxis], 0)
 
     def calc_hull_parameters(self):
         """
         Calculate the hull length, breadth, draught, depth and the centreline
         """
-        self.L = np.amax(self.mesh.x) - np.amin(self.mesh.x)
-        self.B = np.amax(self.mesh.y) - np.amin(self.mesh.y)
-        self.T = abs(np.amin(self.mesh.z))
-        self.D = np.amax(self.mesh.z) - np.amin(self.mesh.z)
-        self.centreline = np.average(self.mesh.y)
-        self.WSA = np.sum(self.panel_area[np.argwhere(self.panel_centre[:, 2] < 0)])
\ No newline at end of file
+        self.bounding_box = np.array([np.amin(self.vertices, axis=0),
+                                      np.amax(self.vertices, axis=0)])
+        self.L, self.B, self.D = self.bounding_box[1] - self.bounding_box[0]
+        self.T = abs(self.bounding_box[0, 2])
+        # The average over the corners of every panel, as each vertex is
+        # counted once for each panel it belongs to
+        uses = np.bincount(np.ravel(self.faces), minlength=len(self.vertices))
+        self.centreline = uses @ self.vertices[:, 1] / np.sum(uses)
+        # The panels are clipped exactly at the waterline, z = 0
+        self.WSA = self.clip(np.array([[0.0, 0.0, 1.0]]), np.zeros(1))["WSA"][0]
+
+    def waterplanes(self, drafts, heels=0):
+        """
+        The upward unit normals and offsets of the waterplanes n.x = offset
+        of the hull at drafts (from the keel) and heel angles (degrees, a
+        rotation of the hull about the x axis as rotate). The hull heels
+        about the point on the centreline at the draft.
+        """
+        drafts, heels = np.broadcast_arrays(np.asarray(drafts, dtype=float),
+                                            np.asarray(heels, dtype=float))
+        heel = np.ravel(heels)*np.pi/180
+        normals = np.column_stack([np.zeros_like(heel), np.sin(heel),
+                                   np.cos(heel)])
+        points = np.column_stack([np.zeros_like(heel),
+                                  np.full_like(heel, self.centreline),
+                                  self.bounding_box[0, 2] + np.ravel(drafts)])
+        return normals, np.sum(normals*points, axis=1)
+
+    def clip(self, normals, offsets, memory_budget=64*2**20):
+        """
+        Clips the panels exactly at a set of waterplanes and integrates over
+        the submerged part of the hull.
+
+        Each panel is split where its edges cross the waterplane, the part
+        below it being the whole panel, a triangle or a quadrilateral (the
+        whole panel less the triangle above). The displaced volume and its
+        centre follow from the divergence theorem over the submerged panels,
+        the waterplane itself contributing nothing as its height is zero, so
+        the hull must be closed below the waterline with outward normals.
+        The waterplane area and centre follow from the submerged panels
+        enclosing the waterplane.
+
+        Inputs:
+            normals -       An (m, 3) array of the upward unit normal of each
+                            waterplane, in the hull frame.
+
+            offsets -       An (m,) array, the waterplane is normal.x = offset.
+
+            memory_budget - The approximate memory in bytes used for each
+                            block of waterplanes.
+
+        Returns:
+            hydrostatics -  A dictionary of (m,) arrays, with (m, 3) arrays
+                            for the centres:
+                WSA         --  The wetted surface area
+                Volume      --  The displaced volume
+                AWP         --  The waterplane area
+                CB          --  The centre of buoyancy
+                CF          --  The centre of flotation, the centre of the
+                                waterplane
+        """
+        normals = np.reshape(np.asarray(normals, dtype=float), (-1, 3))
+        offsets = np.ravel(np.asarray(offsets, dtype=float))
+        corners = self.vertices[self.faces]
+        flat = np.reshape(corners, (-1, 3))
+        corner_sum = _corner_sum(np.moveaxis(corners, 1, -1))
+        # The vector area of each panel, its area along its normal
+        vector_area = self.panel_area[:, np.newaxis]*self.panel_normal
+        n_panels = len(self.faces)
+        totals = {name: np.zeros((len(offsets),) + shape) for name, shape in
+                  [("WSA", ()), ("Volume", ()), ("S", ()), ("M", (3,)),
+                   ("M2", ()), ("P", (3,))]}
+
+        # About ten (panels, 3) arrays of floats are alive for each waterplane
+        block = max(1, int(memory_budget // (n_panels*3*8*10)))
+        for start in range(0, len(offsets), block):
+            stop = min(start + block, len(offsets))
+            normal = normals[start:stop]
+            # The height of each corner above each waterplane
+            height = np.reshape((flat @ normal.T).T, (-1, n_panels, 3)) \
+                - offsets[start:stop, np.newaxis, np.newaxis]
+            below = height < 0
+            n_below = _corner_sum(below.astype(np.int8))
+            # The panels which are wholly or partly submerged, where the
+            # partly submerged quadrilaterals are corrected below
+            whole = (n_below >= 2).astype(float)
+            projected = vector_area @ normal.T
+            s = projected.T*whole
+            sum_height = _corner_sum(height)
+            totals["WSA"][start:stop] = whole @ self.panel_area
+            totals["Volume"][start:stop] = np.sum(s*sum_height, axis=1)/3
+            totals["S"][start:stop] = np.sum(s, axis=1)
+            totals["M"][start:stop] = (np.reshape(s[..., np.newaxis]*height,
+                                                  (len(normal), -1)) @ flat
+                                       + (s*sum_height) @ corner_sum)/12
+            totals["M2"][start:stop] = np.sum(s*(_corner_sum(height**2)
+                                                 + sum_height**2), axis=1)/24
+            totals["P"][start:stop] = s @ corner_sum/3
+
+            # The triangles cut off by the waterplane, at the corner on its
+            # own side of it. They are added where that corner is the only
+            # one below, and taken from the whole panel where it is the only
+            # one above.
+            m, f = np.nonzero((n_below == 1) | (n_below == 2))
+            lonely = below[m, f] == (n_below[m, f] == 1)[:, np.newaxis]
+            k = np.argmax(lonely, axis=-1)
+            sign = np.where(n_below[m, f] == 1, 1.0, -1.0)
+            h = height[m, f]
+            ha = h[np.arange(len(k)), k]
+            a = corners[f, k]
+            t1 = ha/(ha - h[np.arange(len(k)), (k + 1) % 3])
+            t2 = ha/(ha - h[np.arange(len(k)), (k + 2) % 3])
+            p1 = a + t1[:, np.newaxis]*(corners[f, (k + 1) % 3] - a)
+            p2 = a + t2[:, np.newaxis]*(corners[f, (k + 2) % 3] - a)
+            fraction = sign*t1*t2
+            s_small = fraction*projected[f, m]
+            m_block = m + start
+            size = len(offsets)
+            totals["WSA"] += np.bincount(m_block, fraction*self.panel_area[f], size)
+            totals["Volume"] += np.bincount(m_block, s_small*ha/3, size)
+            totals["S"] += np.bincount(m_block, s_small, size)
+            totals["M2"] += np.bincount(m_block, s_small*ha**2/12, size)
+            for i in range(3):
+                totals["M"][:, i] += np.bincount(m_block,
+                                                 s_small*ha*(2*a[:, i] + p1[:, i]
+                                                             + p2[:, i])/12, size)
+                totals["P"][:, i] += np.bincount(m_block,
+                                                 s_small*(a[:, i] + p1[:, i]
+                                                          + p2[:, i])/3, size)
+
+        volume = totals["Volume"]
+        waterplane_area = -totals["S"]
+
+        def horizontal(vector):
+            return vector - normals*np.sum(normals*vector, axis=1)[:, np.newaxis]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            CB = (horizontal(totals["M"])
+                  + normals*(totals["M2"] + offsets*volume)[:, np.newaxis])/volume[:, np.newaxis]
+            CF = (horizontal(-totals["P"])
+                  + normals*(offsets*waterplane_area)[:, np.newaxis])/waterplane_area[:, np.newaxis]
+        return {"WSA": totals["WSA"],
+                "Volume": volume,
+                "AWP": waterplane_area,
+                "CB": CB,
+                "CF": CF}
+
+    def hydrostatics(self, drafts, heels=0, memory_budget=64*2**20):
+        """
+        The hydrostatics of the hull at a table of loading conditions, without
+        moving the mesh. See waterplanes for the drafts and heels and clip for
+        the results, which have the shape of drafts and heels broadcast
+        together (with a last axis of 3 for the centres, in the hull frame).
+        """
+        shape = np.broadcast(np.asarray(drafts), np.asarray(heels)).shape
+        results = self.clip(*self.waterplanes(drafts, heels),
+                            memory_budget=memory_budget)
+        return {name: np.reshape(value, shape + value.shape[1:])
+                for name, value in results.items()}
+
+    def translate(self, dx=0, dy=0, dz=0):
+        """
+        Moves the hull by dx, dy, dz, updating the geometry in place.
+        """
+        offset = np.array([dx, dy, dz], dtype=float)
+        self.vertices += offset
+        self.panel_centre += offset
+        if self._mesh is not None:
+            self._mesh.vectors += offset
+        self.calc_hull_parameters()
+
+    def rotate(self, rot_x=0, rot_y=0, rot_z=0, point=(0, 0, 0)):
+        """
+        Rotates the hull by the euler angles rot_x, rot_y, rot_z (degrees,
+        intrinsic XYZ as ANSYS_tools) about point, updating the geometry in
+        place. The areas do not change.
+        """
+        matrix = R.from_euler("XYZ", [rot_x, rot_y, rot_z],
+                              degrees=True).as_matrix()
+        point = np.asarray(point, dtype=float)
+        self.vertices[:] = (self.vertices - point) @ matrix.T + point
+        self.panel_centre[:] = (self.panel_centre - point) @ matrix.T + point
+        self.panel_normal[:] = self.panel_normal @ matrix.T
+        self._mesh = None
+        self.calc_hull_parameters()
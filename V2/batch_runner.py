@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the MSI/MII calculation of GUI.py for every sea state of every platform
+without prompting, e.g.
+
+    python batch_runner.py --ship-rot 0 --person-rot 0 45 90
+
+Every run found under the platform data folder is evaluated for every ship
+and person rotation over a pool of processes. Each finished run is saved to
+its own file in a parts folder next to the output, so an interrupted sweep
+can be restarted and only the missing runs are evaluated. A part is named by
+its run, its rotations and the settings of the sweep (the differentiator,
+the MSI method and FFT length plan, and a hash of those settings with the
+turbine and task tables), so parts calculated with other settings are never
+reused. The parts of the sweep are then gathered into a single table.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import importlib
+import os
+import numpy as np
+import pandas as pd
+import ANSYS_tools
+import MII
+import motion_records
+
+
+def settings_name(turbine, tasks, differentiator="backward",
+                  msi_method="spectral", length_plan="trim"):
+    """
+    A name for the settings which change the results of a run besides its
+    rotations: the differentiator, the MSI method and length plan, and a
+    short hash of these with the turbine, its tasks and the MSI bands.
+    """
+    digest = hashlib.sha1()
+    digest.update(turbine.to_frame().to_csv().encode())
+    digest.update(tasks.to_csv().encode())
+    digest.update(repr((differentiator, msi_method, length_plan,
+                        MII.MSI_BANDS.edges.tolist(),
+                        MII.MSI_BANDS.weights.tolist())).encode())
+    return "%s_%s_%s_%s" % (differentiator, msi_method, length_plan,
+                            digest.hexdigest()[:10])
+
+
+def run_name(run, ship_rot_z, person_rot_z, settings):
+    """
+    A name which is unique to a run, its rotations and the settings_name of
+    the sweep, used to name its results file.
+    """
+    return "%s_%sship%g_person%g_%s" % (run["Turbine type"], run["Run"],
+                                        ship_rot_z, person_rot_z, settings)
+
+
+def evaluate_run(run, turbine, tasks, ship_rot_z, person_rot_z,
+                 cache_dir=None, differentiator="backward",
+                 msi_method="spectral", length_plan="trim"):
+    """
+    Calculates the MSI and MII of every task of a turbine in one run, as in
+    GUI.py.
+
+    Inputs:
+        run -           A run from motion_records.find_runs.
+
+        turbine -       The row of Turbines.xlsx of the turbine type.
+
+        tasks -         The rows of tasks.xlsx of the turbine type.
+
+        ship_rot_z -    The rotation of the ship axis relative to the ANSYS
+                        axis.
+
+        person_rot_z -  The rotation of the person on the boat.
+
+        cache_dir -     The folder of a motion_record_cache of parsed runs.
+
+        differentiator - How the motions are differentiated, see
+                        differentiation.differentiate.
+
+        msi_method -    How the band RMS of the MSI is calculated, see
+                        MII.octave_batch.
+
+        length_plan -   How the length of the FFT of the MSI is chosen, see
+                        MII.plan_fft_length.
+
+    Returns:
+        tasks -         The tasks with the results of the run added.
+    """
+    cache = None
+    if cache_dir is not None:
+        cache = motion_records.motion_record_cache(cache_dir)
+    df = motion_records.read_aqwa_run(run["CG file"], run["ROT file"],
+                                      cache=cache)
+    acc_pos = np.array(turbine[["X", "Y", "Z"]], dtype=float)
+    accelerometer = ANSYS_tools.ansys_accelerometer(df,
+                                                    position=acc_pos,
+                                                    ship_rot=[0, 0, ship_rot_z],
+                                                    person_rot=person_rot_z,
+                                                    differentiator=differentiator)
+
+    XX, YY, ZZ = MII.points(acc_pos,
+                            tasks["X"].to_numpy(),
+                            tasks["Y"].to_numpy(),
+                            tasks["Z"].to_numpy())
+    XX, YY, ZZ = accelerometer.coordinates_in_person_rf(XX, YY, ZZ)
+    Ax, Ay, Az, A = MII.translate_accelerations(XX, YY, ZZ, accelerometer)
+
+    tasks = tasks.copy()
+    tasks["Turbine"] = turbine["Turbine type"]
+    tasks["Hz"] = run["Hz"]
+    tasks["Tz"] = run["Tz"]
+    tasks["Wave direction"] = run["Wave direction"]
+    tasks["Ship rotation"] = ship_rot_z
+    tasks["Person rotation"] = person_rot_z
+    tasks["Differentiator"] = differentiator
+    tasks["MSI method"] = msi_method
+    tasks["Length plan"] = length_plan
+
+    statistics = MII.motion_statistics(Ax,
+                                       Ay,
+                                       Az,
+                                       A,
+                                       accelerometer=accelerometer,
+                                       exposure_time=tasks["Exposure time"].to_numpy(),
+                                       Cts=[tasks["Sideways tip coeff"].to_numpy(),
+                                            tasks["Foreward tip coeff"].to_numpy()],
+                                       h=tasks["h"].to_numpy(),
+                                       index=tasks.index,
+                                       msi_method=msi_method,
+                                       length_plan=length_plan)
+    tasks = tasks.join(statistics)
+
+    recovery_time = tasks["Recovery time"].to_numpy()
+    side_mii_rate = tasks["Sideways MII Rate"].to_numpy()
+    fore_mii_rate = tasks["Foreward MII Rate"].to_numpy()
+    combined_rate = side_mii_rate + fore_mii_rate
+    tasks["Sideways MII Task Eff."] = MII.calc_E_task(side_mii_rate,
+                                                      recovery_time)
+    tasks["Foreward MII Task Eff."] = MII.calc_E_task(fore_mii_rate,
+                                                      recovery_time)
+    tasks["Combined MII rate"] = combined_rate
+    tasks["Combined MII Task Eff."] = MII.calc_E_task(combined_rate,
+                                                      recovery_time)
+    return tasks
+
+
+def save_part(tasks, file):
+    """
+    Saves the results of one run. The file is written under a temporary name
+    first, so a part file only exists once it is complete.
+    """
+    temp_file = file+".tmp"
+    tasks.to_pickle(temp_file)
+    os.replace(temp_file, file)
+
+
+def table_file(file):
+    """
+    The file to save the gathered results to. Parquet needs pyarrow or
+    fastparquet, so a .parquet file falls back to .csv if neither is
+    installed. This is checked before the sweep, so the results are never
+    lost to a missing engine at the end.
+    """
+    if not file.endswith(".parquet"):
+        return file
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            importlib.import_module(engine)
+            return file
+        except ImportError:
+            pass
+    csv_file = file[:-len(".parquet")]+".csv"
+    print("Neither pyarrow nor fastparquet is installed, saving to %s"
+          % csv_file)
+    return csv_file
+
+
+def save_table(table, file):
+    """
+    Saves the gathered results, as parquet if the file ends in .parquet and
+    as csv otherwise.
+    """
+    if file.endswith(".parquet"):
+        table.to_parquet(file, index=False)
+    else:
+        table.to_csv(file, index=False)
+
+
+def run_batch(data_dir, output, turbines_file="Turbines.xlsx",
+              tasks_file="tasks.xlsx", ship_rots=(0,), person_rots=(0,),
+              processes=None, cache_dir=None, differentiator="backward",
+              msi_method="spectral", length_plan="trim"):
+    """
+    Evaluates every run below data_dir for every ship and person rotation.
+
+    Inputs:
+        data_dir -      The platform data folder.
+
+        output -        The file of the gathered results, see table_file.
+                        The results of each run are kept in the folder
+                        output+"_parts".
+
+        turbines_file - The table of turbine types and accelerometer
+                        positions.
+
+        tasks_file -    The table of tasks of each turbine type.
+
+        ship_rots -     A list of rotations of the ship axis relative to the
+                        ANSYS axis.
+
+        person_rots -   A list of rotations of the person on the boat.
+
+        processes -     The number of worker processes, defaults to the
+                        number of CPUs.
+
+        cache_dir -     The folder of a motion_record_cache of parsed runs,
+                        or None to always read the CSV files.
+
+        differentiator - How the motions are differentiated, one of
+                        differentiation.DIFFERENTIATORS.
+
+        msi_method -    How the band RMS of the MSI is calculated, see
+                        MII.octave_batch.
+
+        length_plan -   How the length of the FFT of the MSI is chosen, see
+                        MII.plan_fft_length.
+
+    Returns:
+        table -         The results of every run of the sweep.
+    """
+    turbines = pd.read_excel(turbines_file)
+    turbines.index = turbines["Turbine type"].str.upper()
+    all_tasks = pd.read_excel(tasks_file)
+
+    parts_dir = output+"_parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    output = table_file(output)
+
+    parts = []
+    jobs = []
+    for run in motion_records.find_runs(data_dir):
+        turbine_type = run["Turbine type"].upper()
+        if turbine_type not in turbines.index:
+            print("No turbine data for %s, skipping" % run["CG file"])
+            continue
+        turbine = turbines.loc[turbine_type]
+        tasks = all_tasks[all_tasks["Turbine type"].str.upper() == turbine_type]
+        settings = settings_name(turbine, tasks, differentiator, msi_method,
+                                 length_plan)
+        for ship_rot_z in ship_rots:
+            for person_rot_z in person_rots:
+                part = os.path.join(parts_dir,
+                                    run_name(run, ship_rot_z, person_rot_z,
+                                             settings)+".pkl")
+                parts.append(part)
+                if os.path.isfile(part):
+                    continue
+                jobs.append((part, (run, turbine, tasks, ship_rot_z,
+                                    person_rot_z, cache_dir,
+                                    differentiator, msi_method,
+                                    length_plan)))
+
+    print("%d runs to evaluate" % len(jobs))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {pool.submit(evaluate_run, *args): part for part, args in jobs}
+        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+            part = futures[future]
+            try:
+                save_part(future.result(), part)
+            except Exception as error:
+                print("%s failed: %r" % (os.path.basename(part), error))
+            else:
+                print("%d/%d %s" % (i+1, len(jobs), os.path.basename(part)))
+
+    # Only the parts of this sweep, not those left by sweeps with other
+    # settings
+    parts = [part for part in parts if os.path.isfile(part)]
+    if not parts:
+        return pd.DataFrame()
+    table = pd.concat([pd.read_pickle(part) for part in parts],
+                      ignore_index=True)
+    save_table(table, output)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data-dir",
+                        default=os.path.join("Data", "platform_data"))
+    parser.add_argument("--output", default="batch_results.csv")
+    parser.add_argument("--turbines", default="Turbines.xlsx")
+    parser.add_argument("--tasks", default="tasks.xlsx")
+    parser.add_argument("--ship-rot", type=float, nargs="+", default=[0])
+    parser.add_argument("--person-rot", type=float, nargs="+", default=[0])
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--cache-dir",
+                        default=os.path.join("Data", "motion_cache"))
+    parser.add_argument("--differentiator", default="backward",
+                        choices=["backward", "central", "savgol", "spectral"])
+    parser.add_argument("--msi-method", default="spectral",
+                        choices=["spectral", "time"])
+    parser.add_argument("--length-plan", default="trim",
+                        choices=["trim", "pad", "legacy"])
+    args = parser.parse_args()
+    run_batch(args.data_dir,
+              args.output,
+              turbines_file=args.turbines,
+              tasks_file=args.tasks,
+              ship_rots=args.ship_rot,
+              person_rots=args.person_rot,
+              processes=args.processes,
+              cache_dir=args.cache_dir,
+              differentiator=args.differentiator,
+              msi_method=args.msi_method,
+              length_plan=args.length_plan)
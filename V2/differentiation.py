@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Numerical differentiation of motion time series.
+
+ansys_accelerometer and MII.motion_kinematics differentiate positions and
+rotations twice to find accelerations. Every differentiator here takes the
+values, the time of each sample, the order of the derivative and the axis of
+time, so all six degrees of freedom are differentiated in one call:
+
+    backward    --  The original backward differences, np.diff with a zero
+                    prepended, divided by the first time step. The first
+                    samples are a spike, as the series is treated as
+                    starting from zero. Kept to reproduce earlier results.
+    central     --  Second order central differences, which use the actual
+                    time steps so non-uniform sampling is handled.
+    savgol      --  Savitzky-Golay filtering, the derivative of a local
+                    polynomial fit, which smooths noise.
+    spectral    --  Differentiation in the frequency domain, optionally
+                    removing frequencies above a cutoff.
+
+savgol and spectral need uniform samples, so non-uniform series are
+interpolated onto a uniform grid with cubic splines, differentiated and
+interpolated back.
+
+A differentiator can also be any function called as
+function(values, t, order=order, axis=axis).
+"""
+
+import numpy as np
+
+
+def backward_difference(values, t, order=1, axis=0):
+    """
+    The original backward differences. Each derivative is
+    np.diff(values, prepend=0)/dt, where dt is the first time step.
+    """
+    t = np.asarray(t, dtype=float)
+    time_step = t[1] - t[0]
+    for _ in range(order):
+        values = np.diff(values, axis=axis, prepend=0)/time_step
+    return values
+
+
+def _second_difference(values, t, axis):
+    """
+    The three point second derivative on a non-uniform grid. The ends take
+    the value of their neighbour, the second derivative of the parabola
+    through the first (or last) three samples.
+    """
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, 0)
+    h = np.diff(t).reshape((-1,) + (1,)*(values.ndim - 1))
+    slopes = np.diff(values, axis=0)/h
+    d2 = np.empty_like(values)
+    d2[1:-1] = 2*np.diff(slopes, axis=0)/(h[1:] + h[:-1])
+    d2[0] = d2[1]
+    d2[-1] = d2[-2]
+    return np.moveaxis(d2, 0, axis)
+
+
+def central_difference(values, t, order=1, axis=0):
+    """
+    Second order central differences using the time of each sample. First
+    derivatives use np.gradient with second order one sided differences at
+    the ends, second derivatives use the three point stencil directly rather
+    than applying np.gradient twice, which would smooth over two steps.
+    """
+    t = np.asarray(t, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if values.shape[axis] < 3:
+        raise ValueError("central differences need at least 3 samples")
+    while order >= 2:
+        values = _second_difference(values, t, axis)
+        order -= 2
+    if order:
+        values = np.gradient(values, t, axis=axis, edge_order=2)
+    return values
+
+
+def is_uniform(t, rtol=1e-6):
+    """
+    True if the time steps of t are all equal to within rtol.
+    """
+    steps = np.diff(np.asarray(t, dtype=float))
+    return bool(np.all(np.abs(steps - steps.mean()) <= rtol*abs(steps.mean())))
+
+
+def _on_uniform_grid(function, values, t, order, axis, **options):
+    """
+    Applies a differentiator which needs uniform samples, resampling values
+    onto a uniform grid with a cubic spline first if t is not uniform.
+    """
+    t = np.asarray(t, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if is_uniform(t):
+        return function(values, t[1] - t[0], order, axis, **options)
+    from scipy.interpolate import CubicSpline
+    grid = np.linspace(t[0], t[-1], len(t))
+    derivative = function(CubicSpline(t, values, axis=axis)(grid),
+                          grid[1] - grid[0], order, axis, **options)
+    return CubicSpline(grid, derivative, axis=axis)(t)
+
+
+def _savgol(values, time_step, order, axis, window_length=11, polyorder=3):
+    from scipy.signal import savgol_filter
+    n = values.shape[axis]
+    if window_length > n:
+        # The longest odd window which fits in the series
+        window_length = n - (1 - n % 2)
+    return savgol_filter(values, window_length, max(polyorder, order),
+                         deriv=order, delta=time_step, axis=axis,
+                         mode="interp")
+
+
+def savgol_difference(values, t, order=1, axis=0, window_length=11,
+                      polyorder=3):
+    """
+    The derivative of a polynomial of degree polyorder fitted by least
+    squares over window_length samples around each sample. The ends use the
+    fit of the first (or last) full window, so there is no spike. The
+    polynomial filters out noise with a period shorter than about the window.
+    """
+    return _on_uniform_grid(_savgol, values, t, order, axis,
+                            window_length=window_length, polyorder=polyorder)
+
+
+def _spectral(values, time_step, order, axis, cutoff=None):
+    values = np.moveaxis(values, axis, -1)
+    n = values.shape[-1]
+    # Remove the cubic which matches the values and the second derivatives
+    # (from a Savitzky-Golay fit) at the ends. What is left is zero, with
+    # zero curvature, at both ends, so its odd reflection repeats smoothly
+    # and does not ring.
+    s = np.arange(n)*time_step
+    T = s[-1]
+    curvature = np.moveaxis(_savgol(values, time_step, 2, -1)[..., [0, -1]],
+                            -1, 0)
+    c0 = values[..., :1]
+    c2 = curvature[0][..., np.newaxis]/2
+    c3 = (curvature[1] - curvature[0])[..., np.newaxis]/(6*T)
+    c1 = (values[..., -1:] - c0 - c2*T**2 - c3*T**3)/T
+    residual = values - (c0 + c1*s + c2*s**2 + c3*s**3)
+    extended = np.concatenate([residual, -residual[..., -2:0:-1]], axis=-1)
+
+    frequencies = np.fft.rfftfreq(extended.shape[-1], time_step)
+    factor = (2j*np.pi*frequencies)**order
+    if order % 2:
+        # The Nyquist frequency has no phase, its odd derivatives are unknown
+        factor[-1] = 0
+    if cutoff is not None:
+        factor[frequencies > cutoff] = 0
+    derivative = np.fft.irfft(np.fft.rfft(extended, axis=-1)*factor,
+                              extended.shape[-1], axis=-1)[..., :n]
+
+    cubic = [c0, c1, c2, c3]
+    for _ in range(order):
+        cubic = [k*c for k, c in enumerate(cubic)][1:]
+    for k, c in enumerate(cubic):
+        derivative = derivative + c*s**k
+    return np.moveaxis(derivative, -1, axis)
+
+
+def spectral_difference(values, t, order=1, axis=0, cutoff=None):
+    """
+    Differentiation in the frequency domain, multiplying the Fourier
+    transform by (2j*pi*f)**order. A cubic through the ends of the series is
+    removed first and differentiated exactly, and the rest is reflected to
+    make it periodic, so the ends do not ring. Frequencies above cutoff (in
+    Hz) are removed, which filters out noise above the wave frequencies.
+    """
+    return _on_uniform_grid(_spectral, values, t, order, axis, cutoff=cutoff)
+
+
+DIFFERENTIATORS = {"backward": backward_difference,
+                   "central": central_difference,
+                   "savgol": savgol_difference,
+                   "spectral": spectral_difference}
+
+
+def differentiate(values, t, order=1, method="backward", axis=0, **options):
+    """
+    Differentiates values with respect to time.
+
+    Inputs:
+        values -    The time series, any shape with time along axis.
+
+        t -         The time of each sample.
+
+        order -     The order of the derivative.
+
+        method -    The name of one of DIFFERENTIATORS, or a function called
+                    as method(values, t, order=order, axis=axis).
+
+        axis -      The axis of time.
+
+        options -   Options passed on to the differentiator, e.g.
+                    window_length for "savgol" or cutoff for "spectral".
+
+    Returns:
+        derivative - The derivative, the same shape as values.
+    """
+    if callable(method):
+        return method(values, t, order=order, axis=axis, **options)
+    try:
+        function = DIFFERENTIATORS[method]
+    except KeyError:
+        raise ValueError("method must be one of %s or a function, not %r"
+                         % (", ".join(DIFFERENTIATORS), method)) from None
+    return function(values, t, order=order, axis=axis, **options)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Maps the MSI, MII rates and RMS accelerations over the surface of a hull
+without evaluating every panel of its STL.
+
+The accelerations at a point are linear in its lever arm from the
+accelerometer (see MII.LEVER_ARM_COUPLING), so the statistics derived from
+them vary smoothly over the hull. The panel centres are grouped into voxels
+and only one representative panel per voxel is evaluated. Each
+representative is then checked against the interpolation from its
+neighbours, and voxels where the two differ by more than a tolerance are
+split into eight until the map converges. Every panel is finally
+interpolated from the nearest representatives with a k-d tree.
+"""
+
+import collections
+import numpy as np
+from scipy.spatial import cKDTree
+import MII
+
+# The result of adaptive_map.
+#   values          -- A dictionary of the value of each field at every point
+#   representatives -- The indices of the points which were evaluated
+#   leaf            -- The voxel of each point, an index into representatives
+#   estimated_error -- The largest leave one out error of each field over
+#                      the representatives, see leave_one_out_error
+#   checked_error   -- The largest error of each field over the checked
+#                      points, which were evaluated exactly
+surface_map = collections.namedtuple("surface_map", ["values",
+                                                     "representatives",
+                                                     "leaf",
+                                                     "estimated_error",
+                                                     "checked_error"])
+
+
+def group_points(points, keys):
+    """
+    Groups points by integer keys, e.g. their voxel.
+
+    Inputs:
+        points -    An (n, 3) array of points.
+
+        keys -      An (n, m) integer array, points with equal rows are
+                    grouped together.
+
+    Returns:
+        labels -    The group of each point.
+
+        centres -   The index of the point of each group which is nearest the
+                    centroid of the group.
+    """
+    _, labels = np.unique(keys, axis=0, return_inverse=True)
+    labels = np.ravel(labels)
+    n_groups = labels.max() + 1
+    counts = np.bincount(labels, minlength=n_groups)
+    centroids = np.stack([np.bincount(labels, points[:, i], n_groups)
+                          for i in range(3)], axis=1)/counts[:, np.newaxis]
+    distance = np.sum((points - centroids[labels])**2, axis=1)
+    order = np.lexsort((distance, labels))
+    first = np.flatnonzero(np.diff(labels[order], prepend=-1))
+    return labels, order[first]
+
+
+def voxel_keys(points, origin, cell_size):
+    """
+    The integer index of the voxel of side cell_size holding each point.
+    cell_size may be one value per point.
+    """
+    cell_size = np.reshape(cell_size, (-1, 1))
+    return np.floor((points - origin)/cell_size).astype(np.int64)
+
+
+def interpolate(known_points, known_values, points, k=8, method="linear"):
+    """
+    Interpolates values known at some points to other points from the k
+    nearest known points.
+
+    Inputs:
+        known_points -  An (m, 3) array of the points with known values.
+
+        known_values -  An (m, n_fields) array of the values.
+
+        points -        An (n, 3) array of the points to interpolate to.
+
+        k -             The number of neighbours used.
+
+        method -        "linear" fits a plane through the neighbours by
+                        weighted least squares, which is exact for fields
+                        which are linear in position. "idw" takes the
+                        inverse distance weighted average.
+
+    Returns:
+        values -        An (n, n_fields) array of the interpolated values.
+    """
+    k = min(k, len(known_points))
+    distance, neighbours = cKDTree(known_points).query(points, k=k)
+    distance = np.reshape(distance, (len(points), k))
+    neighbours = np.reshape(neighbours, (len(points), k))
+    return _interpolate_from(known_points, known_values, points, distance,
+                             neighbours, method)
+
+
+def _interpolate_from(known_points, known_values, points, distance,
+                      neighbours, method):
+    values = known_values[neighbours]
+    exact = distance[:, 0] == 0
+    weights = 1/np.maximum(distance, 1e-12)**2
+    if method == "idw":
+        result = np.einsum('nk,nkf->nf', weights, values)/np.sum(weights, axis=1)[:, np.newaxis]
+    elif method == "linear":
+        # Weighted least squares of v = c0 + c.(x - point) over the
+        # neighbours. The gradient is lightly damped, as the neighbours on a
+        # flat part of the hull do not fix the gradient normal to it.
+        offsets = known_points[neighbours] - points[:, np.newaxis]
+        X = np.concatenate([np.ones(offsets.shape[:2] + (1,)), offsets],
+                           axis=-1)
+        XtW = np.swapaxes(X, 1, 2)*weights[:, np.newaxis]
+        normal = np.matmul(XtW, X)
+        scale = np.trace(normal, axis1=1, axis2=2)
+        damping = np.diag([0, 1, 1, 1])*1e-9
+        normal += scale[:, np.newaxis, np.newaxis]*damping
+        coefficients = np.linalg.solve(normal, np.matmul(XtW, values))
+        result = coefficients[:, 0]
+    else:
+        raise ValueError("method must be 'linear' or 'idw', not %r"
+                         % (method,))
+    result[exact] = values[exact, 0]
+    return result
+
+
+def leave_one_out_error(known_points, known_values, k=8, method="linear"):
+    """
+    The error of interpolating each known value from the other known values,
+    as a fraction of the range of each field. Returns an (m, n_fields)
+    array.
+    """
+    k = min(k, len(known_points) - 1)
+    distance, neighbours = cKDTree(known_points).query(known_points, k=k + 1)
+    distance = np.reshape(distance, (len(known_points), k + 1))[:, 1:]
+    neighbours = np.reshape(neighbours, (len(known_points), k + 1))[:, 1:]
+    estimate = _interpolate_from(known_points, known_values, known_points,
+                                 np.maximum(distance, 1e-12), neighbours,
+                                 method)
+    scale = np.ptp(known_values, axis=0)
+    scale[scale == 0] = 1
+    return np.abs(estimate - known_values)/scale
+
+
+def motion_evaluator(accelerometer, exposure_time=None, Cts=None, h=0.91,
+                     **options):
+    """
+    Returns a function which calculates the statistics of
+    MII.translate_accelerations_chunked at an (n, 3) array of lever arms,
+    for use with adaptive_map. The exposure time, tipping coefficients and
+    height are shared by every point.
+    """
+    kinematics = MII.motion_kinematics.from_accelerometer(accelerometer)
+
+    def evaluate(lever_arms):
+        return MII.translate_accelerations_chunked(lever_arms[:, 0],
+                                                   lever_arms[:, 1],
+                                                   lever_arms[:, 2],
+                                                   accelerometer,
+                                                   exposure_time=exposure_time,
+                                                   Cts=Cts,
+                                                   h=h,
+                                                   kinematics=kinematics,
+                                                   **options)
+    return evaluate
+
+
+def adaptive_map(evaluate, points, cell_size, tolerance=0.01, max_levels=4,
+                 k=12, method="linear", refine_on=None, n_check=0, seed=0):
+    """
+    Evaluates fields at a set of representative points and interpolates them
+    to every point, refining the representatives where the fields are not
+    smooth.
+
+    Inputs:
+        evaluate -      A function of an (m, 3) array of points returning a
+                        dictionary of (m,) arrays, e.g. motion_evaluator.
+
+        points -        An (n, 3) array of points, e.g. panel centres.
+
+        cell_size -     The side of the voxels of the first level.
+
+        tolerance -     The largest leave one out error, as a fraction of the
+                        range of each field, before a voxel is split.
+
+        max_levels -    The largest number of times a voxel is split.
+
+        k -             The number of neighbours used to interpolate.
+
+        method -        The interpolation method, see interpolate.
+
+        refine_on -     The names of the fields whose error decides which
+                        voxels are split, or None for every field. The MII
+                        rates are counts of trips, which are noisy from
+                        point to point, and the extremes have kinks, so
+                        refining on the RMS and MSI is usually enough.
+
+        n_check -       The number of points which are not representatives to
+                        evaluate exactly, to measure the error of the map.
+
+        seed -          The seed of the choice of checked points.
+
+    Returns:
+        map -           A surface_map.
+    """
+    points = np.asarray(points, dtype=float)
+    origin = points.min(axis=0)
+    leaf, representatives = group_points(points,
+                                         voxel_keys(points, origin, cell_size))
+    level = np.zeros(len(representatives), dtype=int)
+    found = evaluate(points[representatives])
+    names = list(found)
+    values = np.column_stack([np.ravel(found[name]) for name in names])
+    if refine_on is None:
+        refine_on = names
+    refined = [names.index(name) for name in refine_on]
+
+    for _ in range(max_levels):
+        if len(representatives) <= k:
+            break
+        error = leave_one_out_error(points[representatives],
+                                    values[:, refined], k=k,
+                                    method=method).max(axis=1)
+        split = (error > tolerance) & (np.bincount(leaf, minlength=len(representatives)) > 1)
+        if not split.any():
+            break
+        inside = np.flatnonzero(split[leaf])
+        child_level = level[leaf[inside]] + 1
+        keys = np.column_stack([leaf[inside],
+                                voxel_keys(points[inside], origin,
+                                           cell_size/2.0**child_level)])
+        child_leaf, child_centres = group_points(points[inside], keys)
+        child_representatives = inside[child_centres]
+
+        keep = ~split
+        new_leaf = np.cumsum(keep) - 1
+        leaf = new_leaf[leaf]
+        leaf[inside] = keep.sum() + child_leaf
+        found = evaluate(points[child_representatives])
+        values = np.concatenate([values[keep],
+                                 np.column_stack([np.ravel(found[name])
+                                                  for name in names])])
+        level = np.concatenate([level[keep], child_level[child_centres]])
+        representatives = np.concatenate([representatives[keep],
+                                          child_representatives])
+
+    estimated = leave_one_out_error(points[representatives], values, k=k,
+                                    method=method).max(axis=0)*np.ptp(values, axis=0)
+    mapped = interpolate(points[representatives], values, points, k=k,
+                         method=method)
+
+    checked = None
+    if n_check:
+        others = np.setdiff1d(np.arange(len(points)), representatives)
+        check = np.random.default_rng(seed).choice(others,
+                                                   min(n_check, len(others)),
+                                                   replace=False)
+        found = evaluate(points[check])
+        exact = np.column_stack([np.ravel(found[name]) for name in names])
+        checked = dict(zip(names, np.abs(mapped[check] - exact).max(axis=0)))
+
+    return surface_map(values={name: mapped[:, i] for i, name in enumerate(names)},
+                       representatives=representatives,
+                       leaf=leaf,
+                       estimated_error=dict(zip(names, estimated)),
+                       checked_error=checked)
+
+
+def stl_map(acc_pos, STL_loader_object, accelerometer, cell_size,
+            exposure_time=None, Cts=None, h=0.91, **options):
+    """
+    Maps the statistics of MII.translate_accelerations_chunked over the
+    panels of an STL, the decimated equivalent of evaluating
+    MII.stl_points.
+
+    Inputs:
+        acc_pos -           The accelerometer position relative to the ship
+                            origin.
+
+        STL_loader_object - A STL_loader.create_object object.
+
+        accelerometer -     An ANSYS_tools.ansys_accelerometer.
+
+        cell_size -         The side of the voxels of the first level, see
+                            adaptive_map.
+
+        exposure_time, Cts, h - See motion_evaluator.
+
+        options -           Passed on to adaptive_map, e.g. tolerance and
+                            n_check.
+
+    Returns:
+        map -               A surface_map with a value for every panel.
+    """
+    XX, YY, ZZ = MII.stl_points(acc_pos, STL_loader_object)
+    XX, YY, ZZ = accelerometer.coordinates_for_headings(
+        XX, YY, ZZ, [accelerometer.person_rot])
+    lever_arms = np.column_stack([np.ravel(XX), np.ravel(YY), np.ravel(ZZ)])
+    evaluate = motion_evaluator(accelerometer, exposure_time=exposure_time,
+                                Cts=Cts, h=h)
+    return adaptive_map(evaluate, lever_arms, cell_size, **options)
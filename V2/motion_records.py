@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Reading the motion records exported by ANSYS AQWA.
+
+Each run is a pair of files in Data/platform_data/<Turbine type>/<Hz>/<Tz>/
+<direction>/, named <Hz>_<Tz>_<direction>_CG.csv and
+<Hz>_<Tz>_<direction>_ROT.csv, holding the position of the centre of gravity
+and the rotation of the platform.
+
+Parsing the CSV files is slow, so parsed runs can be kept in a
+motion_record_cache.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# The columns of the motion data of a run
+COLUMNS = ["Time", "X", "Y", "Z", "Rot x", "Rot y", "Rot z"]
+
+
+def read_aqwa_run(CG_file, ROT_file, cache=None):
+    """
+    Reads the CG and ROT files of a run into one motion data DataFrame.
+
+    Inputs:
+        CG_file -   The file of the centre of gravity position.
+
+        ROT_file -  The file of the rotations.
+
+        cache -     A motion_record_cache. If given, the run is loaded from
+                    the cache when the files have been read before.
+
+    Returns:
+        df -        A DataFrame with columns "Time", "X", "Y", "Z", "Rot x",
+                    "Rot y", "Rot z", as used by ansys_accelerometer.
+    """
+    if cache is not None:
+        return cache.load(CG_file, ROT_file)
+    CG = pd.read_csv(CG_file, skiprows=5, encoding="ISO-8859-1")
+    ROT = pd.read_csv(ROT_file, skiprows=5, encoding="ISO-8859-1")
+    df = pd.DataFrame({"Time": CG["*Time (s)"].to_numpy(),
+                       "X": CG["Line A (m)"].to_numpy(),
+                       "Y": CG["Line B (m)"].to_numpy(),
+                       "Z": CG["Line C (m)"].to_numpy(),
+                       "Rot x": ROT.iloc[:, 1].to_numpy(),
+                       "Rot y": ROT.iloc[:, 2].to_numpy(),
+                       "Rot z": ROT.iloc[:, 3].to_numpy()})
+    return df
+
+
+class motion_record_cache:
+    """
+    A cache on disk of runs which have already been parsed.
+
+    Each run is stored as <key>.npy in cache_dir, a float64 array of shape
+    (7, n_frames) with one row for each of COLUMNS, so each column is
+    contiguous and the file can be memory mapped. The key is a hash of the
+    contents of the CG and ROT files, so a run is parsed again whenever either
+    file changes. Hashing a file is much quicker than parsing it, and the hash
+    of each file is kept in index.json along with its size and modification
+    time, so a file is only hashed again once it has been modified.
+
+    Once the cache is larger than max_bytes the least recently used runs are
+    removed.
+    Attributes:
+        cache_dir   --  The folder of the cache
+        max_bytes   --  The maximum size of the cached runs
+    Methods:
+        load        --  Load a run, from the cache if possible
+        file_hash   --  The hash of the contents of a file
+        evict       --  Remove the least recently used runs
+    """
+
+    def __init__(self, cache_dir, max_bytes=2**30):
+        """
+        Initialise the cache, creating cache_dir if needed.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _read_index(self):
+        try:
+            with open(self.index_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        temp_file = "%s.%d.tmp" % (self.index_file, os.getpid())
+        with open(temp_file, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_file, self.index_file)
+
+    def file_hash(self, file):
+        """
+        Returns the SHA1 hash of the contents of file, reusing the hash in the
+        index if the size and modification time of the file have not changed.
+        """
+        file = os.path.abspath(file)
+        stat = os.stat(file)
+        index = self._read_index()
+        entry = index.get(file)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        sha1 = hashlib.sha1()
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                sha1.update(block)
+        index[file] = [stat.st_size, stat.st_mtime_ns, sha1.hexdigest()]
+        self._write_index(index)
+        return sha1.hexdigest()
+
+    def cache_file(self, CG_file, ROT_file):
+        """
+        Returns the cache file of a run.
+        """
+        key = hashlib.sha1((self.file_hash(CG_file)
+                            + self.file_hash(ROT_file)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key+".npy")
+
+    def load(self, CG_file, ROT_file):
+        """
+        Loads a run, reading the CSV files and adding the run to the cache if
+        it is not already cached. See read_aqwa_run.
+        """
+        file = self.cache_file(CG_file, ROT_file)
+        try:
+            data = np.load(file, mmap_mode="r")
+        except (OSError, ValueError):
+            data = None
+        if data is not None and data.shape[0] == len(COLUMNS):
+            # Mark the run as recently used
+            os.utime(file)
+            return pd.DataFrame(dict(zip(COLUMNS, data)))
+
+        df = read_aqwa_run(CG_file, ROT_file)
+        temp_file = "%s.%d.tmp.npy" % (file[:-len(".npy")], os.getpid())
+        np.save(temp_file, df[COLUMNS].to_numpy(dtype=float).T.copy())
+        os.replace(temp_file, file)
+        self.evict(keep=file)
+        return df
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used runs until the cache is no larger
+        than max_bytes. The run in the file keep is never removed.
+        """
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy") and ".tmp" not in name:
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size,
+                              os.path.join(self.cache_dir, name)))
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+            total -= size
+
+
+def find_runs(data_dir):
+    """
+    Finds every pair of CG and ROT files below data_dir.
+
+    Inputs:
+        data_dir -  The platform data folder, e.g. Data/platform_data.
+
+    Returns:
+        runs -      A list of dictionaries, one per run, holding the
+                    "Turbine type", "Hz", "Tz", "Wave direction", the "Run"
+                    name and the "CG file" and "ROT file", sorted by file.
+    """
+    runs = []
+    for folder, _, files in os.walk(data_dir):
+        for file in files:
+            if not file.endswith("_CG.csv"):
+                continue
+            run = file[:-len("CG.csv")]
+            ROT_file = os.path.join(folder, run+"ROT.csv")
+            if not os.path.isfile(ROT_file):
+                continue
+            parts = os.path.relpath(folder, data_dir).split(os.sep)
+            if len(parts) != 4:
+                continue
+            runs.append({"Turbine type": parts[0],
+                         "Hz": parts[1],
+                         "Tz": parts[2],
+                         "Wave direction": parts[3],
+                         "Run": run,
+                         "CG file": os.path.join(folder, file),
+                         "ROT file": ROT_file})
+    return sorted(runs, key=lambda run: run["CG file"])
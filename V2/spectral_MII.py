@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Calculates the MSI and MII rate in the frequency domain, from the response
+amplitude operators (RAOs) of the platform and a wave spectrum, instead of
+from the time series of an AQWA run.
+
+The acceleration at a point is a linear combination of the motions of the
+accelerometer, so its transfer function follows from the RAOs with the same
+lever arm coupling as MII.motion_kinematics. The response spectrum is then
+|H|^2 times the wave spectrum, which gives:
+
+    band RMS    --  The square root of the response spectrum integrated over
+                    each band of MII.MSI_BANDS, as MII.octave_batch.
+    MSI         --  From the weighted band RMS, as MII.MSI_batch.
+    MII rate    --  The rate of trips from Rice's formula for the rate at
+                    which a Gaussian process crosses a level, using the
+                    spectral moments m0 and m2.
+
+The transfer functions at a set of points only depend on the RAOs, so a
+whole scatter diagram of sea states is evaluated with a few matrix products.
+"""
+
+import numpy as np
+import pandas as pd
+import MII
+
+
+def peak_period(Tz, gamma=3.3):
+    """
+    The peak period of a JONSWAP spectrum with zero upcrossing period Tz and
+    peak enhancement factor gamma (DNV-RP-C205).
+    """
+    return Tz/(0.6673 + 0.05037*gamma - 0.006230*gamma**2
+               + 0.0003341*gamma**3)
+
+
+def jonswap(omega, Hs, Tz, gamma=3.3):
+    """
+    The JONSWAP wave spectrum.
+
+    Inputs:
+        omega - The frequencies (rad/s).
+
+        Hs -    The significant wave height (m). Hs and Tz may be arrays of
+                sea states, which are broadcast against each other.
+
+        Tz -    The zero upcrossing period (s).
+
+        gamma - The peak enhancement factor, 1 gives the Pierson-Moskowitz
+                spectrum.
+
+    Returns:
+        S -     The one sided spectrum (m^2 s/rad) with shape
+                np.broadcast(Hs, Tz).shape + omega.shape.
+    """
+    omega = np.asarray(omega, dtype=float)
+    Hs = np.asarray(Hs, dtype=float)[..., np.newaxis]
+    omega_p = 2*np.pi/peak_period(np.asarray(Tz, dtype=float), gamma)
+    omega_p = omega_p[..., np.newaxis]
+    with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+        ratio = omega/omega_p
+        S = (5/16*Hs**2*omega_p**-1*ratio**-5*np.exp(-5/4*ratio**-4))
+        sigma = np.where(omega <= omega_p, 0.07, 0.09)
+        S = (1 - 0.287*np.log(gamma))*S*gamma**np.exp(
+            -0.5*((ratio - 1)/sigma)**2)
+    return np.where(omega > 0, S, 0)
+
+
+def pierson_moskowitz(omega, Hs, Tz):
+    """
+    The Pierson-Moskowitz wave spectrum, see jonswap.
+    """
+    return jonswap(omega, Hs, Tz, gamma=1)
+
+
+def frequency_weights(omega):
+    """
+    The trapezoidal integration weight of each frequency, so that an
+    integral over frequency is the sum of the spectrum times the weights.
+    """
+    omega = np.asarray(omega, dtype=float)
+    steps = np.diff(omega)
+    weights = np.zeros_like(omega)
+    weights[:-1] += steps/2
+    weights[1:] += steps/2
+    return weights
+
+
+def rice_rate(m0, m2, level):
+    """
+    The mean rate at which a zero mean Gaussian process with spectral
+    moments m0 and m2 (in rad/s) crosses level upwards, per second.
+    """
+    m0 = np.asarray(m0, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.sqrt(m2/m0)/(2*np.pi)*np.exp(-level**2/(2*m0))
+    return np.where(m0 > 0, rate, 0)
+
+
+class rao_table:
+    """
+    The RAOs of the motions of the accelerometer for one wave heading.
+    Attributes:
+        omega       --  The frequencies (rad/s), shape (n_freq,)
+        motion      --  The complex RAOs of [X, Y, Z] (m/m) and [Roll,
+                        Pitch, Yaw] (deg/m) in the reference frame of the
+                        person, shape (6, n_freq)
+    Methods:
+        from_motion_data    --  Pseudo RAOs which reproduce a time series
+        rotated             --  The RAOs in a frame rotated about Z
+        accelerations       --  The acceleration transfer functions at
+                                points
+        statistics          --  The MSI and MII rates at points for many
+                                sea states
+    """
+
+    def __init__(self, omega, motion):
+        """
+        Initialise the RAOs.
+        Inputs:
+            omega   -- The frequencies (rad/s)
+            motion  -- The complex RAOs of [X, Y, Z, Roll, Pitch, Yaw] at each
+                       frequency, shape (6, n_freq)
+        """
+        self.omega = np.asarray(omega, dtype=float)
+        self.motion = np.asarray(motion, dtype=complex)
+        if self.motion.shape != (6, len(self.omega)):
+            raise ValueError("motion must have shape (6, %d), not %r"
+                             % (len(self.omega), self.motion.shape))
+
+    @classmethod
+    def from_motion_data(cls, motion_data, spectrum, threshold=1e-6):
+        """
+        Creates pseudo RAOs from the motion data of an ansys_accelerometer,
+        e.g. to check the frequency domain results against a time domain
+        run. The Fourier coefficients of the record are divided by the wave
+        amplitude sqrt(2*S*d_omega) of the given spectrum at each frequency,
+        so that the RAOs and that spectrum reproduce the spectrum of the
+        record. Where the spectrum is below threshold times its peak, the
+        response is not driven by the waves (e.g. slow drift), and the RAOs
+        are zero.
+
+        Inputs:
+            motion_data -   The motion data of an ansys_accelerometer.
+
+            spectrum -      A function of omega returning the wave spectrum,
+                            e.g. lambda omega: jonswap(omega, 2.1, 4.89).
+
+            threshold -     The smallest part of the peak of the spectrum
+                            with a response.
+        """
+        t = np.asarray(motion_data["Time"], dtype=float)
+        n = len(t)
+        time_step = np.average(np.diff(t))
+        omega = 2*np.pi*np.fft.rfftfreq(n, time_step)
+        # The rotations are taken from the rotational accelerations, like the
+        # translations, so the RAOs reproduce the accelerations used in the
+        # time domain and the drift of the angles over the record does not
+        # leak into every frequency
+        series = np.array([motion_data[key] for key in
+                           ["Ax", "Ay", "Az", "Roll acc", "Pitch acc",
+                            "Yaw acc"]],
+                          dtype=float)
+        amplitudes = 2*np.fft.rfft(series, axis=-1)/n
+        # Only frequencies with a wave can have a response
+        amplitudes[:, 0] = 0
+        if n % 2 == 0:
+            amplitudes[:, -1] = 0
+        # The accelerations are turned back into motions
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amplitudes = np.where(omega > 0, -amplitudes/omega**2, 0)
+            S = spectrum(omega)
+            wave = np.sqrt(2*S*frequency_weights(omega))
+            motion = np.where(S > threshold*np.max(S), amplitudes/wave, 0)
+        return cls(omega, motion)
+
+    def rotated(self, rot_z):
+        """
+        The RAOs in a reference frame rotated by rot_z degrees about Z, e.g.
+        for another person rotation.
+        """
+        c, s = np.cos(np.deg2rad(rot_z)), np.sin(np.deg2rad(rot_z))
+        M = np.array([[c, s, 0], [-s, c, 0], [0, 0, 1]])
+        return rao_table(self.omega, np.concatenate([M @ self.motion[:3],
+                                                     M @ self.motion[3:]]))
+
+    def accelerations(self, dx, dy, dz):
+        """
+        The transfer functions of the accelerations [Ax, Ay, Az] at points
+        with lever arms dx, dy, dz from the accelerometer, the same
+        translation as MII.motion_kinematics.translate. Returns a complex
+        array of shape (3, n_points, n_freq).
+        """
+        lever = np.stack((np.ravel(dx), np.ravel(dy), np.ravel(dz)), axis=-1)
+        linear = -self.omega**2*self.motion[:3]
+        angular = -self.omega**2*self.motion[3:]*np.pi/180
+        coeff = np.einsum('nk,ckj->cnj', lever, MII.LEVER_ARM_COUPLING)
+        return np.matmul(coeff, angular) + linear[:, np.newaxis]
+
+    def tip_transfer(self, lateral, h=0.91, g=9.81):
+        """
+        The transfer function of the numerator of MII.calc_tip_ratio,
+        -h/3*n4_acc + D2_acc + g*n4, for lateral acceleration transfer
+        functions of shape (..., n_points, n_freq). The roll is in degrees,
+        as in the motion data used by MII.calc_MII_rates.
+        """
+        roll = self.motion[3]
+        roll_acc = -self.omega**2*roll
+        h = np.reshape(np.asarray(h, dtype=float), (-1, 1))
+        return -h/3*roll_acc + lateral + g*roll
+
+    def statistics(self, wave_spectra, dx, dy, dz, exposure_time=None,
+                   Cts=None, h=0.91, g=9.81, Scale_factor=1,
+                   bands=MII.MSI_BANDS, k=1/3):
+        """
+        Calculates the RMS accelerations, the MSI and the MII rates at a set
+        of points for many sea states at once.
+
+        Inputs:
+            wave_spectra -  The wave spectrum of each sea state at omega,
+                            shape (n_sea_states, n_freq), e.g. from jonswap.
+
+            dx, dy, dz -    The lever arms of the points from the
+                            accelerometer.
+
+            exposure_time - The exposure time in hours of the MSI, a single
+                            value or one per point. The MSI is only
+                            calculated if it is given.
+
+            Cts -           A list of the tipping coefficients of each
+                            direction, sideways then foreward, each a single
+                            value or one per point. The MII rates are only
+                            calculated if they are given.
+
+            h -             The height of the centre of gravity, a single
+                            value or one per point.
+
+            g -             The acceleration due to gravity.
+
+            Scale_factor -  The model scale factor of the band edges.
+
+            bands -         A band_table of the MSI bands.
+
+            k -             The MSI constant.
+
+        Returns:
+            results -       A dictionary of arrays of shape (n_sea_states,
+                            n_points): "Ax_rms", "Ay_rms", "Az_rms",
+                            "A_rms", "MSI", "Sideways MII Rate" and
+                            "Foreward MII Rate", and "Az_band_rms" of shape
+                            (n_sea_states, n_points, n_bands).
+        """
+        wave_spectra = np.atleast_2d(wave_spectra)
+        weights = frequency_weights(self.omega)
+        # The integral of |H|^2 S over frequency for every point and sea
+        # state is one matrix product
+        weighted = wave_spectra*weights
+        acc = self.accelerations(dx, dy, dz)
+        power = np.abs(acc)**2
+        mean_square = np.matmul(power, weighted.T)
+        results = {}
+        for i, name in enumerate(["Ax_rms", "Ay_rms", "Az_rms"]):
+            results[name] = np.sqrt(mean_square[i].T)
+        results["A_rms"] = np.sqrt(np.sum(mean_square, axis=0).T)
+
+        masks = bands.masks(self.omega/(2*np.pi), Scale_factor)
+        band_power = np.einsum('nf,sf,bf->snb', power[2], weighted,
+                               masks.astype(float))
+        results["Az_band_rms"] = np.sqrt(band_power)
+
+        if exposure_time is not None:
+            aw = np.sqrt(np.sum(band_power*bands.weights**2, axis=-1))
+            results["MSI"] = k*aw*np.sqrt(
+                np.asarray(exposure_time, dtype=float)*60*60)
+
+        if Cts is not None:
+            # A trip starts when the tip ratio |X|/(g + Az) rises above Ct,
+            # i.e. when X - Ct*Az or -X - Ct*Az rises above Ct*g. Both are
+            # Gaussian, so each rate follows from Rice's formula.
+            names = ["Sideways MII Rate", "Foreward MII Rate"]
+            for name, lateral, Ct in zip(names, [acc[1], acc[0]], Cts):
+                X = self.tip_transfer(lateral, h=h, g=g)
+                Ct = np.reshape(np.asarray(Ct, dtype=float), (-1, 1))
+                rate = 0
+                for sign in [1, -1]:
+                    Y = np.abs(sign*X - Ct*acc[2])**2
+                    m0 = np.matmul(Y, weighted.T).T
+                    m2 = np.matmul(Y*self.omega**2, weighted.T).T
+                    rate = rate + rice_rate(m0, m2, Ct.T*g)
+                results[name] = rate
+        return results
+
+
+def scatter_statistics(raos, Hs, Tz, dx, dy, dz, gamma=3.3, index=None,
+                       **options):
+    """
+    Calculates the MSI and MII rates of a set of points for every sea state
+    of a scatter diagram.
+
+    Inputs:
+        raos -      A rao_table.
+
+        Hs, Tz -    The significant wave height and zero upcrossing period of
+                    each sea state.
+
+        dx, dy, dz - The lever arms of the points from the accelerometer.
+
+        gamma -     The JONSWAP peak enhancement factor.
+
+        index -     An index of the points, e.g. the index of the tasks.
+
+        options -   Passed on to rao_table.statistics, e.g. exposure_time,
+                    Cts and h.
+
+    Returns:
+        table -     A DataFrame with one row per sea state and point, with
+                    columns "Hs", "Tz", "Point" and the results of
+                    rao_table.statistics apart from the band RMS.
+    """
+    Hs, Tz = np.broadcast_arrays(np.ravel(Hs), np.ravel(Tz))
+    spectra = jonswap(raos.omega, Hs, Tz, gamma=gamma)
+    results = raos.statistics(spectra, dx, dy, dz, **options)
+    n_points = results["Az_rms"].shape[1]
+    if index is None:
+        index = np.arange(n_points)
+    table = pd.DataFrame({"Hs": np.repeat(Hs, n_points),
+                          "Tz": np.repeat(Tz, n_points),
+                          "Point": np.tile(np.asarray(index), len(Hs))})
+    for name, values in results.items():
+        if name != "Az_band_rms":
+            table[name] = np.ravel(values)
+    return table